@@ -21,29 +21,111 @@
 
 from __future__ import division, print_function, unicode_literals
 
+import os
 import time
 import logging
+from collections import deque, OrderedDict
 _logger = logging.getLogger(__name__)
 
 from Onboard.Version   import require_gi_versions
 require_gi_versions()
+from gi.repository import GLib, Gio
 try:
     from gi.repository import Atspi
 except ImportError as e:
     _logger.warning("Atspi typelib missing, auto-show unavailable")
 
 from Onboard.utils     import Rect, EventSource, Process, unicode_str
-from Onboard.Timer     import Timer
+from Onboard.Timer     import Timer, TimerOnce
 
 # Config Singleton
 from Onboard.Config import Config
 config = Config()
 
 
+class AccessibleCache:
+    """
+    Process-wide cache of CachedAccessible instances, keyed on the bus name
+    and object path of the accessible. Keeps cached properties alive across
+    events, so that focus hopping between known widgets needs little D-Bus
+    traffic. AtspiStateTracker invalidates entries on AT-SPI events.
+    """
+    MAX_SIZE = 64
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton magic.
+        """
+        if not hasattr(cls, "self"):
+            cls.self = object.__new__(cls, *args, **kwargs)
+            cls.self.construct()
+        return cls.self
+
+    def __init__(self):
+        """
+        Called multiple times, don't use this.
+        """
+        pass
+
+    def construct(self):
+        """
+        Singleton constructor, runs only once.
+        """
+        self._entries = OrderedDict()
+
+    def get(self, accessible):
+        """ Cached wrapper for the Atspi.Accessible, created on demand. """
+        key = self._get_key(accessible)
+        cached = self._entries.get(key)
+        if cached is None or cached._accessible is not accessible:
+            cached = CachedAccessible(accessible)
+            self._entries[key] = cached
+            while len(self._entries) > self.MAX_SIZE:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        return cached
+
+    def lookup(self, accessible):
+        """ Cached wrapper if there is one, None otherwise. """
+        return self._entries.get(self._get_key(accessible))
+
+    def remove(self, accessible):
+        self._entries.pop(self._get_key(accessible), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    @staticmethod
+    def _get_key(accessible):
+        """ Local fields only, no D-Bus round-trip. """
+        try:
+            return (accessible.app.bus_name, accessible.path)
+        except Exception:  # missing fields in old gi versions
+            return accessible
+
+
 class CachedAccessible:
+
+    # Seconds until cached properties are read again. Properties that
+    # AT-SPI events don't reliably invalidate expire sooner.
+    DEFAULT_TTL = 60.0
+    TTLS = {"state-set"     : 5.0,
+            "name"          : 10.0,
+            "description"   : 10.0,
+            "extents"       : 1.0,
+            "frame_extents" : 1.0,
+           }
+
+    # Seconds placeholders for unanswered queries stand in for the real
+    # properties, long enough to finish handling the current event.
+    PLACEHOLDER_TTL = 2.0
+
     def __init__(self, accessible):
         self._accessible = accessible
         self._state = {}       # cache of various accessible properties
+        self._state_times = {} # time each property was read
+        self._placeholders = set() # properties that couldn't be read
 
     # Use "==" for object identity tests instead of "is".
     def __eq__(self, other):
@@ -194,7 +276,7 @@ class CachedAccessible:
         def func():
             frame = self._get_accessible_frame(self._accessible)
             if frame:
-                return CachedAccessible(frame)
+                return AccessibleCache().get(frame)
             return None
 
         return self._get_value_noex("frame", func)
@@ -254,7 +336,7 @@ class CachedAccessible:
     def _get_value(self, name, func, default=None):
         """ Return cached return value of func(). """
         value = self._state.get(name)
-        if value is None:
+        if value is None or self._is_expired(name):
             try:
                 value = func()
             except Exception as ex:  # private exception gi._glib.GError
@@ -263,18 +345,25 @@ class CachedAccessible:
                              .format(name) + unicode_str(ex))
                 value = default
 
-            self._state[name] = value
+            self.set_value(name, value)
 
         return value
 
     def _get_value_noex(self, name, func):
         """ Return cached return value of func(). """
         value = self._state.get(name)
-        if value is None:
+        if value is None or self._is_expired(name):
             value = func()
-            self._state[name] = value
+            self.set_value(name, value)
         return value
 
+    def _is_expired(self, name):
+        if name in self._placeholders:
+            ttl = self.PLACEHOLDER_TTL
+        else:
+            ttl = self.TTLS.get(name, self.DEFAULT_TTL)
+        return time.time() - self._state_times.get(name, 0) > ttl
+
     def invalidate(self, name):
         """
         Force re-reading property from the accessible.
@@ -285,6 +374,47 @@ class CachedAccessible:
         except KeyError:
             pass
 
+    def query_async(self, names, callback, timeout=None):
+        """
+        Read the given properties in one round of concurrent D-Bus
+        requests, then call callback(). Properties that are already
+        cached aren't requested again. Doesn't block the main loop,
+        even if the application has stopped responding.
+        """
+        AccessibleQuery(self, names, callback, timeout).start()
+
+    def set_value(self, name, value):
+        """ Fill the cache with a property read elsewhere. """
+        self._state[name] = value
+        self._state_times[name] = time.time()
+        self._placeholders.discard(name)
+
+    def set_placeholder(self, name, value):
+        """
+        Stand-in for a property that couldn't be read. Reads are served
+        from it for PLACEHOLDER_TTL without blocking on the application,
+        but the next asynchronous query requests the property again.
+        """
+        self._state[name] = value
+        self._state_times[name] = time.time()
+        self._placeholders.add(name)
+
+    def has_value(self, name):
+        """ Is there a current value, that isn't just a placeholder? """
+        return self._state.get(name) is not None and \
+               name not in self._placeholders and \
+               not self._is_expired(name)
+
+    def get_dbus_address(self):
+        """ Bus name and object path of the accessible. """
+        try:
+            return (self._accessible.app.bus_name,
+                    self._accessible.path)
+        except Exception as ex:  # missing fields in old gi versions
+            _logger.info("CachedAccessible.get_dbus_address(): " +
+                         unicode_str(ex))
+        return None
+
     # ### uncached, but still exception safe functions ###
 
     def get_selection(self, selection_num=0):
@@ -468,6 +598,191 @@ class CachedAccessible:
                     ext.width * scale, ext.height * scale)
 
 
+class A11yBus:
+    """
+    Gio connection to the accessibility bus for asynchronous queries.
+    libatspi only offers blocking calls.
+    """
+    _connection = None
+    _failed = False
+
+    @classmethod
+    def get_connection(cls):
+        if cls._connection is None and not cls._failed:
+            try:
+                address = os.environ.get("AT_SPI_BUS_ADDRESS")
+                if not address:
+                    session = Gio.bus_get_sync(Gio.BusType.SESSION, None)
+                    result = session.call_sync(
+                        "org.a11y.Bus", "/org/a11y/bus",
+                        "org.a11y.Bus", "GetAddress", None,
+                        GLib.VariantType.new("(s)"),
+                        Gio.DBusCallFlags.NONE, 1000, None)
+                    address = result.unpack()[0]
+
+                flags = Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT | \
+                        Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION
+                cls._connection = Gio.DBusConnection.new_for_address_sync(
+                    address, flags, None, None)
+            except Exception as ex:  # Private exception gi._glib.GError
+                _logger.warning("Failed to connect to the accessibility "
+                                "bus, falling back to synchronous "
+                                "queries: " + unicode_str(ex))
+                cls._failed = True
+
+        return cls._connection
+
+
+class AccessibleQuery:
+    """
+    One round of concurrent, asynchronous D-Bus requests for properties
+    of a CachedAccessible. Replies fill the accessible's cache.
+    Properties that didn't arrive in time receive placeholder defaults.
+    They serve reads while the current event is handled, but aren't
+    treated as cached by later queries, which ask the application again.
+    """
+
+    TIMEOUT = 0.5   # seconds until giving up on the application
+
+    ACCESSIBLE_IFACE = "org.a11y.atspi.Accessible"
+    PROPERTIES_IFACE = "org.freedesktop.DBus.Properties"
+
+    def __init__(self, accessible, names, callback, timeout=None):
+        self._accessible = accessible
+        self._names = [name for name in names
+                       if not accessible.has_value(name)]
+        self._callback = callback
+        self._timeout = self.TIMEOUT if timeout is None else timeout
+        self._pending = set()
+        self._timer = TimerOnce()
+        self._cancellable = None
+        self._done = False
+
+    def start(self):
+        connection = A11yBus.get_connection() if self._names else None
+        address = self._accessible.get_dbus_address() if connection else None
+        if not address:
+            self._finish()
+            return
+
+        self._cancellable = Gio.Cancellable()
+        self._pending = set(self._names)
+        bus_name, path = address
+        acc_iface = self.ACCESSIBLE_IFACE
+
+        for name in self._names:
+            if name == "role":
+                self._call(name, bus_name, path, acc_iface, "GetRole",
+                           None, "(u)",
+                           lambda r: Atspi.Role(r[0]))
+            elif name == "state-set":
+                self._call(name, bus_name, path, acc_iface, "GetState",
+                           None, "(au)",
+                           lambda r: self._to_state_set(r[0]))
+            elif name == "attributes":
+                self._call(name, bus_name, path, acc_iface, "GetAttributes",
+                           None, "(a{ss})",
+                           lambda r: dict(r[0]))
+            elif name == "interfaces":
+                self._call(name, bus_name, path, acc_iface, "GetInterfaces",
+                           None, "(as)",
+                           lambda r: [i.replace("org.a11y.atspi.", "")
+                                      for i in r[0]])
+            elif name == "name":
+                self._get_property(name, bus_name, path, "Name")
+            elif name == "description":
+                self._get_property(name, bus_name, path, "Description")
+            elif name == "pid":
+                self._call(name, "org.freedesktop.DBus",
+                           "/org/freedesktop/DBus", "org.freedesktop.DBus",
+                           "GetConnectionUnixProcessID",
+                           GLib.Variant("(s)", (bus_name,)), "(u)",
+                           lambda r: r[0])
+            elif name == "app-name":
+                # Two steps: application object first, then its name.
+                def on_application(r, name=name):
+                    app_bus_name, app_path = r[0]
+                    self._get_property(name, app_bus_name, app_path, "Name")
+                self._call(name, bus_name, path, acc_iface, "GetApplication",
+                           None, "((so))", on_application, store=False)
+            else:
+                # no async support, read it synchronously in _finish()
+                self._pending.discard(name)
+
+        if self._pending:
+            self._timer.start(self._timeout, self._on_timeout)
+        else:
+            self._finish()
+
+    def _get_property(self, name, bus_name, path, property_name):
+        self._call(name, bus_name, path, self.PROPERTIES_IFACE, "Get",
+                   GLib.Variant("(ss)", (self.ACCESSIBLE_IFACE,
+                                         property_name)),
+                   "(v)", lambda r: r[0])
+
+    def _call(self, name, bus_name, path, iface, method,
+              parameters, reply_type, convert, store=True):
+        def on_reply(connection, result, _user_data):
+            if self._done:
+                return
+            try:
+                reply = connection.call_finish(result).unpack()
+                value = convert(reply)
+            except Exception as ex:  # Private exception gi._glib.GError
+                _logger.info("AccessibleQuery: failed to read {}: "
+                             .format(name) + unicode_str(ex))
+                self._pending.discard(name)
+            else:
+                if store:
+                    self._accessible.set_value(name, value)
+                    self._pending.discard(name)
+
+            if not self._pending:
+                self._finish()
+
+        A11yBus.get_connection().call(
+            bus_name, path, iface, method, parameters,
+            GLib.VariantType.new(reply_type),
+            Gio.DBusCallFlags.NONE, int(self._timeout * 1000),
+            self._cancellable, on_reply, None)
+
+    def _on_timeout(self):
+        _logger.info("AccessibleQuery: timeout reading {} of {}"
+                     .format(sorted(self._pending), self._accessible))
+        if self._cancellable:
+            self._cancellable.cancel()
+
+        defaults = {"role" : Atspi.Role.INVALID,
+                    "state-set" : Atspi.StateSet.new([]),
+                    "attributes" : {},
+                    "interfaces" : [],
+                    "name" : "",
+                    "description" : "",
+                    "pid" : -1,
+                    "app-name" : "",
+                   }
+        for name in self._pending:
+            if name in defaults:
+                self._accessible.set_placeholder(name, defaults[name])
+
+        self._finish()
+        return False
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            self._timer.stop()
+            self._callback()
+
+    @staticmethod
+    def _to_state_set(bits):
+        """ AT-SPI state bit field to Atspi.StateSet """
+        states = [Atspi.StateType(i)
+                  for i in range(Atspi.StateType.LAST_DEFINED)
+                  if bits[i // 32] & (1 << (i % 32))]
+        return Atspi.StateSet.new(states)
+
+
 class AsyncEvent:
     """
     Decouple AT-SPI events from D-Bus calls to reduce the risk for deadlocks.
@@ -483,6 +798,135 @@ class AsyncEvent:
             + ")"
 
 
+class AtspiEventCoalescer:
+    """
+    Shrink bursts of queued AT-SPI events, e.g. from paste operations,
+    page reloads or busy terminals, before they are processed.
+    Caret moves and selection changes superseded by later ones of the
+    same accessible are dropped, adjacent insertions and deletions
+    are merged into single text changes.
+
+    Doctests:
+    >>> c = AtspiEventCoalescer()
+    >>> def ins(pos, text):
+    ...     return ("async-text-changed",
+    ...             (AsyncEvent(accessible=1, type="object:text-changed:insert",
+    ...                         pos=pos, length=len(text), text=text),), {})
+    >>> def caret(pos):
+    ...     return ("async-text-caret-moved",
+    ...             (AsyncEvent(accessible=1, caret=pos),), {})
+    >>> events = c.coalesce([ins(5, "a"), caret(6), ins(6, "bc"), caret(8)])
+    >>> [(name, args[0].pos if "pos" in args[0]._kwargs else args[0].caret)
+    ...  for name, args, kwargs in events]
+    [('async-text-changed', 5), ('async-text-caret-moved', 8)]
+    >>> e = events[0][1][0]
+    >>> e.length, e.text
+    (3, 'abc')
+    >>> c.merged_count, c.dropped_count
+    (1, 1)
+
+    # Backspace repeating
+    >>> def dele(pos, text):
+    ...     return ("async-text-changed",
+    ...             (AsyncEvent(accessible=1, type="object:text-changed:delete",
+    ...                         pos=pos, length=len(text), text=text),), {})
+    >>> e = c.coalesce([dele(9, "c"), dele(8, "b"), dele(7, "a")])[0][1][0]
+    >>> e.pos, e.length, e.text
+    (7, 3, 'abc')
+    """
+
+    _superseded_event_names = ("async-text-caret-moved",
+                               "async-text-selection-changed")
+
+    def __init__(self):
+        self.reset_counts()
+
+    def reset_counts(self):
+        self.merged_count = 0   # text changes merged into previous ones
+        self.dropped_count = 0  # superseded events
+
+    def get_counts(self):
+        return {"merged" : self.merged_count,
+                "dropped" : self.dropped_count}
+
+    def coalesce(self, events):
+        """
+        Coalesce a list of queued (event_name, args, kwargs) tuples.
+        """
+        if len(events) < 2:
+            return events
+
+        # keep only the last caret move/selection change per accessible
+        last = {}
+        for i, (name, args, kwargs) in enumerate(events):
+            if name in self._superseded_event_names:
+                last[(name, args[0].accessible)] = i
+        results = []
+        for i, event in enumerate(events):
+            name, args, kwargs = event
+            if name in self._superseded_event_names and \
+               last[(name, args[0].accessible)] != i:
+                self.dropped_count += 1
+            else:
+                results.append(event)
+
+        # merge adjacent text changes
+        events = results
+        results = []
+        for event in events:
+            name, args, kwargs = event
+            if results and \
+               name == "async-text-changed" and \
+               results[-1][0] == name:
+                merged = self._merge_text_changes(results[-1][1][0], args[0])
+                if merged:
+                    results[-1] = (name, (merged,), kwargs)
+                    self.merged_count += 1
+                    continue
+            results.append(event)
+
+        return results
+
+    @staticmethod
+    def _merge_text_changes(a, b):
+        """
+        Single text change equivalent to a followed by b, None if
+        there is none.
+        """
+        if a.accessible != b.accessible or \
+           a.type != b.type:
+            return None
+
+        def join(text1, text2):
+            if text1 is None or text2 is None:
+                return None
+            return text1 + text2
+
+        insert = a.type.endswith(("insert", "insert:system"))
+        if insert:
+            # b inserted within or right after a
+            if a.pos <= b.pos <= a.pos + a.length:
+                offset = b.pos - a.pos
+                text = None
+                if a.text is not None and b.text is not None:
+                    text = a.text[:offset] + b.text + a.text[offset:]
+                pos = a.pos
+            else:
+                return None
+        else:
+            if b.pos == a.pos:                # delete key
+                pos = a.pos
+                text = join(a.text, b.text)
+            elif b.pos + b.length == a.pos:   # backspace
+                pos = b.pos
+                text = join(b.text, a.text)
+            else:
+                return None
+
+        return AsyncEvent(accessible=a.accessible, type=a.type,
+                          pos=pos, length=a.length + b.length, text=text)
+
+
 class AtspiStateTracker(EventSource):
     """
     Keeps track of the currently active accessible by listening
@@ -490,11 +934,13 @@ class AtspiStateTracker(EventSource):
     """
 
     _focus_event_names      = ("text-entry-activated",)
-    _text_event_names       = ("text-changed", "text-caret-moved")
+    _text_event_names       = ("text-changed", "text-caret-moved",
+                               "text-selection-changed")
     _key_stroke_event_names = ("key-pressed",)
     _async_event_names      = ("async-focus-changed",
                                "async-text-changed",
-                               "async-text-caret-moved")
+                               "async-text-caret-moved",
+                               "async-text-selection-changed")
     _event_names = (_async_event_names +
                     _focus_event_names +
                     _text_event_names +
@@ -515,6 +961,17 @@ class AtspiStateTracker(EventSource):
 
     _poll_unity_timer = Timer()
 
+    # AT-SPI events that invalidate the accessible cache
+    _cache_listeners = (
+        ("_listener_cache_state", "object:state-changed"),
+        ("_listener_cache_bounds", "object:bounds-changed"),
+        ("_listener_cache_children", "object:children-changed"),
+    )
+
+    # Properties read concurrently before handling focus changes.
+    _focus_query_names = ("app-name", "pid", "role", "state-set",
+                          "attributes", "interfaces", "name")
+
     def __new__(cls, *args, **kwargs):
         """
         Singleton magic.
@@ -537,10 +994,26 @@ class AtspiStateTracker(EventSource):
         EventSource.__init__(self, self._event_names)
 
         self._frozen = False
+        self._focus_events = deque()  # focus events waiting for queries
+        self._coalescer = AtspiEventCoalescer()
 
     def cleanup(self):
         EventSource.cleanup(self)
         self._register_atspi_listeners(False)
+        _logger.info("coalesced AT-SPI events: {}"
+                     .format(self.get_event_counts()))
+
+    def get_event_counts(self):
+        """ Number of merged and dropped AT-SPI events """
+        return self._coalescer.get_counts()
+
+    def flush_events(self):
+        """
+        Send pending asynchronous events, coalescing bursts first.
+        """
+        if self._event_queue:
+            self._event_queue = self._coalescer.coalesce(self._event_queue)
+        EventSource.flush_events(self)
 
     def connect(self, event_name, callback):
         EventSource.connect(self, event_name, callback)
@@ -585,6 +1058,11 @@ class AtspiStateTracker(EventSource):
                                    "object:state-changed:focused",
                                    self._on_atspi_object_focus)
 
+                # keep the accessible cache up to date
+                for attribute, event in self._cache_listeners:
+                    self.atspi_connect(attribute, event,
+                                       self._on_atspi_cache_event)
+
                 # private asynchronous events
                 for name in self._async_event_names:
                     handler = "_on_" + name.replace("-", "_")
@@ -596,6 +1074,8 @@ class AtspiStateTracker(EventSource):
                                       "focus")
                 self.atspi_disconnect("_listener_object_focus",
                                       "object:state-changed:focused")
+                for attribute, event in self._cache_listeners:
+                    self.atspi_disconnect(attribute, event)
 
                 for name in self._async_event_names:
                     handler = "_on_" + name.replace("-", "_")
@@ -615,12 +1095,17 @@ class AtspiStateTracker(EventSource):
                 self.atspi_connect("_listener_text_caret_moved",
                                    "object:text-caret-moved",
                                    self._on_atspi_text_caret_moved)
+                self.atspi_connect("_listener_text_selection_changed",
+                                   "object:text-selection-changed",
+                                   self._on_atspi_text_selection_changed)
 
             else:
                 self.atspi_disconnect("_listener_text_changed",
                                       "object:text-changed")
                 self.atspi_disconnect("_listener_text_caret_moved",
                                       "object:text-caret-moved")
+                self.atspi_disconnect("_listener_text_selection_changed",
+                                      "object:text-selection-changed")
 
         self._text_listeners_registered = register
 
@@ -699,16 +1184,42 @@ class AtspiStateTracker(EventSource):
         self._update_listeners()
         self._frozen = False
 
+        # Events were missed while frozen.
+        AccessibleCache().clear()
+
     def emit_async(self, event_name, *args, **kwargs):
         if not self._frozen:
             EventSource.emit_async(self, event_name, *args, **kwargs)
 
     def _get_cached_accessible(self, accessible):
-        return CachedAccessible(accessible) \
+        return AccessibleCache().get(accessible) \
             if accessible else None
 
     # ######### synchronous handlers ######### #
 
+    def _on_atspi_cache_event(self, event, user_data):
+        """
+        Invalidate cached properties. Runs for many events,
+        so no D-Bus calls here.
+        """
+        accessible = event.source
+        if not accessible:
+            return False
+
+        cache = AccessibleCache()
+        type = event.type
+        if type.startswith("object:children-changed"):
+            cache.remove(accessible)
+        else:
+            cached = cache.lookup(accessible)
+            if cached:
+                if type.startswith("object:bounds-changed"):
+                    cached.invalidate_extents()
+                    cached.invalidate("frame_extents")
+                else:
+                    cached.invalidate_state_set()
+        return False
+
     def _on_atspi_global_focus(self, event, user_data):
         self._on_atspi_focus(event, True)
 
@@ -728,7 +1239,8 @@ class AtspiStateTracker(EventSource):
         ae = AsyncEvent(accessible=self._get_cached_accessible(event.source),
                         type=event.type,
                         pos=event.detail1,
-                        length=event.detail2)
+                        length=event.detail2,
+                        text=self._get_event_text(event))
         self.emit_async("async-text-changed", ae)
         return False
 
@@ -741,6 +1253,22 @@ class AtspiStateTracker(EventSource):
         self.emit_async("async-text-caret-moved", ae)
         return False
 
+    def _on_atspi_text_selection_changed(self, event, user_data):
+        ae = AsyncEvent(accessible=self._get_cached_accessible(event.source))
+        self.emit_async("async-text-selection-changed", ae)
+        return False
+
+    @staticmethod
+    def _get_event_text(event):
+        """
+        Inserted or deleted text of a text-changed event.
+        None if the application didn't send it along.
+        """
+        text = event.any_data
+        if isinstance(text, str):
+            return text
+        return None
+
     def _on_atspi_keystroke(self, event, user_data):
         if event.type == Atspi.EventType.KEY_PRESSED_EVENT:
             _logger.atspi("key-stroke {} {} {} {}"
@@ -756,10 +1284,52 @@ class AtspiStateTracker(EventSource):
     # ######### asynchronous handlers ######### #
     def _on_async_focus_changed(self, event):
         accessible = event.accessible
-        focused = event.focused
 
         # Don't access the accessible while frozen. This leads to deadlocks
         # while displaying Onboard's own dialogs/popup menu's.
+        if self._frozen:
+            return
+
+        # Read everything the focus handlers need in one round of
+        # concurrent requests. Events are handled in order of arrival,
+        # each once its queries have completed or timed out.
+        event.ready = False
+        event.fresh_accessibles = []
+        self._focus_events.append(event)
+
+        accessibles = []
+        if accessible:
+            accessibles.append(accessible)
+        previous = self._focused_accessible
+        if previous and previous != accessible:
+            accessibles.append(previous)
+
+        if not accessibles:
+            self._on_focus_queries_done(event)
+            return
+
+        pending = [len(accessibles)]
+        def on_query_done():
+            pending[0] -= 1
+            if pending[0] == 0:
+                self._on_focus_queries_done(event)
+
+        for acc in accessibles:
+            acc.invalidate_state_set()  # focus state has to be current
+            event.fresh_accessibles.append(acc)
+            names = self._focus_query_names if acc is accessible \
+                    else ("state-set",)
+            acc.query_async(names, on_query_done)
+
+    def _on_focus_queries_done(self, event):
+        event.ready = True
+        while self._focus_events and self._focus_events[0].ready:
+            self._handle_focus_changed(self._focus_events.popleft())
+
+    def _handle_focus_changed(self, event):
+        accessible = event.accessible
+        focused = event.focused
+
         if self._frozen:
             return
 
@@ -823,7 +1393,8 @@ class AtspiStateTracker(EventSource):
         # Has the previously focused accessible lost the focus?
         active_accessible = self._focused_accessible
         if active_accessible and \
-           not active_accessible.is_focused(True):
+           not active_accessible.is_focused(
+               active_accessible not in event.fresh_accessibles):
 
             # Zesty: Firefox 50+ loses focus of the URL entry after
             # typing just a few letters and focuses a completion
@@ -924,6 +1495,10 @@ class AtspiStateTracker(EventSource):
         if event.accessible == self._active_accessible:
             self.emit("text-caret-moved", event)
 
+    def _on_async_text_selection_changed(self, event):
+        if event.accessible == self._active_accessible:
+            self.emit("text-selection-changed", event)
+
     def _log_accessible(self, accessible, focused):
         if _logger.isEnabledFor(_logger.LEVEL_ATSPI):
             msg = "AT-SPI focus event: focused={}, ".format(focused)
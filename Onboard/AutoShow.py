@@ -22,10 +22,13 @@ from __future__ import division, print_function, unicode_literals
 
 import collections
 
+from gi.repository import Gdk
+
 from Onboard.AtspiStateTracker import AtspiStateTracker
 from Onboard.HardwareSensorTracker import HardwareSensorTracker
 from Onboard.UDevTracker       import UDevTracker
 from Onboard.utils             import Rect
+from Onboard.WindowUtils       import find_free_position
 from Onboard.Timer             import TimerOnce
 from Onboard.definitions       import RepositionMethodEnum
 
@@ -47,6 +50,9 @@ class AutoShow(object):
     SHOW_REACTION_TIME = 0.0
     HIDE_REACTION_TIME = 0.3
 
+    # Number of remembered window positions, per accessible geometry.
+    REPOSITION_CACHE_SIZE = 32
+
     _keyboard = None
 
     _lock_visible = False
@@ -61,14 +67,28 @@ class AutoShow(object):
         self._auto_show_timer = TimerOnce()
         self._active_accessible = None
         self._locks = collections.OrderedDict()
+        self._reposition_cache = collections.OrderedDict()
+
+        # Monitor geometry enters window positions, forget them on change.
+        self._screen = Gdk.Screen.get_default()
+        self._screen_size_changed_id = self._screen.connect(
+            "size-changed", self._on_screen_size_changed) \
+            if self._screen else None
 
     def reset(self):
         self._auto_show_timer.stop()
         self.unlock_all()
+        self._reposition_cache.clear()
 
     def cleanup(self):
         self.reset()
         self.enable(False)  # disconnect events
+        if self._screen_size_changed_id:
+            self._screen.disconnect(self._screen_size_changed_id)
+            self._screen_size_changed_id = None
+
+    def _on_screen_size_changed(self, screen):
+        self._reposition_cache.clear()
 
     def update(self):
         self.enable_(config.is_auto_show_enabled())
@@ -386,6 +406,8 @@ class AutoShow(object):
         if not accessible:
             return None
 
+        # Moving or scrolling the app window doesn't emit bounds-changed,
+        # read fresh extents and memoize on those.
         accessible.invalidate_extents()
         acc_rect = accessible.get_extents()
         if acc_rect.is_empty() or \
@@ -405,11 +427,28 @@ class AutoShow(object):
             rh.w += offset[0]
             rh.h += offset[1]
 
-        # "Follow active window" method
+        app_rect = None
         if method == RepositionMethodEnum.REDUCE_POINTER_TRAVEL:
             frame = accessible.get_frame()
+            if frame:
+                frame.invalidate_extents()
             app_rect = frame.get_extents() \
                 if frame else Rect()
+
+        # Same geometry as before, e.g. when moving through a form?
+        key = (method, tuple(acc_rect), app_rect and tuple(app_rect),
+               tuple(rh), tuple(view.canvas_rect),
+               limit_rects and tuple(tuple(r) for r in limit_rects),
+               tuple(test_clearance), tuple(move_clearance),
+               horizontal, vertical)
+        cache = self._reposition_cache
+        if key in cache:
+            cache.move_to_end(key)
+            rect = cache[key]
+            return None if rect is None else rect.copy()
+
+        # "Follow active window" method
+        if method == RepositionMethodEnum.REDUCE_POINTER_TRAVEL:
             x, y = self._find_close_position(view, rh,
                                              app_rect, acc_rect, limit_rects,
                                              test_clearance, move_clearance,
@@ -422,9 +461,15 @@ class AutoShow(object):
                                                 test_clearance, move_clearance,
                                                 horizontal, vertical)
         if not x is None:
-            return Rect(x, y, home.w, home.h)
+            rect = Rect(x, y, home.w, home.h)
         else:
-            return None
+            rect = None
+
+        cache[key] = None if rect is None else rect.copy()
+        while len(cache) > self.REPOSITION_CACHE_SIZE:
+            cache.popitem(last=False)
+
+        return rect
 
     def _find_close_position(self, view, home,
                              app_rect, acc_rect, limit_rects,
@@ -498,46 +543,19 @@ class AutoShow(object):
         # window frames and position errors of firefox entries.
         ra = acc_rect.apply_border(*test_clearance)
 
-        if rh.intersects(ra):
+        if rh.intersects(ra) and \
+           (horizontal or vertical):
 
             # Leave a different clearance for the new,
             # yet to be found positions.
             ra = acc_rect.apply_border(*move_clearance)
-            x, y = rh.get_position()
 
-            # candidate positions
-            vp = []
-            if horizontal:
-                vp.append([ra.left() - rh.w, y])
-                vp.append([ra.right(), y])
-            if vertical:
-                vp.append([x, ra.top() - rh.h])
-                vp.append([x, ra.bottom()])
-
-            # limited, non-intersecting candidate rectangles
-            vr = []
-            for p in vp:
-                pl = view.limit_position(p[0], p[1],
-                                         view.canvas_rect,
-                                         limit_rects)
-                r = Rect(pl[0], pl[1], rh.w, rh.h)
-                if not r.intersects(ra):
-                    vr.append(r)
-
-            # candidate with smallest center-to-center distance wins
-            chx, chy = rh.get_center()
-            dmin = None
-            rmin = None
-            for r in vr:
-                cx, cy = r.get_center()
-                dx, dy = cx - chx, cy - chy
-                d2 = dx * dx + dy * dy
-                if dmin is None or dmin > d2:
-                    dmin = d2
-                    rmin = r
-
-            if not rmin is None:
-                return rmin.get_position()
+            # Nearest position in the free space around the accessible.
+            x, y = rh.get_position()
+            return find_free_position(x, y, rh.get_size(),
+                                      view.canvas_rect,
+                                      view.get_limit_rects(limit_rects),
+                                      [ra], horizontal, vertical)
 
         return None, None
 
@@ -19,6 +19,8 @@
 
 from __future__ import division, print_function, unicode_literals
 
+from math import ceil
+
 import logging
 _logger = logging.getLogger(__name__)
 
@@ -77,6 +79,77 @@ class PaletteFavoritesKey(PaletteHeaderKey):
         print("fav")
 
 
+class KeyBlock:
+    """
+    Keys of a subcategory, laid out in rows like Rect.flow_layout()
+    with grow_horizontally, but computed on demand per key.
+
+    Doctests:
+    >>> b = KeyBlock(Rect(10, 0, 0, 25), Rect(0, 0, 10, 10), "abcde", 0)
+    >>> b.ncols, b.nrows, b.rect
+    (3, 2, Rect(x=10.0 y=0.0 w=30.0 h=25.0))
+    >>> b.get_key_rect(4)
+    Rect(x=20.0 y=10.0 w=10.0 h=10.0)
+    >>> [b.sequences[i] for i in b.get_indices_in_rect(Rect(25, 5, 10, 10))]
+    ['b', 'c', 'e']
+    """
+
+    def __init__(self, flow_rect, key_rect, sequences, first_index,
+                 spacing=(0, 0)):
+        self.sequences = sequences
+        self.first_index = first_index  # index of the first key in the grid
+        self._x = flow_rect.x
+        self._y = flow_rect.y
+        self._key_w = key_rect.w
+        self._key_h = key_rect.h
+        self._spacing = spacing
+
+        n = len(sequences)
+        x_spacing, y_spacing = spacing
+        self.nrows = max(1, int((flow_rect.h + y_spacing) /
+                                (key_rect.h + y_spacing)))
+        self.ncols = int(ceil(n / self.nrows))
+
+        # same bounds as Rect.flow_layout()
+        self.rect = Rect(flow_rect.x, flow_rect.y, 0, flow_rect.h)
+        if n:
+            self.rect = self.rect.union(
+                self.get_key_rect(min(n, self.ncols) - 1))
+
+    def get_key_rect(self, index):
+        row, col = divmod(index, self.ncols)
+        x_spacing, y_spacing = self._spacing
+        return Rect(self._x + self._key_w * col +
+                    x_spacing * max((col - 1), 0),
+                    self._y + self._key_h * row +
+                    y_spacing * max((row - 1), 0),
+                    self._key_w, self._key_h)
+
+    def get_indices_in_rect(self, rect):
+        """ Indices of the keys intersecting rect, row by row. """
+        x_spacing, y_spacing = self._spacing
+        col_pitch = self._key_w + x_spacing
+        row_pitch = self._key_h + y_spacing
+
+        # candidate range, one extra column/row for spacing irregularities
+        c0 = max(int((rect.x - self._x) // col_pitch) - 1, 0)
+        c1 = min(int((rect.right() - self._x) // col_pitch) + 1,
+                 self.ncols - 1)
+        r0 = max(int((rect.y - self._y) // row_pitch) - 1, 0)
+        r1 = min(int((rect.bottom() - self._y) // row_pitch) + 1,
+                 self.nrows - 1)
+
+        n = len(self.sequences)
+        indices = []
+        for row in range(r0, r1 + 1):
+            for col in range(c0, c1 + 1):
+                index = row * self.ncols + col
+                if index < n and \
+                   rect.intersects(self.get_key_rect(index)):
+                    indices.append(index)
+        return indices
+
+
 class CharacterGridPanel(ScrolledLayoutPanel):
     symbol_data = None
     keyboard = None
@@ -89,13 +162,11 @@ class CharacterGridPanel(ScrolledLayoutPanel):
     def __init__(self):
         super(CharacterGridPanel, self).__init__()
 
-        self._key_labels = []
-        self._key_rects = []
-        self._key_slots = []
-        self._key_pool = {}
+        self._blocks = []
+        self._visible_keys = {}  # grid index -> key in the viewport
+        self._spare_keys = []    # keys to recycle
         self._separator_rects = []
         self._category_rects = []
-        self._category_key_rects = []
 
     def get_fill_color(self):
         return (0, 0, 0, 1)
@@ -105,35 +176,40 @@ class CharacterGridPanel(ScrolledLayoutPanel):
         super(CharacterGridPanel, self).update_log_rect()
 
     def update_content(self):
+        """
+        Lay out subcategory blocks. Keys are created later, only for
+        the visible part of the grid, see on_damage().
+        """
         flow_rect = self.get_rect()
         flow_rect.w = 0
         key_rect = self.key_border_rect
         key_spacing = (0, 0)
         subcategory_spacing = key_rect.w * 0.25
-        key_labels = []
-        key_rects = []
+        blocks = []
         separator_rects = []
+        category_rects = []
         bounding_box = None
         category_rect = None
+        num_keys = 0
 
         subcategories = self.symbol_data.get_subcategories()
 
         for i, (level, label, data) in enumerate(subcategories):
             sequences = self.symbol_data.get_subcategory_sequences(data)
 
-            rects, bounds = flow_rect.flow_layout(
-                key_rect, len(sequences), *key_spacing, True, True)
+            block = KeyBlock(flow_rect, key_rect, sequences, num_keys,
+                             key_spacing)
+            bounds = block.rect
+            blocks.append(block)
+            num_keys += len(sequences)
 
-            key_labels.extend(sequences)
-            key_rects.extend(rects)
             bounding_box = bounding_box.union(bounds) \
                 if bounding_box is not None else bounds
 
             # keep track of category bounds (spanning multiple subcategories)
             if level == 0:  # start of category?
                 if i > 0:
-                    self._category_rects.append(category_rect)
-                    self._category_key_rects.append(key_rects)
+                    category_rects.append(category_rect)
                 category_rect = bounds
             category_rect = category_rect.union(bounds)
 
@@ -148,21 +224,22 @@ class CharacterGridPanel(ScrolledLayoutPanel):
 
             flow_rect.x += subcategory_spacing
 
-        self._category_rects.append(category_rect)
-        self._category_key_rects.append(key_rects)
+        category_rects.append(category_rect)
 
-        self._key_labels = key_labels
-        self._key_slots = [None] * len(key_rects)
-        self._key_rects = key_rects
+        self._blocks = blocks
+        self._category_rects = category_rects
         self._separator_rects = separator_rects
 
         self.lock_y_axis(True)
         self.set_scroll_rect(bounding_box)
 
     def is_background_at(self, log_point):
-        for r in self._key_rects:
-            if r.is_point_within(log_point):
-                return False
+        for block in self._blocks:
+            if block.rect.is_point_within(log_point):
+                rect = Rect(log_point[0], log_point[1], 0, 0).inflate(0.5)
+                for index in block.get_indices_in_rect(rect):
+                    if block.get_key_rect(index).is_point_within(log_point):
+                        return False
         return True
 
     def scroll_to_category(self, category_index):
@@ -184,24 +261,34 @@ class CharacterGridPanel(ScrolledLayoutPanel):
         character_panel.set_active_category_index(category_index)
 
     def on_damage(self, damage_rect):
-        key_slots = self._key_slots
-        items = []
-
-        for ic, category_rect in enumerate(self._category_rects):
-            if damage_rect.intersects(category_rect):
-
-                category_key_rects = self._category_key_rects[ic]
-                for i, rect in enumerate(category_key_rects):
-                    if damage_rect.intersects(rect):
-                        key = key_slots[i]
-                        if key is None:
-                            key = self._get_key(i)
-                            key_slots[i] = key
-                        items.append(key)
-                    else:
-                        key_slots[i] = None
-
-        self.set_items(items)
+        """
+        Materialize keys for the visible part of the grid. Keys that
+        scrolled out of view are recycled for those scrolling in.
+        """
+        old_keys = self._visible_keys
+        visible_keys = {}
+        new_slots = []
+
+        for block in self._blocks:
+            if damage_rect.intersects(block.rect):
+                for index in block.get_indices_in_rect(damage_rect):
+                    grid_index = block.first_index + index
+                    key = old_keys.pop(grid_index, None)
+                    if key is None:
+                        new_slots.append((grid_index, block, index))
+                    visible_keys[grid_index] = key
+
+        spare_keys = self._spare_keys
+        spare_keys.extend(old_keys.values())
+        for grid_index, block, index in new_slots:
+            label = block.sequences[index]
+            rect = block.get_key_rect(index)
+            key = spare_keys.pop() if spare_keys else CharacterPaletteKey()
+            self._configure_key(key, grid_index, label, rect)
+            visible_keys[grid_index] = key
+
+        self._visible_keys = visible_keys
+        self.set_items([visible_keys[i] for i in sorted(visible_keys)])
 
         layout = self.keyboard.layout
         if layout:
@@ -211,43 +298,42 @@ class CharacterGridPanel(ScrolledLayoutPanel):
 
             self.keyboard.redraw([self])
 
-    def _get_key(self, index):
+    def _configure_key(self, key, index, label, key_border_rect):
+        """ (Re-)initialize a new or recycled key for a grid slot. """
         id = "_palette_character" + str(index)
-        label = self._key_labels[index]
-
-        try:
-            key = self._key_pool[label]
-        except KeyError:
-            key = self._create_key(id, label, self._key_rects[index],
-                                   self.key_group, self.color_scheme,
-                                   self.has_emoji)
-
-            # only cache emoji keys, as these are the most expensive ones
-            if 0:  # self.has_emoji:
-                self._key_pool[label] = key
-
         key.set_id(id)
 
-        return key
-
-    @staticmethod
-    def _create_key(id, label, key_border_rect, key_group,
-                    color_scheme, has_emoji):
-        key = CharacterPaletteKey()
-
         key.type = KeyCommon.CHAR_TYPE
         key.code = label
         key.action = KeyCommon.DELAYED_STROKE_ACTION
         key.set_border_rect(key_border_rect)
         if len(label) <= 2:
-            key.group = key_group
+            key.group = self.key_group
         else:
             key.group = id
-        key.color_scheme = color_scheme
-
-        if has_emoji:
+        key.color_scheme = self.color_scheme
+
+        # forget the previous slot's label and image
+        key.labels = None
+        key.label = ""
+        key.image_filenames = None
+        key.label_margin = CharacterPaletteKey.label_margin
+        key.invalidate_image()
+        key.invalidate_label_extents()
+
+        # nor carry over the previous slot's state
+        key.pressed = False
+        key.prelight = False
+        key.hover = False
+        key.active = False
+        key.locked = False
+        key.scanned = False
+        key.stop_dwelling()
+
+        if self.has_emoji:
             fn = emoji_filename_from_sequence(label)
             if fn:
+                # loaded on first draw, see get_image()
                 key.image_filenames = {ImageSlot.NORMAL : fn}
                 key.image_style = ImageStyle.MULTI_COLOR
                 key.label_margin = EMOJI_IMAGE_MARGIN
@@ -257,8 +343,6 @@ class CharacterGridPanel(ScrolledLayoutPanel):
 
         key.can_draw_cached = False
 
-        return key
-
     def draw_tree(self, context):
         super(CharacterGridPanel, self).draw_tree(context)
 
@@ -292,6 +292,11 @@ class Config(ConfigObject):
                   action="store_true", dest="log_learn", default=False,
                   help="log all learned text; off by default")
 
+        group.add_option("", "--stats",
+                  action="store_true", dest="log_stats", default=False,
+                  help="collect word prediction latency statistics and "
+                       "log them on exit; off by default")
+
         parser.add_option_group(group)
 
 
@@ -300,6 +305,7 @@ class Config(ConfigObject):
 
         self.xid_mode = options.xid_mode
         self.log_learn = options.log_learn
+        self.log_stats = options.log_stats
         self.quirks_name = options.quirks_name
         self.quirks = None  # WMQuirks instance, provided by KbdWindow for now
         self.startup_delay = options.startup_delay
@@ -321,6 +327,8 @@ class Config(ConfigObject):
             else:
                 min_level_name = level_range[0]
         self._init_logging(min_level_name, max_level_name)
+        if self.log_stats:
+            logging.getLogger("LatencyStats").setLevel(logging.INFO)
 
         # Add basic config children for usage before the single instance check.
         # All the others are added in self._init_keys().
@@ -1486,7 +1494,10 @@ class Config(ConfigObject):
         return os.path.join(self.user_dir, "layouts/")
 
     def _get_emojione_image_dirs(self):
-        return [os.path.join(self.install_dir, "emojione", "svg")]
+        return [self.get_emojione_image_dir()]
+
+    def get_emojione_image_dir(self):
+        return os.path.join(self.install_dir, "emojione", "svg")
 
     def get_system_default_lang_id(self):
         lang_id = locale.getdefaultlocale()[0]
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2017 marmuta <marmvta@gmail.com>
+#
+# This file is part of Onboard.
+#
+# Onboard is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Onboard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+""" Pre-rasterized sprite sheets of the emojione images """
+
+from __future__ import division, print_function, unicode_literals
+
+import os
+import json
+import mmap
+import threading
+from math import ceil, sqrt
+from collections import OrderedDict
+
+import cairo
+from Onboard.Version import require_gi_versions
+require_gi_versions()
+from gi.repository import Gdk, GdkPixbuf
+
+from Onboard.utils import unicode_str, XDGDirs
+from Onboard.Timer import idle_call
+
+import logging
+_logger = logging.getLogger(__name__)
+
+from Onboard.Config import Config
+config = Config()
+
+
+class SpriteSheet:
+    """ All emoji images of one size in a single image surface. """
+
+    def __init__(self, surface, cells, buffer=None):
+        self.surface = surface
+        self._cells = cells    # image basename -> (x, y, w, h)
+        self._buffer = buffer  # memory map the surface was created on
+
+    def get_cell(self, name):
+        return self._cells.get(name)
+
+
+class EmojiSpriteSheets:
+    """
+    Emoji images pre-rasterized into one sprite sheet per image size
+    in device pixels, i.e. per size and window scaling factor.
+
+    Rasterizing hundreds of SVG files is slow. Sheets are built and
+    stored in the user directory on a background thread, the main thread
+    only memory-maps them. Until a sheet is ready, callers load
+    individual image files as before.
+    """
+
+    FILE_VERSION = 1
+    MAX_CELL_SIZE = 64     # largest image edge in pixels to build sheets for
+    MAX_SHEETS = 2         # sheets kept memory-mapped
+    MAX_SHEET_FILES = 4    # sheets kept on disk
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton magic.
+        """
+        if not hasattr(cls, "self"):
+            cls.self = object.__new__(cls, *args, **kwargs)
+            cls.self.construct()
+        return cls.self
+
+    def __init__(self):
+        """
+        Called multiple times, do not use.
+        """
+        pass
+
+    def construct(self):
+        """
+        Singleton constructor, runs only once.
+        """
+        self._sheets = OrderedDict()  # (w, h) -> SpriteSheet
+        self._failed = set()          # sizes that couldn't be built
+        self._building = None         # size being built
+        self._queued = None           # size to build next
+
+    def get_sprite(self, filename, width, height):
+        """
+        Return (surface, x, y, w, h) of the image with the given device
+        pixel size, or None if there is no sheet for it yet.
+        """
+        source_dir = config.get_emojione_image_dir()
+        if os.path.dirname(filename) != source_dir:
+            return None
+
+        key = (int(width), int(height))
+        if min(key) < 1 or max(key) > self.MAX_CELL_SIZE:
+            return None
+
+        sheet = self._sheets.get(key)
+        if sheet is None:
+            sheet = self._load_sheet(key, source_dir)
+            if sheet is None:
+                return None
+        else:
+            self._sheets.move_to_end(key)
+
+        cell = sheet.get_cell(os.path.basename(filename))
+        if cell is None:
+            return None
+        return (sheet.surface,) + tuple(cell)
+
+    def _load_sheet(self, key, source_dir):
+        """ Read the sheet from disk or start building it. """
+        if key in self._failed or key == self._building:
+            return None
+
+        sheet = self._read_sheet(key, source_dir)
+        if sheet is None:
+            self._request_build(key, source_dir)
+        else:
+            self._add_sheet(key, sheet)
+        return sheet
+
+    def _add_sheet(self, key, sheet):
+        self._sheets[key] = sheet
+        while len(self._sheets) > self.MAX_SHEETS:
+            self._sheets.popitem(last=False)
+
+    def _request_build(self, key, source_dir):
+        """ Build one sheet at a time, only the latest size waits. """
+        if self._building is None:
+            self._building = key
+            thread = threading.Thread(name=self.__class__.__name__,
+                                      target=self._build,
+                                      args=(key, source_dir))
+            thread.daemon = True
+            thread.start()
+        else:
+            self._queued = key
+
+    def _build(self, key, source_dir):
+        """
+        Worker thread, rasterizes all images of source_dir straight
+        into a premultiplied ARGB32 surface and stores it. The main
+        thread only has to memory-map the result.
+        """
+        _logger.info("building emoji sprite sheet for {}x{} pixels"
+                     .format(*key))
+        success = False
+        try:
+            names = sorted(fn for fn in os.listdir(source_dir)
+                           if fn.endswith(".svg"))
+            w, h = key
+            ncols = max(1, int(ceil(sqrt(len(names)))))
+            nrows = max(1, int(ceil(len(names) / ncols)))
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32,
+                                         ncols * w, nrows * h)
+            context = cairo.Context(surface)
+            cells = {}
+
+            for i, name in enumerate(names):
+                try:
+                    pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(
+                        os.path.join(source_dir, name), w, h)
+                except Exception as ex:  # GLib.Error
+                    _logger.warning("failed to load emoji image '{}': {}"
+                                    .format(name, unicode_str(ex)))
+                    continue
+
+                pw = min(pixbuf.get_width(), w)
+                ph = min(pixbuf.get_height(), h)
+                x = (i % ncols) * w
+                y = (i // ncols) * h
+                context.save()
+                context.rectangle(x, y, pw, ph)
+                context.clip()
+                Gdk.cairo_set_source_pixbuf(context, pixbuf, x, y)
+                context.paint()
+                context.restore()
+                cells[name] = (x, y, pw, ph)
+
+            surface.flush()
+            header = {"version" : self.FILE_VERSION,
+                      "source_mtime" : self._get_source_mtime(source_dir),
+                      "width" : surface.get_width(),
+                      "height" : surface.get_height(),
+                      "stride" : surface.get_stride(),
+                      "cells" : cells}
+            success = self._write_sheet(key, header, surface.get_data())
+
+        except Exception as ex:
+            _logger.error("failed to build emoji sprite sheet: " +
+                          unicode_str(ex))
+
+        idle_call(self._on_built, key, source_dir, success)
+
+    def _on_built(self, key, source_dir, success):
+        self._building = None
+
+        sheet = self._read_sheet(key, source_dir) if success else None
+        if sheet is None:
+            self._failed.add(key)
+        else:
+            self._add_sheet(key, sheet)
+
+        key, self._queued = self._queued, None
+        if key is not None and \
+           key not in self._sheets:
+            self._load_sheet(key, source_dir)
+
+        return False
+
+    def _read_sheet(self, key, source_dir):
+        """ Memory-map a previously stored sheet, None if unavailable. """
+        header_filename, data_filename = self._get_filenames(key)
+        if not os.path.exists(header_filename):
+            return None
+
+        try:
+            with open(header_filename, encoding="UTF-8") as f:
+                header = json.load(f)
+            if header.get("version") != self.FILE_VERSION or \
+               header.get("source_mtime") != \
+               self._get_source_mtime(source_dir):
+                return None
+
+            width = header["width"]
+            height = header["height"]
+            stride = header["stride"]
+            if stride != cairo.ImageSurface.format_stride_for_width(
+                    cairo.FORMAT_ARGB32, width):
+                return None
+
+            with open(data_filename, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+            if len(buffer) != stride * height:
+                return None
+
+            surface = cairo.ImageSurface.create_for_data(
+                buffer, cairo.FORMAT_ARGB32, width, height, stride)
+            cells = {name : tuple(cell)
+                     for name, cell in header["cells"].items()}
+
+            os.utime(header_filename)  # most recently used
+
+        except (IOError, OSError, ValueError, KeyError) as ex:
+            _logger.warning("failed to read emoji sprite sheet '{}': {}"
+                            .format(data_filename, unicode_str(ex)))
+            return None
+
+        return SpriteSheet(surface, cells, buffer)
+
+    def _write_sheet(self, key, header, data):
+        """ Worker thread, store the sheet and prune old ones. """
+        header_filename, data_filename = self._get_filenames(key)
+        try:
+            XDGDirs.assure_user_dir_exists(os.path.dirname(header_filename))
+            for filename, mode, content in \
+                ((data_filename, "wb", data),
+                 (header_filename, "w", json.dumps(header))):
+                tmp_filename = filename + ".tmp"
+                with open(tmp_filename, mode) as f:
+                    f.write(content)
+                os.rename(tmp_filename, filename)
+
+            self._prune_sheet_files(os.path.dirname(header_filename))
+
+        except (IOError, OSError) as ex:
+            _logger.warning("failed to write emoji sprite sheet '{}': {}"
+                            .format(data_filename, unicode_str(ex)))
+            return False
+
+        return True
+
+    def _prune_sheet_files(self, cache_dir):
+        headers = [os.path.join(cache_dir, fn)
+                   for fn in os.listdir(cache_dir) if fn.endswith(".json")]
+        headers.sort(key=os.path.getmtime, reverse=True)
+        for filename in headers[self.MAX_SHEET_FILES:]:
+            base = os.path.splitext(filename)[0]
+            for fn in (filename, base + ".sheet"):
+                if os.path.exists(fn):
+                    os.remove(fn)
+
+    @staticmethod
+    def _get_filenames(key):
+        base = os.path.join(config.user_dir, "emoji_sprites",
+                            "emojione-{}x{}".format(*key))
+        return base + ".json", base + ".sheet"
+
+    @staticmethod
+    def _get_source_mtime(source_dir):
+        try:
+            return os.path.getmtime(source_dir)
+        except OSError:
+            return None
@@ -24,7 +24,10 @@
 
 from __future__ import division, print_function, unicode_literals
 
+import threading
 from math import pi, sin, cos, sqrt
+from collections import OrderedDict
+from queue import LifoQueue, Empty
 
 import cairo
 from Onboard.Version import require_gi_versions
@@ -36,8 +39,11 @@ from Onboard.KeyCommon   import (KeyCommon, RectKeyCommon,
                                  ImageSlot)
 from Onboard.KeyCommon   import *
 from Onboard.WindowUtils import DwellProgress
-from Onboard.utils       import (brighten, unicode_str,
-                                 gradient_line, drop_shadow,
+from Onboard.EmojiSprites import EmojiSpriteSheets
+from Onboard.Timer       import idle_call
+import Onboard.osk as osk
+from Onboard.utils       import (brighten, unicode_str, EventSource,
+                                 gradient_line,
                                  roundrect_curve, roundrect_curve_custom,
                                  rounded_path,
                                  rounded_polygon_path_to_cairo_path)
@@ -52,13 +58,11 @@ PangoUnscale = 1.0 / Pango.SCALE
 
 
 class Key(KeyCommon):
-    _pango_layouts = None
     _label_extents = None  # resolution independent size {mod_mask: (w, h)}
     _popup_indicator = ""  # font dependent popup indicator (ellipsis)
 
-    _shadow_steps  = 0
-    _shadow_alpha  = 0
-    _shadow_presets = ((1, 0.015), (4, 0.005)) # quality presets (steps, alpha)
+    _shadow_alpha  = 0.02  # shadow opacity per unit of key_shadow_strength
+    _osk_util = osk.Util()
 
     def __init__(self):
         KeyCommon.__init__(self)
@@ -74,22 +78,26 @@ class Key(KeyCommon):
 
     @staticmethod
     def reset_pango_layout():
-        Key._pango_layouts = None
+        PangoLayoutCache().clear()
+        InputlineKey._pango_layout = None
 
     @staticmethod
-    def get_pango_layout(text, font_size, slot = 0):
-        # work around memory leak (gnome #599730)
-        if Key._pango_layouts is None:
-            # use PangoCairo.create_layout once it works with gi (pango >= 1.29.1)
-            #Key._pango_layouts = PangoCairo.create_layout(context)
-            Key._pango_layouts = (
-                Pango.Layout(context = Gdk.pango_context_get()),
-                Pango.Layout(context = Gdk.pango_context_get()),
-                Pango.Layout(context = Gdk.pango_context_get()))
-
-        layout = Key._pango_layouts[slot]
-        Key.prepare_pango_layout(layout, text, font_size)
-        return layout
+    def get_pango_layout(text, font_size):
+        """ Shared layout of the label font, don't modify it. """
+        return PangoLayoutCache().get_layout(
+            text, config.theme_settings.key_label_font, font_size)
+
+    @staticmethod
+    def get_pango_layout_and_size(text, font_size):
+        """ Shared layout and its size in Pango units. """
+        return PangoLayoutCache().get_layout_and_size(
+            text, config.theme_settings.key_label_font, font_size)
+
+    @staticmethod
+    def get_pango_size(text, font_size):
+        """ Size of the label text in Pango units. """
+        return PangoLayoutCache().get_size(
+            text, config.theme_settings.key_label_font, font_size)
 
     @staticmethod
     def prepare_pango_layout(layout, text, font_size):
@@ -101,18 +109,211 @@ class Key(KeyCommon):
         font_description.set_size(max(1, font_size))
         layout.set_font_description(font_description)
 
-    @classmethod
-    def set_shadow_quality(_class, quality):
-        if quality is None:
-            quality = 1
-        _class._shadow_steps, _class._shadow_alpha = \
-                                    _class._shadow_presets[quality]
+
+class KeySurfaceAtlas:
+    """
+    Content-addressed store of pre-rendered key and shadow surfaces.
+
+    Keys with equal geometry, style, colors, state and label produce
+    the same pixels. They share a single surface, which is rendered once
+    and painted at each key's position. Surface keys have to contain
+    everything that affects rendering, see RectKey.get_body_surface_key().
+    """
+    MAX_SIZE = 512
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton magic.
+        """
+        if not hasattr(cls, "self"):
+            cls.self = object.__new__(cls, *args, **kwargs)
+            cls.self.construct()
+        return cls.self
+
+    def __init__(self):
+        """
+        Called multiple times, don't use this.
+        """
+        pass
+
+    def construct(self):
+        """
+        Singleton constructor, runs only once.
+        """
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key, create):
+        """
+        Return the surface for key, call create() to render it on a miss.
+        """
+        surface = self._entries.get(key)
+        if surface is None:
+            self._misses += 1
+            surface = create()
+            if surface is not None:
+                self._entries[key] = surface
+                while len(self._entries) > self.MAX_SIZE:
+                    self._entries.popitem(last=False)
+        else:
+            self._hits += 1
+            self._entries.move_to_end(key)
+        return surface
+
+    def clear(self):
+        if self._entries:
+            _logger.debug("KeySurfaceAtlas: {} surfaces, {} hits, {} misses"
+                          .format(len(self._entries),
+                                  self._hits, self._misses))
+        self._entries.clear()
+
+
+class PangoLayoutCache:
+    """
+    Shaped Pango layouts and measured text sizes, keyed by
+    (text, font, size). Sizes are in Pango units and already include
+    the canvas scale. Layouts are shared, callers must not modify them.
+    Clear after changes to the font dpi.
+    """
+    MAX_LAYOUTS = 256
+    MAX_SIZES = 4096
+
+    # font size for measuring size independent extents
+    BASE_FONT_SIZE = 10000000
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton magic.
+        """
+        if not hasattr(cls, "self"):
+            cls.self = object.__new__(cls, *args, **kwargs)
+            cls.self.construct()
+        return cls.self
+
+    def __init__(self):
+        """
+        Called multiple times, don't use this.
+        """
+        pass
+
+    def construct(self):
+        """
+        Singleton constructor, runs only once.
+        """
+        self._pango_context = None
+        self._font_descriptions = {}
+        self._layouts = OrderedDict()
+        self._sizes = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get_layout(self, text, font, size):
+        key = (text or "", font, max(1, int(size)))
+        return self._get_layout(key)
+
+    def get_layout_and_size(self, text, font, size):
+        """
+        Layout and its size in Pango units, counted as a single lookup.
+        """
+        key = (text or "", font, max(1, int(size)))
+        layout = self._get_layout(key)
+        result = self._sizes.get(key)
+        if result is None:
+            result = tuple(layout.get_size())
+            self._sizes[key] = result
+            if len(self._sizes) > self.MAX_SIZES:
+                self._sizes.popitem(last=False)
+        else:
+            self._sizes.move_to_end(key)
+        return layout, result
+
+    def _get_layout(self, key):
+        layout = self._layouts.get(key)
+        if layout is None:
+            self._misses += 1
+            layout = self._create_layout(*key)
+            self._layouts[key] = layout
+            if len(self._layouts) > self.MAX_LAYOUTS:
+                self._layouts.popitem(last=False)
+        else:
+            self._hits += 1
+            self._layouts.move_to_end(key)
+        return layout
+
+    def get_size(self, text, font, size):
+        """ Width and height of the text in Pango units. """
+        key = (text or "", font, max(1, int(size)))
+        result = self._sizes.get(key)
+        if result is None:
+            layout = self._layouts.get(key)
+            if layout is None:
+                # measure without keeping the layout around
+                self._misses += 1
+                layout = self._create_layout(*key)
+            else:
+                self._hits += 1
+            result = tuple(layout.get_size())
+            self._sizes[key] = result
+            if len(self._sizes) > self.MAX_SIZES:
+                self._sizes.popitem(last=False)
+        else:
+            self._hits += 1
+            self._sizes.move_to_end(key)
+        return result
+
+    def get_base_extents(self, text, font):
+        """ Font size independent extents, pixels per unit of font size. """
+        w, h = self.get_size(text, font, self.BASE_FONT_SIZE)
+        w = w or 1.0
+        h = h or 1.0
+        return w / (Pango.SCALE * self.BASE_FONT_SIZE), \
+               h / (Pango.SCALE * self.BASE_FONT_SIZE)
+
+    def clear(self):
+        if self._layouts or self._sizes:
+            _logger.debug("PangoLayoutCache: {} layouts, {} sizes, "
+                          "{} hits, {} misses"
+                          .format(len(self._layouts), len(self._sizes),
+                                  self._hits, self._misses))
+        # The pango context holds on to the old font dpi.
+        self._pango_context = None
+        self._font_descriptions = {}
+        self._layouts.clear()
+        self._sizes.clear()
+
+    def _create_layout(self, text, font, size):
+        if self._pango_context is None:
+            self._pango_context = Gdk.pango_context_get()
+
+        font_description = self._font_descriptions.get(font)
+        if font_description is None:
+            font_description = Pango.FontDescription(font)
+            self._font_descriptions[font] = font_description
+        font_description = font_description.copy()
+        font_description.set_size(size)
+
+        layout = Pango.Layout(context=self._pango_context)
+        layout.set_text(text, -1)
+        layout.set_width(-1) # no wrapping, ellipsization
+        layout.set_font_description(font_description)
+        return layout
+
+
+def _round_rect(rect, origin):
+    """ Hashable rect relative to origin, free of float noise. """
+    return (round(rect.x - origin.x, 3), round(rect.y - origin.y, 3),
+            round(rect.w, 3), round(rect.h, 3))
+
+def _round_rgba(rgba):
+    return tuple(rgba) if rgba else rgba
 
 
 class RectKey(Key, RectKeyCommon, DwellProgress):
 
     _image_pixbuf = None
     _requested_image_size = None
+    _image_pending = False
     _shadow_surface = None
 
     can_draw_cached = True
@@ -121,7 +322,8 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
         Key.__init__(self)
         RectKeyCommon.__init__(self, id, border_rect)
 
-        self._key_surfaces = {}
+        self._body_surface = None
+        self._key_surfaces = {}  # label layers
 
     def is_key(self):
         """ Is this a key item? """
@@ -135,6 +337,7 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
         self.invalidate_shadow()
 
     def invalidate_key(self):
+        self._body_surface = None
         self._key_surfaces = {}
 
     def invalidate_image(self):
@@ -158,22 +361,139 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
             self.invalidate_caches()
 
     def draw_cached(self, cr):
-        key = (self.label, self.font_size >> 8)
-        entry = self._key_surfaces.get(key)
+        if not self.font_size and self._body_surface is None:
+            return
+
+        # key body, independent of labels
+        entry = self._body_surface
         if entry is None:
-            if self.font_size:
-                entry = self._create_key_surface(cr)
-                self._key_surfaces[key] = entry
+            entry = self._get_layer_surface(cr, self.get_body_surface_key,
+                                            self.draw_body)
+            self._body_surface = entry
+
+        if entry:
+            surface, rect = entry
+            cr.set_source_surface(surface, rect.x, rect.y)
+            cr.paint()
+
+        # label and image overlay
+        key = (self.label, self.font_size >> 8)
+        entry = self._key_surfaces.get(key, False)
+        if entry is False:
+            entry = None
+            if self.font_size and self.has_label_layer():
+                entry = self._get_layer_surface(cr,
+                                                self.get_label_surface_key,
+                                                self.draw_label_layer)
+            self._key_surfaces[key] = entry
 
         if entry:
             surface, rect = entry
             cr.set_source_surface(surface, rect.x, rect.y)
             cr.paint()
 
-    def _create_key_surface(self, base_context):
+    def _get_layer_surface(self, base_context, get_surface_key, draw_func):
+        """ Surface shared with all keys that render identically. """
         rect = self.get_canvas_rect()
         clip_rect = rect.inflate(*self.get_extra_render_size()).int()
 
+        def create():
+            return self._create_key_surface(base_context, clip_rect,
+                                            draw_func)
+
+        surface_key = get_surface_key(clip_rect)
+        if surface_key is None:
+            surface = create()
+        else:
+            surface = KeySurfaceAtlas().get(surface_key, create)
+
+        return surface, clip_rect
+
+    def has_label_layer(self):
+        """ Is there anything to draw on top of the key body? """
+        return bool(self.show_label and
+                    (self.get_label() or
+                     self.get_secondary_label() or
+                     self.popup_id is not None) or
+                    self.show_image and self.image_filenames or
+                    self.is_dwelling())
+
+    def get_body_surface_key(self, clip_rect):
+        """
+        Everything that affects the pixels of the cached key body,
+        None if the surface must not be shared with other keys.
+        """
+        theme_settings = config.theme_settings
+        root = self.get_layout_root()
+        return ("body", type(self), clip_rect.w, clip_rect.h,
+                self._get_shape_key(clip_rect),
+                self.get_style(), self.show_face, self.show_border,
+                _round_rgba(self.get_fill_color()),
+                _round_rgba(self.get_stroke_color()),
+                self.get_stroke_width(), self.get_stroke_gradient(),
+                self.get_light_direction(),
+                self.pressed, self.active, self.scanned, self.id == "SPCE",
+                tuple(root.context.scale_log_to_canvas((1.0, 1.0))),
+                theme_settings.key_fill_gradient,
+                theme_settings.roundrect_radius)
+
+    def get_label_surface_key(self, clip_rect):
+        """
+        Everything that affects the pixels of the cached label layer,
+        None if the surface must not be shared with other keys.
+        """
+        if self.is_dwelling():
+            return None
+
+        theme_settings = config.theme_settings
+        root = self.get_layout_root()
+        image_filename = None
+        if self.image_filenames and self.show_image:
+            if self.active and ImageSlot.ACTIVE in self.image_filenames:
+                image_filename = self.image_filenames.get(ImageSlot.ACTIVE)
+            else:
+                image_filename = self.image_filenames.get(ImageSlot.NORMAL)
+
+        # don't share placeholders with keys whose image has arrived
+        image_pending = False
+        if image_filename:
+            rect = self.get_canvas_label_rect()
+            self.get_image(rect.w, rect.h)
+            image_pending = self.is_image_pending()
+
+        return ("label", type(self), clip_rect.w, clip_rect.h,
+                self.get_style(), self.show_label, self.show_image,
+                _round_rgba(self.get_fill_color()),
+                _round_rgba(self.get_label_color()),
+                _round_rgba(self.get_secondary_label_color()),
+                _round_rgba(self.get_image_color()),
+                self.get_stroke_gradient(), self.get_light_direction(),
+                self.get_label(), self.get_secondary_label(),
+                self.popup_id is None, self.font_size,
+                self.label_x_align, self.label_y_align,
+                _round_rect(self.get_canvas_label_rect(), clip_rect),
+                image_filename, self.image_style, image_pending,
+                tuple(root.context.scale_log_to_canvas((1.0, 1.0))),
+                theme_settings.key_label_font,
+                config.keyboard.show_secondary_labels,
+                config.xid_mode)
+
+    def _get_shape_key(self, clip_rect):
+        """ Key geometry relative to clip_rect. """
+        path = None
+        if self.geometry:
+            x0, y0 = clip_rect.x, clip_rect.y
+            path = tuple((op, tuple(round(c - (y0 if i & 1 else x0), 3)
+                                    for i, c in enumerate(coords)))
+                         for op, coords in self.get_canvas_path().segments)
+
+        return (_round_rect(self.get_canvas_rect(), clip_rect),
+                _round_rect(self.get_canvas_border_rect(), clip_rect),
+                self.get_chamfer_size(),
+                self.get_key_offset_size(),
+                path)
+
+    def _create_key_surface(self, base_context, clip_rect, draw_func):
         # create caching surface
         target = base_context.get_target()
         surface = target.create_similar(cairo.CONTENT_COLOR_ALPHA,
@@ -182,21 +502,30 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
 
         cr.save()
         cr.translate(-clip_rect.x, -clip_rect.y)
-        self.draw(cr)
+        draw_func(cr)
         cr.restore()
 
         Gdk.flush()  # else artefacts in labels and images on Nexus 7, Raring
 
-        return surface, clip_rect
+        return surface
 
     def draw_item(self, context):
-        if context.draw_cached and self.can_draw_cached:
+        if self in context.pending_keys:
+            # surfaces are still being pre-rendered in the background
+            self.draw(context.cr, LOD.MINIMAL)
+        elif context.draw_cached and self.can_draw_cached:
             self.draw_cached(context.cr)
         else:
             self.draw(context.cr, context.lod)
 
     def draw(self, cr, lod=LOD.FULL):
+        self.draw_body(cr, lod)
+        self.draw_label_layer(cr, lod)
+
+    def draw_body(self, cr, lod=LOD.FULL):
         self.draw_geometry(cr, lod)
+
+    def draw_label_layer(self, cr, lod=LOD.FULL):
         self.draw_image(cr, lod)
         self.draw_label(cr, lod)
 
@@ -521,8 +850,8 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
            len(label) == 1 and \
            config.keyboard.show_secondary_labels:
             font_size = self.font_size * 0.5
-            layout = self.get_pango_layout(label, font_size, 1)
-            src_size = layout.get_size()
+            layout, src_size = self.get_pango_layout_and_size(label,
+                                                              font_size)
             src_size = (src_size[0] * PangoUnscale, src_size[1] * PangoUnscale)
             xalign, yalign = self.align_secondary_label(src_size,
                                                 (canvas_rect.w, canvas_rect.h))
@@ -538,9 +867,8 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
 
             label = self._get_popup_indicator()
             font_size = self.font_size
-            layout = self.get_pango_layout(label, font_size, 2)
-
-            src_size = layout.get_size()
+            layout, src_size = self.get_pango_layout_and_size(label,
+                                                              font_size)
             src_size = (src_size[0] * PangoUnscale, src_size[1] * PangoUnscale)
             xalign, yalign = self.align_popup_indicator(src_size,
                                                  (canvas_rect.w, canvas_rect.h))
@@ -554,8 +882,8 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
         label = self.get_label()
         if label:
             font_size = self.font_size
-            layout = self.get_pango_layout(label, font_size, 0)
-            src_size = layout.get_size()
+            layout, src_size = self.get_pango_layout_and_size(label,
+                                                              font_size)
             src_size = (src_size[0] * PangoUnscale, src_size[1] * PangoUnscale)
             xalign, yalign = self.align_label(src_size,
                                                 (canvas_rect.w, canvas_rect.h))
@@ -576,12 +904,11 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
         if not result:
             labels = ("…", "...")  # label candidates
 
-            BASE_FONTDESCRIPTION_SIZE = 10000000
             wmin = None
             result = ""
             for label in labels:
-                layout = self.get_pango_layout(label, BASE_FONTDESCRIPTION_SIZE, 2)
-                w = layout.get_size()[0]
+                w = self.get_pango_size(label,
+                                        PangoLayoutCache.BASE_FONT_SIZE)[0]
                 if wmin is None or w < wmin:
                     wmin = w
                     result = label
@@ -630,6 +957,8 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
 
         pixbuf = self.get_image(rect.w, rect.h)
         if not pixbuf:
+            if self.is_image_pending():
+                self._draw_image_placeholder(context, rect)
             return
 
         src_size = (pixbuf.get_width(), pixbuf.get_height())
@@ -657,13 +986,22 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
 
                 pixbuf.draw(context, r, rgba, self.image_style)
 
+    def _draw_image_placeholder(self, context, rect):
+        """ Faint square where the image will appear once loaded. """
+        rgba = self.get_image_color() or self.get_label_color()
+        size = min(rect.w, rect.h) * 0.5
+        xalign, yalign = self.align_label((size, size), (rect.w, rect.h))
+        r = Rect(rect.x + xalign, rect.y + yalign, size, size)
+
+        context.set_source_rgba(rgba[0], rgba[1], rgba[2], rgba[3] * 0.2)
+        roundrect_curve(context, r, 30)
+        context.fill()
+
     def draw_shadow_cached(self, context):
         entry = self._shadow_surface
         if entry is None:
             if config.theme_settings.key_shadow_strength:
-                entry = self.create_shadow_surface(context,
-                                              self._shadow_steps,
-                                              self._shadow_alpha)
+                entry = self._get_shadow_surface(context)
                 self._shadow_surface = entry
 
         if entry:
@@ -671,12 +1009,44 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
             context.set_source_rgba(0.0, 0.0, 0.0, 1.0)
             context.mask_surface(surface, rect.x, rect.y)
 
-    def create_shadow_surface(self, base_context, shadow_steps, shadow_alpha):
+    def _get_shadow_surface(self, base_context):
+        """ Shadow surface shared with all keys of the same shape. """
+        rect = self.get_canvas_rect()
+        if rect.is_empty():
+            return None
+
+        # Remember the clip rect relative to the key position,
+        # so that other keys know where to paint the surface.
+        origin = rect.int()
+
+        def create():
+            entry = self.create_shadow_surface(base_context)
+            if entry is None:
+                return None
+            surface, clip_rect = entry
+            return surface, clip_rect.offset(-origin.x, -origin.y)
+
+        theme_settings = config.theme_settings
+        root = self.get_layout_root()
+        shadow_key = ("shadow", type(self),
+                      self._get_shape_key(origin),
+                      self.get_light_direction(),
+                      theme_settings.key_shadow_strength,
+                      theme_settings.key_shadow_size,
+                      config.window.transparent_background,
+                      min(root.context.scale_log_to_canvas((1.0, 1.0))))
+
+        entry = KeySurfaceAtlas().get(shadow_key, create)
+        if entry is None:
+            return None
+        surface, clip_rect = entry
+        return surface, clip_rect.offset(origin.x, origin.y)
+
+    def create_shadow_surface(self, base_context):
         """
         Draw shadow and shaded halo.
-        Somewhat slow, make sure to cache the result.
-        Glitchy, if the clip-rect covers only a single button (Precise),
-        therefore, draw only with unrestricted clipping rect.
+        The key shape is rasterized once and blurred in native code,
+        still, make sure to cache the result.
         """
         rect = self.get_canvas_rect()
         root = self.get_layout_root()
@@ -688,14 +1058,14 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
         alpha = pi / 2 + self.get_light_direction()
 
         shadow_opacity = config.theme_settings.key_shadow_strength * \
-                         shadow_alpha
+                         self._shadow_alpha
         shadow_scale   = config.theme_settings.key_shadow_size / 20.0
         shadow_radius  = max(extent * shadow_scale, 1.0)
         shadow_displacement = max(extent * shadow_scale * 0.26, 1.0)
         shadow_offset  = (shadow_displacement * cos(alpha),
                           shadow_displacement * sin(alpha))
 
-        has_halo = shadow_steps > 1 and not config.window.transparent_background
+        has_halo = not config.window.transparent_background
         halo_opacity   = shadow_opacity * 0.11
         halo_radius    = max(extent * 8.0, 1.0)
 
@@ -706,43 +1076,59 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
             clip_rect = clip_rect.inflate(shadow_radius * 1.3)
         clip_rect = clip_rect.int()
 
+        # rasterize the displaced key shape
+        shape = cairo.ImageSurface(cairo.FORMAT_A8, clip_rect.w, clip_rect.h)
+        context = cairo.Context(shape)
+        context.translate(shadow_offset[0] - clip_rect.x,
+                          shadow_offset[1] - clip_rect.y)
+        self._build_canvas_path(context, rect)
+        context.set_source_rgba(0.0, 0.0, 0.0, 1.0)
+        context.fill()
+        shape.flush()
+
         # create caching surface
         target = base_context.get_target()
         surface = target.create_similar(cairo.CONTENT_ALPHA,
                                         clip_rect.w, clip_rect.h)
         context = cairo.Context(surface)
 
-        # paint the surface
-        context.save()
-        context.translate(-clip_rect.x, -clip_rect.y)
-
-        context.rectangle(*clip_rect)
-        context.clip()
-
-        context.push_group_with_content(cairo.CONTENT_ALPHA)
-        self._build_canvas_path(context, rect)
-        context.set_source_rgba(0.0, 0.0, 0.0, 1.0)
-        context.fill()
-        shape = context.pop_group()
-
-        # shadow
-        drop_shadow(context, shape, rect,
-                    shadow_radius, shadow_offset, shadow_opacity, shadow_steps)
-        # halo
+        # shadow and halo
+        layers = [(shadow_radius, shadow_opacity)]
         if has_halo:
-            drop_shadow(context, shape, rect,
-                        halo_radius, shadow_offset, halo_opacity, shadow_steps)
+            layers.append((halo_radius, halo_opacity))
+        for radius, opacity in layers:
+            context.set_source_rgba(0.0, 0.0, 0.0, opacity)
+            context.mask_surface(self._blur_shape(shape, radius), 0, 0)
 
         # cut out the key area, the key may be transparent
+        context.translate(-clip_rect.x, -clip_rect.y)
         context.set_operator(cairo.OPERATOR_CLEAR)
         context.set_source_rgba(0.0, 0.0, 0.0, 1.0)
         self._build_canvas_path(context, rect)
         context.fill()
 
-        context.restore()
-
         return surface, clip_rect
 
+    @classmethod
+    def _blur_shape(_class, shape, radius):
+        """
+        Blurred copy of the A8 surface shape. Three box blur passes
+        of about sigma radius approximate a gaussian blur.
+        """
+        w = shape.get_width()
+        h = shape.get_height()
+        surface = cairo.ImageSurface(cairo.FORMAT_A8, w, h)
+        context = cairo.Context(surface)
+        context.set_source_surface(shape, 0, 0)
+        context.paint()
+        surface.flush()
+
+        sigma = radius * 0.3  # matches the spread of the former shadows
+        _class._osk_util.blur_alpha(surface.get_data(), w, h,
+                                    surface.get_stride(), int(round(sigma)))
+        surface.mark_dirty()
+        return surface
+
     def _build_canvas_path(self, cr, rect = None, path = None):
         """ Build cairo path of the key geometry. """
         if self.geometry:
@@ -815,15 +1201,8 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
 
     def calc_label_base_extents(self, label):
         """ Calculate font-size independent extents. """
-        cr = Gdk.pango_context_get()
-        layout = Pango.Layout(cr)
-        BASE_FONTDESCRIPTION_SIZE = 10000000
-        self.prepare_pango_layout(layout, label, BASE_FONTDESCRIPTION_SIZE)
-        w, h = layout.get_size()   # In Pango units
-        w = w or 1.0
-        h = h or 1.0
-        return w / (Pango.SCALE * BASE_FONTDESCRIPTION_SIZE), \
-               h / (Pango.SCALE * BASE_FONTDESCRIPTION_SIZE)
+        return PangoLayoutCache().get_base_extents(
+            label, config.theme_settings.key_label_font)
 
     def invalidate_label_extents(self):
         """
@@ -856,19 +1235,21 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
         pixbuf = self._image_pixbuf.get(slot)
         size = self._requested_image_size.get(slot)
 
+        self._image_pending = False
         if not pixbuf or \
            size[0] != int(width) or size[1] != int(height):
             pixbuf = None
             filename = config.get_image_filename(image_filename)
             if filename:
-                _logger.debug("loading image '{}'".format(filename))
+                pixbuf = SpritePixBuf. \
+                    from_file_and_size(filename, width, height)
 
-                try:
-                    pixbuf = PixBufScaled. \
-                        from_file_and_size(filename, width, height)
-                except Exception as ex: # private exception gi._glib.GError when
-                                        # librsvg2-common wasn't installed
-                    _logger.error("get_image(): " + unicode_str(ex))
+                # Decode on a worker thread, draw a placeholder meanwhile.
+                if not pixbuf:
+                    loader = ImageLoader()
+                    pixbuf = loader.request(filename, width, height, self)
+                    self._image_pending = pixbuf is None and \
+                        loader.is_loading(filename, width, height)
 
                 if pixbuf:
                     self._requested_image_size[slot] = (int(width), int(height))
@@ -877,6 +1258,10 @@ class RectKey(Key, RectKeyCommon, DwellProgress):
 
         return pixbuf
 
+    def is_image_pending(self):
+        """ Is the image of the last get_image() call still loading? """
+        return self._image_pending
+
     def _label_iterations(self, lod):
         stroke_gradient = self.get_stroke_gradient()
         if lod == LOD.FULL and \
@@ -989,12 +1374,10 @@ class FlatKey(FullSizeKey):
     def __init__(self, id="", border_rect=None):
         super(FlatKey, self).__init__(id, border_rect)
 
-    def draw(self, context, lod=LOD.FULL):
+    def draw_body(self, context, lod=LOD.FULL):
         # draw only when pressed, to blend in with the word list bar
         if self.pressed or self.active or self.scanned:
             self.draw_geometry(context, lod)
-        self.draw_image(context, lod)
-        self.draw_label(context, lod)
 
     def get_stroke_width(self):
         # Turn down stroke width -> no annoying banding at
@@ -1018,6 +1401,7 @@ class WordKey(FixedFontMixin, BarKey):
 class InputlineKey(FixedFontMixin, RectKey, InputlineKeyCommon):
 
     cursor = 0
+    _pango_layout = None
 
     def __init__(self, id="", border_rect = None):
         RectKey.__init__(self, id, border_rect)
@@ -1034,6 +1418,10 @@ class InputlineKey(FixedFontMixin, RectKey, InputlineKeyCommon):
         dir = Pango.find_base_dir(line, -1)
         self.ltr = dir != Pango.Direction.RTL
 
+    def get_label_surface_key(self, clip_rect):
+        # Content is the text context, don't share the surface.
+        return None
+
     def draw_label(self, context, lod):
         layout, rect, cursor_rect, layout_pos = self._calc_layout_params()
         cursor_width = cursor_rect.h * 0.075
@@ -1058,12 +1446,19 @@ class InputlineKey(FixedFontMixin, RectKey, InputlineKeyCommon):
         context.set_line_width(cursor_width)
         context.stroke()
 
-        # reset attributes; layout is reused by all keys due to memory leak
+        # reset attributes; layout is reused due to memory leak
         layout.set_attributes(Pango.AttrList())
 
     def get_layout(self):
+        # Attributes change with the text, keep it out of the shared cache.
+        # Work around memory leak (gnome #599730) by reusing one layout.
+        if InputlineKey._pango_layout is None:
+            InputlineKey._pango_layout = \
+                Pango.Layout(context=Gdk.pango_context_get())
+
         text, attrs = self._build_layout_contents()
-        layout = self.get_pango_layout(text, self.font_size)
+        layout = InputlineKey._pango_layout
+        self.prepare_pango_layout(layout, text, self.font_size)
         layout.set_attributes(attrs)
         layout.set_auto_dir(True)
         return layout
@@ -1244,9 +1639,9 @@ class PixBufScaled:
     _real_height = 0
 
     @staticmethod
-    def from_file_and_size(filename, width, height):
+    def from_file_and_size(filename, width, height, scale=None):
         pixbuf = PixBufScaled()
-        pixbuf._load(filename, width, height)
+        pixbuf._load(filename, width, height, scale)
         return pixbuf
 
     def get_width(self):
@@ -1255,8 +1650,9 @@ class PixBufScaled:
     def get_height(self):
         return self._height
 
-    def _load(self, filename, width, height):
-        scale = config.window_scaling_factor
+    def _load(self, filename, width, height, scale=None):
+        if scale is None:
+            scale = config.window_scaling_factor
         load_width = width * scale
         load_height = height * scale
 
@@ -1268,6 +1664,9 @@ class PixBufScaled:
         self._width = self._real_width / scale
         self._height = self._real_height / scale
 
+    def _set_source(self, context):
+        Gdk.cairo_set_source_pixbuf(context, self._pixbuf, 0, 0)
+
     def draw(self, context, rect, rgba, image_style):
         """
         Draw the image in the theme's label color.
@@ -1282,7 +1681,7 @@ class PixBufScaled:
 
         # colored?
         if image_style == ImageStyle.MULTI_COLOR:
-            Gdk.cairo_set_source_pixbuf(context, self._pixbuf, 0, 0)
+            self._set_source(context)
             context.paint()
 
         # grayscale?
@@ -1290,7 +1689,7 @@ class PixBufScaled:
             # gdk_pixbuf_saturate_and_pixelate ()
             if 0:
                 # must have non-black background
-                Gdk.cairo_set_source_pixbuf(context, self._pixbuf, 0, 0)
+                self._set_source(context)
                 pattern = context.get_source()
                 k = 1 / 256.0
                 context.set_source_rgb(k, k, k)
@@ -1299,15 +1698,15 @@ class PixBufScaled:
                 # cairo.OPERATOR_HSL_LUMINOSITY doesn't exist in python bindings
                 # CAIRO_OPERATOR_HSL_LUMINOSITY = 28
                 context.set_operator(28)
-                Gdk.cairo_set_source_pixbuf(context, self._pixbuf, 0, 0)
+                self._set_source(context)
                 context.paint()
             elif 0:
-                Gdk.cairo_set_source_pixbuf(context, self._pixbuf, 0, 0)
+                self._set_source(context)
                 context.paint()
 
                 import colorsys
                 rgb = colorsys.hls_to_rgb(0, 0.5, 0.2)
-                Gdk.cairo_set_source_pixbuf(context, self._pixbuf, 0, 0)
+                self._set_source(context)
                 pattern = context.get_source()
 
                 context.set_source_rgb(*rgb)
@@ -1315,12 +1714,12 @@ class PixBufScaled:
                 context.paint()
             else:
 
-                Gdk.cairo_set_source_pixbuf(context, self._pixbuf, 0, 0)
+                self._set_source(context)
                 pattern = context.get_source()
 
                 context.push_group_with_content(cairo.CONTENT_COLOR_ALPHA)
 
-                Gdk.cairo_set_source_pixbuf(context, self._pixbuf, 0, 0)
+                self._set_source(context)
                 context.paint()
 
                 import colorsys
@@ -1336,7 +1735,7 @@ class PixBufScaled:
 
         # single color
         else:
-            Gdk.cairo_set_source_pixbuf(context, self._pixbuf, 0, 0)
+            self._set_source(context)
             pattern = context.get_source()
             context.set_source_rgba(*rgba)
             context.mask(pattern)
@@ -1344,3 +1743,159 @@ class PixBufScaled:
         context.restore()
 
 
+
+
+class SpritePixBuf(PixBufScaled):
+    """
+    Image drawn from its cell in an emoji sprite sheet.
+    """
+    _surface = None
+    _x = 0
+    _y = 0
+
+    @staticmethod
+    def from_file_and_size(filename, width, height):
+        """ None if there is no sprite sheet for this size (yet). """
+        scale = config.window_scaling_factor
+        sprite = EmojiSpriteSheets().get_sprite(filename,
+                                                width * scale,
+                                                height * scale)
+        if sprite is None:
+            return None
+
+        pixbuf = SpritePixBuf()
+        pixbuf._surface, pixbuf._x, pixbuf._y, \
+            pixbuf._real_width, pixbuf._real_height = sprite
+        pixbuf._width = pixbuf._real_width / scale
+        pixbuf._height = pixbuf._real_height / scale
+        return pixbuf
+
+    def draw(self, context, rect, rgba, image_style):
+        # don't bleed into neighboring cells
+        context.save()
+        context.rectangle(rect.x, rect.y, self._width, self._height)
+        context.clip()
+        super(SpritePixBuf, self).draw(context, rect, rgba, image_style)
+        context.restore()
+
+    def _set_source(self, context):
+        context.set_source_surface(self._surface, -self._x, -self._y)
+
+
+class ImageLoader(EventSource):
+    """
+    Key images decoded and scaled on background threads.
+
+    Loading SVG files is slow, doing it in the draw path blocks the first
+    frame after layout loads and resizes. Requests are queued for a small
+    pool of worker threads, the most recent first, and the results kept
+    in a bounded cache. Once an image is ready, "images-loaded" is emitted
+    in the main thread with the keys that asked for it.
+    """
+
+    MAX_IMAGES = 256   # decoded images kept in memory
+    MAX_WORKERS = 2
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton magic.
+        """
+        if not hasattr(cls, "self"):
+            cls.self = object.__new__(cls, *args, **kwargs)
+            cls.self.construct()
+        return cls.self
+
+    def __init__(self):
+        """
+        Called multiple times, don't use this.
+        """
+        pass
+
+    def construct(self):
+        """
+        Singleton constructor, runs only once.
+        """
+        EventSource.__init__(self, ["images-loaded"])
+
+        self._images = OrderedDict()  # key -> PixBufScaled, False on error
+        self._pending = {}            # key -> requesting keys
+        self._queue = LifoQueue()
+        self._workers = []
+
+    def request(self, filename, width, height, requester=None):
+        """
+        Return the image if it is loaded, else start loading it and
+        return None. Width and height in canvas coordinates.
+        """
+        key = self._get_key(filename, width, height)
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+            return image or None
+
+        requesters = self._pending.get(key)
+        if requesters is None:
+            requesters = []
+            self._pending[key] = requesters
+            self._queue.put((key, width, height))
+            self._start_worker()
+        if requester is not None and \
+           requester not in requesters:
+            requesters.append(requester)
+
+        return None
+
+    def is_loading(self, filename, width, height):
+        return self._get_key(filename, width, height) in self._pending
+
+    @staticmethod
+    def _get_key(filename, width, height):
+        return (filename, int(width), int(height),
+                config.window_scaling_factor)
+
+    def _start_worker(self):
+        if len(self._workers) < min(self._queue.qsize(), self.MAX_WORKERS):
+            thread = threading.Thread(name=self.__class__.__name__,
+                                      target=self._work)
+            thread.daemon = True
+            self._workers.append(thread)
+            thread.start()
+
+    def _work(self):
+        """ Worker thread, runs until the queue is drained. """
+        while True:
+            try:
+                key, width, height = self._queue.get_nowait()
+            except Empty:
+                break
+
+            filename, _w, _h, scale = key
+            _logger.debug("loading image '{}'".format(filename))
+            try:
+                image = PixBufScaled.from_file_and_size(filename,
+                                                        width, height, scale)
+            except Exception as ex: # private exception gi._glib.GError when
+                                    # librsvg2-common wasn't installed
+                _logger.error("ImageLoader: " + unicode_str(ex))
+                image = False
+
+            idle_call(self._on_loaded, key, image)
+
+        idle_call(self._on_worker_done, threading.current_thread())
+
+    def _on_worker_done(self, thread):
+        if thread in self._workers:
+            self._workers.remove(thread)
+        self._start_worker()  # requests may have arrived meanwhile
+        return False
+
+    def _on_loaded(self, key, image):
+        self._images[key] = image
+        while len(self._images) > self.MAX_IMAGES:
+            self._images.popitem(last=False)
+
+        # redraw placeholders, loaded or not
+        requesters = self._pending.pop(key, [])
+        if requesters:
+            self.emit("images-loaded", requesters)
+        return False
@@ -40,7 +40,7 @@ from Onboard.TouchInput     import TouchInput
 from Onboard                import KeyCommon
 from Onboard.Layout         import LayoutRoot, LayoutPanel
 from Onboard.LayoutView     import LayoutView
-from Onboard.KeyGtk         import RectKey
+from Onboard.KeyGtk         import RectKey, PangoLayoutCache
 from Onboard.KeyCommon      import ImageSlot
 
 import Onboard.osk as osk
@@ -265,7 +265,6 @@ class LabelPopup(KeyboardPopupDrawable):
     ARROW_WIDTH  = 0.3
     LABEL_MARGIN = 0.1
 
-    _pango_layout = None
     _osk_util = osk.Util()
 
     def __init__(self):
@@ -282,8 +281,6 @@ class LabelPopup(KeyboardPopupDrawable):
 
     def on_draw(self, widget, context):
         global popup_fill_color, popup_label_color
-        if not LabelPopup._pango_layout:
-            LabelPopup._pango_layout = Pango.Layout(context=Gdk.pango_context_get())
 
         rect = Rect(0, 0, self.get_allocated_width(),
                           self.get_allocated_height())
@@ -330,21 +327,17 @@ class LabelPopup(KeyboardPopupDrawable):
         context.paint_with_alpha(self._opacity)
 
     def _draw_text(self, context, text, rect, rgba):
-        layout = self._pango_layout
-        layout.set_text(text, -1)
+        cache = PangoLayoutCache()
+        font = config.theme_settings.key_label_font
 
         # find text extents
-        font_description = Pango.FontDescription( \
-                                        config.theme_settings.key_label_font)
-        base_extents = self._calc_base_layout_extents(layout, font_description)
+        base_extents = cache.get_base_extents(text, font)
 
         # scale label to the available rect
         font_size = self._calc_font_size(rect, base_extents)
-        font_description.set_size(max(1, font_size))
-        layout.set_font_description(font_description)
+        layout, (w, h) = cache.get_layout_and_size(text, font, font_size)
 
         # center
-        w, h = layout.get_size()
         w /= Pango.SCALE
         h /= Pango.SCALE
         offset = rect.align_rect(Rect(0, 0, w, h)).get_position()
@@ -363,20 +356,6 @@ class LabelPopup(KeyboardPopupDrawable):
         else:
             return int(size_for_maximum_height)
 
-    @staticmethod
-    def _calc_base_layout_extents(layout, font_description):
-        BASE_FONTDESCRIPTION_SIZE = 10000000
-
-        font_description.set_size(BASE_FONTDESCRIPTION_SIZE)
-        layout.set_font_description(font_description)
-
-        w, h = layout.get_size()   # In Pango units
-        w = w or 1.0
-        h = h or 1.0
-        extents = (w / (Pango.SCALE * BASE_FONTDESCRIPTION_SIZE),
-                   h / (Pango.SCALE * BASE_FONTDESCRIPTION_SIZE))
-        return extents
-
     def get_key(self):
         return self._key
 
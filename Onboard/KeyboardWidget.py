@@ -475,8 +475,9 @@ class KeyboardWidget(Gtk.DrawingArea, WindowManipulatorAspectRatio,
 
             self.invalidate_for_resize()
 
+            # Once running, surfaces are rendered in the background.
             win = window.get_window()
-            if win:
+            if win and self._starting_up:
                 context = win.cairo_create()
                 self.render(context)
 
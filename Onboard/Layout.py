@@ -23,7 +23,7 @@
 import time
 from math import exp
 
-from Onboard.utils import Rect, TreeItem
+from Onboard.utils import Rect, RectGrid, TreeItem
 from Onboard.Timer import Timer, idle_call
 
 from Onboard.Config import Config
@@ -199,10 +199,13 @@ class LayoutRoot:
 
     def invalidate_geometry_caches(self):
         # speed up hit testing
-        self._cached_hit_rects = {}
+        self._cached_hit_grids = {}
         self._last_hit_args = None
         self._last_hit_key = None
 
+        # speed up partial redraws
+        self._cached_draw_grid = None
+
     def invalidate_font_sizes(self):
         """
         Update font_sizes at the next possible chance.
@@ -317,24 +320,42 @@ class LayoutRoot:
 
         key = None
         x, y = point
-        hit_rects = self._get_hit_rects(active_layer_ids)
-        for x0, y0, x1, y1, k in hit_rects:
-            # Inlined test, not using Rect.is_point_within for speed.
-            if x >= x0 and x < x1 and \
-               y >= y0 and y < y1:
-                if k.geometry is None or \
-                   k.get_hit_path().is_point_within(point):
-                    key = k
-                    break
+        hit_grid = self._get_hit_grid(active_layer_ids)
+        for k in hit_grid.get_items_at(x, y):
+            if k.geometry is None or \
+               k.get_hit_path().is_point_within(point):
+                key = k
+                break
 
         self._last_hit_args = args
         self._last_hit_key = key
 
         return key
 
-    def _get_hit_rects(self, active_layer_ids):
+    def get_items_to_draw(self, draw_rect):
+        """
+        Visible items intersecting draw_rect, grouped by parent,
+        in drawing order.
+        """
+        grid = self._cached_draw_grid
+        if grid is None:
+            grid = RectGrid(item.get_canvas_border_rect().to_extents() +
+                            (item,)
+                            for item in self.iter_visible_items())
+            self._cached_draw_grid = grid
+
+        items_to_draw = {}
+        for item in grid.get_items_in_rect(draw_rect):
+            items = items_to_draw.get(item.parent)
+            if items is None:
+                items_to_draw[item.parent] = [item]
+            else:
+                items.append(item)
+        return items_to_draw
+
+    def _get_hit_grid(self, active_layer_ids):
         try:
-            hit_rects = self._cached_hit_rects[active_layer_ids]
+            hit_grid = self._cached_hit_grids[active_layer_ids]
         except KeyError:
             # All visible and sensitive key items sorted by z-order.
             # Keys of the active layer have priority over non-layer keys
@@ -351,9 +372,11 @@ class LayoutRoot:
                 if r is not None:  # not clipped away?
                     hit_rects.append(r.to_extents() + (item,))
 
-            self._cached_hit_rects[active_layer_ids] = hit_rects
+            # Candidates per grid cell, still sorted by z-order.
+            hit_grid = RectGrid(hit_rects)
+            self._cached_hit_grids[active_layer_ids] = hit_grid
 
-        return hit_rects
+        return hit_grid
 
     def init_chamfer_sizes(self):
         chamfer_sizes = self._calc_chamfer_sizes()
@@ -986,7 +1009,8 @@ class LayoutItem(TreeItem):
     def draw_tree(self, context):
         """
         Traverses top to bottom all visible layout items of the
-        layout tree. Invisible paths are cut short.
+        layout tree. Invisible paths are cut short, and so are
+        items outside of the damaged area.
         """
         if self.visible:
             if context.draw_rect.intersects(self.get_canvas_border_rect()):
@@ -998,7 +1022,8 @@ class LayoutItem(TreeItem):
 
                 self.draw_item(context)
 
-                for item in self.items:
+                # children intersecting draw_rect, see get_items_to_draw()
+                for item in context.items_to_draw.get(self, ()):
                     item.draw_tree(context)
 
                 if self.clip_rect is not None:
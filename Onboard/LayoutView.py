@@ -22,19 +22,20 @@
 from __future__ import division, print_function, unicode_literals
 
 import time
+from collections import deque
 from math import pi
 
 import cairo
 from Onboard.Version import require_gi_versions
 require_gi_versions()
-from gi.repository         import Gtk, Gdk, GdkPixbuf
+from gi.repository         import Gtk, Gdk, GdkPixbuf, GLib
 
 from Onboard.utils         import Rect, \
                                   roundrect_arc, roundrect_curve, \
                                   gradient_line, brighten, \
-                                  unicode_str
+                                  unicode_str, LatencyStats
 from Onboard.WindowUtils   import get_monitor_dimensions
-from Onboard.KeyGtk        import Key
+from Onboard.KeyGtk        import KeySurfaceAtlas, ImageLoader
 from Onboard.KeyCommon     import LOD
 from Onboard.definitions   import UIMask
 
@@ -54,21 +55,31 @@ class LayoutView:
     Viewer for a tree of layout items.
     """
 
+    # Maximum time in seconds spent per idle slice of the
+    # background pre-rendering of key surfaces.
+    PRE_RENDER_SLICE = 0.01
+
     def __init__(self, keyboard):
         self.keyboard = keyboard
         self.supports_alpha = False
 
         self._lod = LOD.FULL
-        self._shadow_quality_valid = False
         self._last_canvas_shadow_rect = Rect()
 
         self._starting_up = True
         self._keys_pre_rendered = False
 
+        self._pre_render_queue = deque()
+        self._pre_render_pending = set()  # keys still without surfaces
+        self._pre_render_source_id = None
+
         self.keyboard.register_view(self)
+        ImageLoader().connect("images-loaded", self._on_images_loaded)
 
     def cleanup(self):
+        ImageLoader().disconnect("images-loaded", self._on_images_loaded)
         self.keyboard.deregister_view(self)
+        self._stop_pre_render()
 
         # free xserver memory
         self.invalidate_keys()
@@ -80,11 +91,19 @@ class LayoutView:
 
     def on_layout_loaded(self):
         """ Layout has been loaded. """
-        self.invalidate_shadow_quality()
+        self._stop_pre_render()
 
     def get_layout(self):
         return self.keyboard.layout
 
+    def _on_images_loaded(self, keys):
+        """ Replace the placeholders of keys in this view. """
+        layout = self.get_layout()
+        if layout:
+            keys = [key for key in keys
+                    if key.get_root_decorator() is layout]
+            self.redraw(keys)
+
     def get_color_scheme(self):
         return self.keyboard.color_scheme
 
@@ -97,6 +116,10 @@ class LayoutView:
             layout.invalidate_font_sizes()
             # self.invalidate_label_extents()
             self.keyboard.invalidate_for_resize()
+            if self._lod == LOD.FULL:
+                self._start_pre_render()
+            else:
+                self._stop_pre_render()
 
     def invalidate_keys(self):
         """
@@ -107,6 +130,7 @@ class LayoutView:
         if layout:
             for item in layout.iter_keys():
                 item.invalidate_key()
+        KeySurfaceAtlas().clear()
 
     def invalidate_images(self):
         """
@@ -126,9 +150,7 @@ class LayoutView:
         if layout:
             for item in layout.iter_keys():
                 item.invalidate_shadow()
-
-    def invalidate_shadow_quality(self):
-        self._shadow_quality_valid = False
+        KeySurfaceAtlas().clear()
 
     def invalidate_label_extents(self):
         """
@@ -242,16 +264,88 @@ class LayoutView:
         if not layout.get_font_sizes_valid():
             self.update_labels()
 
-        self._auto_select_shadow_quality(context)
-
         # run through all visible layout items
         for item in layout.iter_visible_items():
             if item.is_key():
                 item.draw_shadow_cached(context)
                 item.draw_cached(context)
 
+        self._stop_pre_render()
         self._keys_pre_rendered = True
 
+    def _start_pre_render(self):
+        """
+        Re-render key surfaces progressively in idle time, keys of the
+        visible layers first. Until their surfaces are ready, keys are
+        drawn uncached at minimal level of detail.
+        """
+        self._stop_pre_render()
+
+        layout = self.get_layout()
+        if not layout:
+            return
+
+        keys = [item for item in layout.iter_visible_items()
+                if item.is_key() and item.can_draw_cached]
+        visible_keys = set(keys)
+        keys += [key for key in layout.iter_keys()
+                 if key not in visible_keys and key.can_draw_cached]
+
+        self._pre_render_queue = deque(keys)
+        self._pre_render_pending = set(keys)
+        # Idle priority lets the fast initial frame be drawn first.
+        self._pre_render_source_id = \
+            GLib.idle_add(self._on_pre_render_slice)
+
+    def _stop_pre_render(self):
+        if self._pre_render_source_id is not None:
+            GLib.source_remove(self._pre_render_source_id)
+            self._pre_render_source_id = None
+        self._pre_render_queue = deque()
+        self._pre_render_pending = set()
+
+    def _on_pre_render_slice(self):
+        """
+        Render surfaces of queued keys for at most PRE_RENDER_SLICE
+        seconds, then have the finished keys redrawn.
+        """
+        window = self.get_window()
+        if not window:
+            # Nothing to render for; surfaces are created on demand.
+            self._pre_render_source_id = None
+            self._stop_pre_render()
+            return False
+
+        # Surfaces are created similar to the window's target.
+        target = window.create_similar_surface(cairo.CONTENT_COLOR_ALPHA,
+                                               1, 1)
+        context = cairo.Context(target)
+
+        layout = self.get_layout()
+        if not layout.get_font_sizes_valid():
+            self.update_labels()
+
+        queue = self._pre_render_queue
+        pending = self._pre_render_pending
+        keys = []
+        deadline = time.time() + self.PRE_RENDER_SLICE
+        while queue and time.time() < deadline:
+            key = queue.popleft()
+            key.draw_shadow_cached(context)
+            key.draw_cached(context)
+            pending.discard(key)
+            keys.append(key)
+
+        if queue:
+            self.redraw(keys, False)
+            return True
+
+        # Done; redraw all, shadows may reach beyond the keys.
+        self._pre_render_source_id = None
+        self._pre_render_pending = set()
+        self.redraw()
+        return False
+
     def _can_draw_cached(self, lod):
         """
         Draw cached key surfaces?
@@ -273,6 +367,9 @@ class LayoutView:
         if not layout:
             return
 
+        stats = LatencyStats()
+        t = stats.start()
+
         lod = self._lod
         draw_cached = self._can_draw_cached(lod)
 
@@ -306,8 +403,10 @@ class LayoutView:
         context = DrawingContext()
         context.cr = cr
         context.draw_rect = self.get_damage_rect(cr)
+        context.items_to_draw = layout.get_items_to_draw(context.draw_rect)
         context.lod = lod
         context.draw_cached = draw_cached
+        context.pending_keys = self._pre_render_pending
         context.view = self
 
         # draw all visible layout items
@@ -315,6 +414,9 @@ class LayoutView:
 
         self._starting_up = False
 
+        stats.lap("draw", t)
+        stats.lap_mark("key_release", "key_release_to_draw")
+
         return decorated
 
     def _draw_background(self, context, lod):
@@ -566,11 +668,13 @@ class LayoutView:
             if item is None:
                 item = layout
 
+            draw_rect = self.get_damage_rect(context)
             for key in item.iter_layer_keys(layer_id):
                 rect = key.get_canvas_fullsize_rect()
                 rect = rect.inflate(*enlargement)
-                roundrect_curve(context, rect, corner_radius)
-                context.fill()
+                if draw_rect.intersects(rect):
+                    roundrect_curve(context, rect, corner_radius)
+                    context.fill()
 
             context.pop_group_to_source()
             context.paint_with_alpha(alpha);
@@ -587,65 +691,19 @@ class LayoutView:
         if not config.theme_settings.key_shadow_strength:
             return
 
-        self._auto_select_shadow_quality(context)
-
         context.save()
         self.set_shadow_scale(context, lod)
 
         draw_rect = self.get_damage_rect(context)
         layout = self.get_layout()
+        pending = self._pre_render_pending
         for item in layout.iter_layer_keys(layer_id):
-            if draw_rect.intersects(item.get_canvas_border_rect()):
+            if item not in pending and \
+               draw_rect.intersects(item.get_canvas_border_rect()):
                 item.draw_shadow_cached(context)
 
         context.restore()
 
-    def _auto_select_shadow_quality(self, context):
-        """ auto-select shadow quality """
-        if not self._shadow_quality_valid:
-            quality = self._probe_shadow_performance(context)
-            Key.set_shadow_quality(quality)
-            self._shadow_quality_valid = True
-
-    def _probe_shadow_performance(self, context):
-        """
-        Determine shadow quality based on the estimated render time of
-        the first layer's shadows.
-        """
-        probe_begin = time.time()
-        quality = None
-
-        layout = self.get_layout()
-        max_total_time = 0.03  # upper limit refreshing all key's shadows [s]
-        max_probe_keys = 10
-        keys = None
-        for layer_id in layout.get_layer_ids():
-            layer_keys = list(layout.iter_layer_keys(layer_id))
-            num_first_layer_keys = len(layer_keys)
-            keys = layer_keys[:max_probe_keys]
-            break
-
-        if keys:
-            for quality, (steps, alpha) in enumerate(Key._shadow_presets):
-                begin = time.time()
-                for key in keys:
-                    key.create_shadow_surface(context, steps, 0.1)
-                elapsed = time.time() - begin
-                estimate = elapsed / len(keys) * num_first_layer_keys
-                _logger.debug("Probing shadow performance: "
-                              "estimated full refresh time {:6.1f}ms "
-                              "at quality {}, {} steps." \
-                              .format(estimate * 1000,
-                                      quality, steps))
-                if estimate > max_total_time:
-                    break
-
-            _logger.info("Probing shadow performance took {:.1f}ms. "
-                         "Selecting quality {}." \
-                         .format((time.time() - probe_begin) * 1000,
-                                 quality))
-        return quality
-
     def set_shadow_scale(self, context, lod):
         """
         Shadows aren't normally refreshed while resizing.
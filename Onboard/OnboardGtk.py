@@ -52,7 +52,7 @@ from Onboard.LayoutLoaderSVG import LayoutLoaderSVG
 from Onboard.Appearance      import ColorScheme
 from Onboard.IconPalette     import IconPalette
 from Onboard.Exceptions      import LayoutFileError
-from Onboard.utils           import unicode_str
+from Onboard.utils           import unicode_str, LatencyStats
 from Onboard.Timer           import CallOnce, Timer
 from Onboard.WindowUtils     import show_confirmation_dialog
 import Onboard.osk as osk
@@ -900,6 +900,11 @@ if has_dbus:
             else:
                 self._keyboard.auto_show_unlock(self.LOCK_REASON)
 
+        # Property PredictionLatency, read-only, debugging aid
+        @dbus_property(dbus_interface=IFACE, signature='a{s(uddau)}')
+        def PredictionLatency(self):  # noqa: flake8
+            return LatencyStats().get_histograms()
+
 
 def cb_any_event(event, onboard):
 
@@ -22,11 +22,14 @@ from __future__ import division, print_function, unicode_literals
 
 import os
 import subprocess
-import time
 import re
 import glob
+import json
+import threading
+import collections
 
-from Onboard.utils import unicode_str
+from Onboard.utils import unicode_str, XDGDirs
+from Onboard.Timer import idle_call
 
 import Onboard.osk as osk
 
@@ -35,12 +38,15 @@ _logger = logging.getLogger(__name__)
 
 
 class SpellChecker(object):
-    MAX_QUERY_CACHE_SIZE = 100    # max number of cached queries
+    MAX_QUERY_CACHE_SIZE = 500    # max number of cached queries per dict
 
-    def __init__(self, language_db = None):
+    def __init__(self, language_db = None, cache_dir = None,
+                 ready_callback = None):
         self._language_db = language_db
+        self._ready_callback = ready_callback
         self._backend = None
-        self._cached_queries = {}
+        self._query_cache = SpellQueryCache(self.MAX_QUERY_CACHE_SIZE,
+                                            cache_dir)
 
     def set_backend(self, backend):
         """ Switch spell check backend on the fly """
@@ -58,9 +64,10 @@ class SpellChecker(object):
                not type(self._backend) == _class:
                 if self._backend:
                     self._backend.stop()
-                self._backend = _class()
+                self._backend = _class(
+                    ready_callback = self._on_backend_ready)
 
-        self.invalidate_query_cache()
+        self._update_query_cache_namespace()
 
     def set_dict_ids(self, dict_ids):
         success = False
@@ -75,9 +82,36 @@ class SpellChecker(object):
                 _logger.info("No matching dictionaries for '{backend}' {dicts}" \
                              .format(backend=type(self._backend),
                                      dicts=dict_ids))
-        self.invalidate_query_cache()
+        self._update_query_cache_namespace()
         return success
 
+    def preload_dict_ids(self, dict_ids):
+        """
+        Load dictionaries in the background, so switching to them
+        later is fast. Only supported by some backends.
+        """
+        if self._backend:
+            ids = self._find_matching_dicts(dict_ids)
+            if ids:
+                self._backend.preload(ids)
+
+    def _on_backend_ready(self):
+        """ Dictionaries finished loading in the background. """
+        self._update_query_cache_namespace()
+        if self._ready_callback:
+            self._ready_callback()
+
+    def _update_query_cache_namespace(self):
+        """
+        Switch to the query cache of the active dictionaries. Caches of
+        previously used dictionaries are kept around, so toggling between
+        languages doesn't have to start over with an empty cache.
+        """
+        namespace = None
+        if self._backend:
+            namespace = self._backend.get_cache_namespace()
+        self._query_cache.set_namespace(namespace)
+
     def _find_matching_dicts(self, dict_ids):
         results = []
         for dict_id in dict_ids:
@@ -144,58 +178,432 @@ class SpellChecker(object):
         checkers may return more than one result for certain tokens,
         e.g. before and after hyphens.
         """
-        spans = []
+        return self.find_incorrect_spans_of_words([word])[0]
+
+    def find_incorrect_spans_of_words(self, words):
+        """
+        Return lists of misspelled spans, one list for each of words.
+        Uncached words are checked with a single backend call and
+        without looking for suggestions.
+        """
+        spans = [[] for word in words]
         if self._backend:
-            results = self.query_cached(word)
-            # hunspell splits words at underscores and then
-            # returns results for multiple sub-words.
-            # -> find the sub-word at the current caret offset.
-            spans = [result[0] for result in results]
+            uncached = []
+            for i, word in enumerate(words):
+                results = self._query_cache.get(word)
+                if results is None:
+                    uncached.append(i)
+                else:
+                    spans[i] = [result[0] for result in results]
+
+            if uncached:
+                uncached_words = [words[i] for i in uncached]
+                results_list = self._backend.query_words(uncached_words,
+                                                         False)
+                for i, word, results in zip(uncached, uncached_words,
+                                            results_list):
+                    self._query_cache.set(word, results)
+                    spans[i] = [result[0] for result in results]
         return spans
 
     def query_cached(self, word):
         """
         Return cached query or ask the backend if necessary.
         """
-        query = self._cached_queries.get(word)
-        if query is None:
-            # limit cache size
-            size = len(self._cached_queries)
-            if size >= self.MAX_QUERY_CACHE_SIZE:
-                new_size = size // 2
-
-                _logger.debug("shrinking query cache from {} to {} entries." \
-                              .format(size, new_size))
-
-                # discard the oldest entries
-                queries = sorted(self._cached_queries.items(),
-                                 key = lambda x: x[1][0])
-                self._cached_queries = dict(queries[new_size:])
-
-            # query backend
+        results = self._query_cache.get(word)
+        if results is None or \
+           any(result[1] is None for result in results):
+            # not cached, or cached without suggestions
             results = self.query(word)
-            query = [0.0, results]
-            self._cached_queries[word] = query
-
-        query[0] = time.time()
-
-        return query[1]
+            self._query_cache.set(word, results)
+        return results
 
     def query(self, word):
         return self._backend.query(word)
 
     def invalidate_query_cache(self):
-        self._cached_queries = {}
+        """
+        Forget cached queries that may have become outdated.
+        Persistent namespaces are keyed by the dictionary's mtime,
+        refreshing the namespace is enough to drop stale results.
+        """
+        self._update_query_cache_namespace()
+        self._query_cache.clear_volatile()
+
+    def save_query_cache(self):
+        """ Persist cached queries, if a cache directory was given. """
+        self._query_cache.save()
 
     def get_supported_dict_ids(self):
         return self._backend.get_supported_dict_ids()
 
 
+class SpellQueryCacheNamespace(object):
+    """
+    Identifies the cached queries of one set of active dictionaries.
+    Namespaces with a dictionary file may be persisted.
+    """
+
+    def __init__(self, backend_name, dict_ids,
+                 dic_file = None, mtime = None):
+        self.backend_name = backend_name
+        self.dict_ids = tuple(dict_ids)
+        self.dic_file = dic_file
+        self.mtime = mtime
+
+    def is_persistent(self):
+        return bool(self.dic_file)
+
+    def get_key(self):
+        return (self.backend_name, self.dict_ids,
+                self.dic_file, self.mtime)
+
+    def get_persistent_key(self):
+        """ String key of the namespace in the cache file. """
+        return "{}:{}".format(self.backend_name, self.dic_file)
+
+    def __repr__(self):
+        return "{}({}, {}, {}, {})".format(type(self).__name__,
+                                           repr(self.backend_name),
+                                           repr(self.dict_ids),
+                                           repr(self.dic_file),
+                                           repr(self.mtime))
+
+
+class SpellQueryCache(object):
+    """
+    Size-bounded LRU cache of spell checker queries.
+    There is one LRU per namespace, i.e. per set of active dictionaries.
+    Namespaces backed by dictionary files may be persisted to cache_dir.
+
+    Doctests:
+    >>> c = SpellQueryCache(2)
+    >>> c.set_namespace(SpellQueryCacheNamespace("test", ["en_US"]))
+    >>> c.set("a", []); c.set("b", []); c.set("c", [])
+    >>> c.get("a") is None, c.get("b"), c.get("c")
+    (True, [], [])
+
+    # lookups refresh entries, the least recently used one is dropped
+    >>> _ = c.get("b"); c.set("d", [])
+    >>> c.get("c") is None, c.get("b"), c.get("d")
+    (True, [], [])
+
+    # switching namespaces keeps the previous entries around
+    >>> c.set_namespace(SpellQueryCacheNamespace("test", ["de_DE"]))
+    >>> c.get("b") is None
+    True
+    >>> c.set_namespace(SpellQueryCacheNamespace("test", ["en_US"]))
+    >>> c.get("b")
+    []
+
+    # persistent namespaces survive clearing volatile queries
+    >>> c.clear_volatile(); c.get("b") is None
+    True
+    >>> c.set_namespace(SpellQueryCacheNamespace("test", ["en_US"],
+    ...                                          "en_US.dic", 1.0))
+    >>> c.set("a", []); c.clear_volatile(); c.get("a")
+    []
+
+    # nothing is cached without namespace
+    >>> c.set_namespace(None)
+    >>> c.set("a", []); c.get("a") is None
+    True
+    """
+
+    MAX_NAMESPACES = 4              # max number of LRUs kept in memory
+    CACHE_FILE_NAME = "spell_query_cache.json"
+    CACHE_FILE_VERSION = 1
+
+    def __init__(self, max_size, cache_dir = None):
+        self._max_size = max_size
+        self._cache_dir = cache_dir
+        self._namespace = None
+        self._lru = None
+        self._lrus = collections.OrderedDict()  # namespace key -> LRU
+        self._namespaces = {}                   # namespace key -> namespace
+        self._dirty_keys = set()
+        self._persisted = None
+
+    def set_namespace(self, namespace):
+        """ Make the queries of namespace the active ones. """
+        if namespace is None:
+            self._namespace = None
+            self._lru = None
+            return
+
+        key = namespace.get_key()
+        lru = self._lrus.get(key)
+        if lru is None:
+            lru = collections.OrderedDict()
+            if namespace.is_persistent():
+                lru.update(self._load_namespace(namespace))
+            self._lrus[key] = lru
+            self._namespaces[key] = namespace
+
+            # limit the number of namespaces in memory
+            while len(self._lrus) > self.MAX_NAMESPACES:
+                old_key, old_lru = self._lrus.popitem(last=False)
+                self._retire_namespace(old_key, old_lru)
+        else:
+            self._lrus.move_to_end(key)
+
+        self._namespace = namespace
+        self._lru = lru
+
+    def get(self, word):
+        """ Return cached results for word, None if there are none. """
+        lru = self._lru
+        if lru is None:
+            return None
+        results = lru.get(word)
+        if results is not None:
+            lru.move_to_end(word)
+        return results
+
+    def set(self, word, results):
+        lru = self._lru
+        if lru is None:
+            return
+        lru[word] = results
+        lru.move_to_end(word)
+        if len(lru) > self._max_size:
+            lru.popitem(last=False)
+        self._dirty_keys.add(self._namespace.get_key())
+
+    def clear(self):
+        """ Clear the queries of the active namespace. """
+        if self._lru is not None:
+            self._lru.clear()
+            self._dirty_keys.add(self._namespace.get_key())
+
+    def clear_volatile(self):
+        """ Clear the active namespace unless it is persistent. """
+        if self._namespace is not None and \
+           not self._namespace.is_persistent():
+            self.clear()
+
+    def save(self):
+        """ Write persistent namespaces to disk. """
+        if not self._cache_dir:
+            return
+        for key, lru in self._lrus.items():
+            if key in self._dirty_keys:
+                self._store_namespace(self._namespaces[key], lru)
+        self._dirty_keys.clear()
+        self._write_cache_file()
+
+    def _retire_namespace(self, key, lru):
+        """ Keep dropped namespaces in the persisted data, if changed. """
+        if key in self._dirty_keys:
+            self._store_namespace(self._namespaces[key], lru)
+            self._dirty_keys.discard(key)
+        del self._namespaces[key]
+
+    def _load_namespace(self, namespace):
+        """ Return persisted (word, results) pairs, oldest first. """
+        entry = self._get_persisted().get(namespace.get_persistent_key())
+        if entry and \
+           entry.get("mtime") == namespace.mtime:
+            try:
+                return [(word, results)
+                        for word, results in entry["queries"]
+                        ][-self._max_size:]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return []
+
+    def _store_namespace(self, namespace, lru):
+        if namespace.is_persistent():
+            persisted = self._get_persisted()
+            persisted[namespace.get_persistent_key()] = \
+                {"mtime" : namespace.mtime,
+                 "queries" : list(lru.items())}
+
+    def _get_persisted(self):
+        """ Lazily read the cache file. """
+        if self._persisted is None:
+            self._persisted = self._read_cache_file()
+        return self._persisted
+
+    def _get_cache_filename(self):
+        return os.path.join(self._cache_dir, self.CACHE_FILE_NAME)
+
+    def _read_cache_file(self):
+        persisted = {}
+        if self._cache_dir:
+            filename = self._get_cache_filename()
+            if os.path.exists(filename):
+                try:
+                    with open(filename, encoding="UTF-8") as f:
+                        data = json.load(f)
+                    if data.get("version") == self.CACHE_FILE_VERSION:
+                        persisted = data.get("namespaces", {})
+                except (IOError, ValueError, AttributeError) as ex:
+                    _logger.warning("failed to read spell query cache "
+                                    "'{}': {}" \
+                                    .format(filename, unicode_str(ex)))
+        return persisted
+
+    def _write_cache_file(self):
+        if self._persisted is None:
+            return
+        filename = self._get_cache_filename()
+        data = {"version" : self.CACHE_FILE_VERSION,
+                "namespaces" : self._persisted}
+        try:
+            XDGDirs.assure_user_dir_exists(self._cache_dir)
+            tmp_filename = filename + ".tmp"
+            with open(tmp_filename, "w", encoding="UTF-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.rename(tmp_filename, filename)
+        except (IOError, OSError) as ex:
+            _logger.warning("failed to write spell query cache '{}': {}" \
+                            .format(filename, unicode_str(ex)))
+
+
+class HunspellPool(object):
+    """
+    Singleton pool of loaded hunspell handles, keyed by dictionary files.
+    Parsing large dictionaries is slow. Handles are loaded on background
+    threads and kept around, bounded by the size of their dictionary
+    files, so toggling between languages doesn't reload them.
+    """
+
+    MAX_POOL_SIZE = 32 * 1024 * 1024   # max. bytes of dictionary files
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton magic.
+        """
+        if not hasattr(cls, "self"):
+            cls.self = object.__new__(cls, *args, **kwargs)
+            cls.self.construct()
+        return cls.self
+
+    def __init__(self):
+        """
+        Called multiple times, do not use.
+        """
+        pass
+
+    def construct(self):
+        """
+        Singleton constructor, runs only once.
+        """
+        self._handles = collections.OrderedDict()  # key -> (handle, size)
+        self._pending = {}                          # key -> callbacks
+        self._threads = {}                          # key -> loading thread
+        self._results = {}                  # (key, thread) -> loaded handle
+
+    def request(self, aff, dic, callback = None):
+        """
+        Return the handle for the given dictionary files if it is loaded.
+        Otherwise start loading it in the background, return None and
+        call callback(dic, handle) in the main thread once it is done.
+        """
+        key = (aff, dic)
+        entry = self._handles.get(key)
+        if entry:
+            self._handles.move_to_end(key)
+            return entry[0]
+
+        callbacks = self._pending.get(key)
+        if callbacks is None:
+            callbacks = []
+            self._pending[key] = callbacks
+            thread = threading.Thread(name=self.__class__.__name__,
+                                      target=self._load, args=(key,))
+            thread.daemon = True
+            self._threads[key] = thread
+            thread.start()
+        if callback:
+            callbacks.append(callback)
+
+        return None
+
+    def load(self, aff, dic):
+        """
+        Return the handle for the given files, loading synchronously.
+        Waits for a background load of the same files to finish.
+        """
+        key = (aff, dic)
+        entry = self._handles.get(key)
+        if entry:
+            self._handles.move_to_end(key)
+            return entry[0]
+
+        thread = self._threads.get(key)
+        if thread:
+            thread.join()
+            self._on_loaded(key, thread)
+            entry = self._handles.get(key)
+            return entry[0] if entry else None
+
+        handle = self._create_handle(key)
+        if handle:
+            self._add_handle(key, handle)
+        return handle
+
+    def _load(self, key):
+        """ Worker thread, osk.Hunspell releases the GIL while loading. """
+        thread = threading.current_thread()
+        self._results[(key, thread)] = self._create_handle(key)
+        idle_call(self._on_loaded, key, thread)
+
+    def _on_loaded(self, key, thread):
+        handle = self._results.pop((key, thread), None)
+
+        # Already delivered by load(), or superseded by a newer request?
+        if self._threads.get(key) is not thread:
+            return False
+
+        del self._threads[key]
+        if handle:
+            self._add_handle(key, handle)
+        callbacks = self._pending.pop(key)
+        if handle:
+            for callback in callbacks:
+                callback(key[1], handle)
+        return False
+
+    @staticmethod
+    def _create_handle(key):
+        aff, dic = key
+        _logger.info("loading hunspell files '{}', '{}'" \
+                     .format(dic, aff))
+        try:
+            return osk.Hunspell(aff, dic)
+        except Exception as e:
+            _logger.error("failed to create hunspell backend: " + \
+                          unicode_str(e))
+        return None
+
+    def _add_handle(self, key, handle):
+        size = 0
+        for fn in key:
+            try:
+                size += os.path.getsize(fn) if fn else 0
+            except OSError:
+                pass
+        self._handles[key] = (handle, size)
+        self._handles.move_to_end(key)
+
+        # Drop the least recently used handles, always keep the newest.
+        # Backends hold their own references to handles in use.
+        while len(self._handles) > 1 and \
+              sum(entry[1] for entry in self._handles.values()) > \
+              self.MAX_POOL_SIZE:
+            old_key, _entry = self._handles.popitem(last=False)
+            _logger.info("dropping hunspell handle for '{}'" \
+                         .format(old_key[1]))
+
+
 class SCBackend(object):
     """ Abstract base class of all spellchecker backends """
 
-    def __init__(self, dict_ids = None):
+    def __init__(self, dict_ids = None, ready_callback = None):
         self._active_dicts = None
+        self._ready_callback = ready_callback
         self._p = None
 
     def start(self, dict_ids = None):
@@ -212,6 +620,10 @@ class SCBackend(object):
     def is_running(self):
         return NotImplementedError()
 
+    def preload(self, dict_ids):
+        """ Prepare dictionaries for later use, if supported. """
+        pass
+
     def query(self, text):
         """
         Query for spelling suggestions.
@@ -261,6 +673,14 @@ class SCBackend(object):
 
         return results
 
+    def query_words(self, texts, suggest = True):
+        """
+        Query multiple texts at once, return one list of results per text.
+        Without suggest, backends may skip looking for suggestions and
+        return None in their place.
+        """
+        return [self.query(text) for text in texts]
+
     def get_supported_dict_ids(self):
         """
         Return raw supported dictionary ids.
@@ -273,10 +693,22 @@ class SCBackend(object):
         """
         return self._active_dicts
 
+    def get_cache_namespace(self):
+        """
+        Return the query cache namespace of the active dictionaries,
+        None if nothing should be cached.
+        """
+        if not self._active_dicts:
+            return None
+        return SpellQueryCacheNamespace(type(self).__name__,
+                                        self._active_dicts)
+
 
 class hunspell(SCBackend):
     """
     Hunspell backend using the C API.
+    Dictionaries are loaded in the background if there is a
+    ready_callback, synchronously otherwise.
 
     Doctests:
     # known word
@@ -289,9 +721,10 @@ class hunspell(SCBackend):
     >>> sp.query("jdaskljasd")  # doctest: +ELLIPSIS
     [[...
     """
-    def __init__(self, dict_ids = None):
+    def __init__(self, dict_ids = None, ready_callback = None):
         self._osk_hunspell = None
-        SCBackend.__init__(self, dict_ids)
+        self._dic_file = None
+        SCBackend.__init__(self, dict_ids, ready_callback)
         if dict_ids:
             self.start(dict_ids)
 
@@ -303,24 +736,61 @@ class hunspell(SCBackend):
             _logger.info("using hunspell files '{}', '{}'" \
                             .format(dic, aff))
             if dic:
-                try:
-                    self._osk_hunspell = osk.Hunspell(aff, dic)
-                    _logger.info("dictionary encoding '{}'" \
-                                 .format(self._osk_hunspell.get_encoding()))
-                except Exception as e:
-                    _logger.error("failed to create hunspell backend: " + \
-                                  unicode_str(e))
-                    self._osk_hunspell = None
+                self._dic_file = dic
+                pool = HunspellPool()
+                if self._ready_callback:
+                    handle = pool.request(aff, dic, self._on_handle_loaded)
+                else:
+                    handle = pool.load(aff, dic)
+                if handle:
+                    self._set_handle(handle)
 
     def stop(self):
         super(hunspell, self).stop()
         if self.is_running():
             self._osk_hunspell = None
-            self._active_dicts = None
+        self._active_dicts = None
+        self._dic_file = None
+
+    def preload(self, dict_ids):
+        pool = HunspellPool()
+        for dict_id in dict_ids:
+            dic, aff = self._search_dict_files(dict_id)
+            if dic:
+                pool.request(aff, dic)
+
+    def _on_handle_loaded(self, dic, handle):
+        # Ignore handles of dictionaries that aren't wanted anymore.
+        if dic == self._dic_file:
+            self._set_handle(handle)
+            self._ready_callback()
+
+    def _set_handle(self, handle):
+        self._osk_hunspell = handle
+        _logger.info("dictionary encoding '{}'" \
+                     .format(handle.get_encoding()))
 
     def is_running(self):
         return not self._osk_hunspell is None
 
+    def get_cache_namespace(self):
+        """
+        Cached queries of the C API backend may be persisted. They are
+        keyed by dictionary file and its modification time, so updated
+        dictionaries invalidate their stale results.
+        """
+        namespace = None
+        if self._dic_file and self._osk_hunspell:
+            try:
+                mtime = os.path.getmtime(self._dic_file)
+            except OSError:
+                mtime = None
+            if mtime is not None:
+                namespace = SpellQueryCacheNamespace(
+                    type(self).__name__, self._active_dicts,
+                    self._dic_file, mtime)
+        return namespace
+
     SPLITWORDS = re.compile(r"[^-_\s]+", re.UNICODE|re.DOTALL)
 
     def query(self, text):
@@ -402,27 +872,57 @@ class hunspell(SCBackend):
         [[[0, 8, 'Ωκεαανού'], ['Ωκεανού', ...
 
         """
-        results = []
+        return self.query_words([text])[0]
 
-        if self._osk_hunspell:
-            matches = self.SPLITWORDS.finditer(text)
-            for match in matches:
-                word = match.group()
-                begin = match.start()
-                end   = match.end()
-                span = [begin, end, word]
+    def query_words(self, texts, suggest = True):
+        """
+        Query multiple texts with one call each for checking and
+        for suggestions. Hunspell works without holding the GIL.
 
-                try:
-                    if self._osk_hunspell.spell(word) == 0:
-                        suggestions = list(self._osk_hunspell.suggest(word))
-                        results.append([span, suggestions])
-                except UnicodeEncodeError:
+        Doctests:
+        >>> sp = hunspell(["en_US"])
+        >>> sp.query_words(["test", "ubuntu-system"])  # doctest: +ELLIPSIS
+        [[], [[[0, 6, 'ubuntu'], ['Ubuntu', ...]]]]
+
+        # skip suggestions
+        >>> sp.query_words(["test", "ubuntu-system"], False)
+        [[], [[[0, 6, 'ubuntu'], None]]]
+        """
+        results_list = [[] for text in texts]
+
+        if self._osk_hunspell:
+            # collect sub-words of all texts
+            spans = []  # (text index, span)
+            for i, text in enumerate(texts):
+                for match in self.SPLITWORDS.finditer(text):
+                    spans.append((i, [match.start(), match.end(),
+                                      match.group()]))
+
+            words = [span[2] for i, span in spans]
+            checks = self._osk_hunspell.check_words(words)
+
+            misspelled = [k for k, check in enumerate(checks) if check == 0]
+            suggestions_list = []
+            if suggest and misspelled:
+                suggestions_list = self._osk_hunspell.suggest_words(
+                    [words[k] for k in misspelled])
+            suggestions_list = dict(zip(misspelled, suggestions_list))
+
+            for k, check in enumerate(checks):
+                i, span = spans[k]
+                if check == 0:
+                    if suggest:
+                        suggestions = list(suggestions_list[k])
+                    else:
+                        suggestions = None
+                    results_list[i].append([span, suggestions])
+                elif check < 0:
                     # Assume the offending character isn't part of the
                     # target language and consider this word to be not
                     # in the dictionary, i.e. misspelled without suggestions.
-                    results.append([span, []])
+                    results_list[i].append([span, []])
 
-        return results
+        return results_list
 
     def get_supported_dict_ids(self):
         """
@@ -521,8 +1021,8 @@ class hunspell(SCBackend):
 class SCBackend_cmd(SCBackend):
     """ Abstract base class of command line backends """
 
-    def __init__(self, dict_ids = None):
-        super(SCBackend_cmd, self).__init__(dict_ids)
+    def __init__(self, dict_ids = None, ready_callback = None):
+        super(SCBackend_cmd, self).__init__(dict_ids, ready_callback)
         self._p = None
 
     def stop(self):
@@ -612,8 +1112,8 @@ class hunspell_cmd(SCBackend_cmd):
     >>> sp.query("jdaskljasd")  # doctest: +ELLIPSIS
     [[...
     """
-    def __init__(self, dict_ids = None):
-        SCBackend.__init__(self, dict_ids)
+    def __init__(self, dict_ids = None, ready_callback = None):
+        SCBackend.__init__(self, dict_ids, ready_callback)
         if dict_ids:
             self.start(dict_ids)
 
@@ -687,8 +1187,8 @@ class aspell_cmd(SCBackend):
     >>> sp.query("jdaskljasd")  # doctest: +ELLIPSIS
     [[...
     """
-    def __init__(self, dict_ids = None):
-        SCBackend.__init__(self, dict_ids)
+    def __init__(self, dict_ids = None, ready_callback = None):
+        SCBackend.__init__(self, dict_ids, ready_callback)
         if dict_ids:
             self.start(dict_ids)
 
@@ -20,6 +20,7 @@
 from __future__ import division, print_function, unicode_literals
 
 import time
+import random
 
 ### Logging ###
 import logging
@@ -208,6 +209,284 @@ class TextSpan:
                         self.last_modified)
 
 
+class SpanNode:
+    """ Treap node of SpanTree """
+    __slots__ = ("span", "priority", "parent", "left", "right",
+                 "delta", "max_end", "min_text_pos", "max_text_end")
+
+    def __init__(self, span):
+        self.span = span
+        self.priority = random.random()
+        self.parent = None
+        self.left = None
+        self.right = None
+        self.delta = 0          # shift pending for the children
+        self.max_end = span.end()
+        self.min_text_pos = span.text_pos
+        self.max_text_end = span.text_pos + len(span.text)
+
+
+class SpanTree:
+    """
+    Text spans ordered by position in a treap with offset-delta
+    propagation. Shifting all spans after a position, as well as
+    inserting, removing and finding spans take O(log n) time.
+
+    Positions of spans deeper in the tree are updated lazily, when
+    later operations reach them. Spans returned by the find functions
+    and get_spans() are up to date, others have to be brought up to
+    date with materialize() before their positions can be trusted.
+
+    Doctests:
+    >>> t = SpanTree()
+    >>> spans = [TextSpan(pos, 2) for pos in [10, 0, 5]]
+    >>> for span in spans:
+    ...     t.insert(span)
+    >>> t.shift(4, 100)
+    >>> t.materialize(spans[0])
+    >>> spans[0].pos
+    110
+    >>> [s.pos for s in t.get_spans()]
+    [0, 105, 110]
+    >>> t.find_first(lambda s: s.pos <= 106 <= s.end(), 106)
+    TextSpan(105, 2, '', 100, None)
+    >>> t.remove(spans[2])
+    >>> [s.pos for s in t.get_spans()], len(t), t.contains(spans[2])
+    ([0, 110], 2, False)
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._root = None
+        self._nodes = {}    # id(span) -> node
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def contains(self, span):
+        node = self._nodes.get(id(span))
+        return node is not None and node.span is span
+
+    def get_spans(self):
+        """ All spans, ordered by position. """
+        spans = []
+        self._collect(self._root, spans)
+        return spans
+
+    def materialize(self, span):
+        """ Apply pending shifts to the position of span. """
+        node = self._nodes.get(id(span))
+        path = []
+        while node:
+            path.append(node)
+            node = node.parent
+        for node in reversed(path):
+            self._push(node)
+
+    def insert(self, span):
+        node = SpanNode(span)
+        self._nodes[id(span)] = node
+        left, right = self._split(self._root, span.pos)
+        self._set_root(self._merge(self._merge(left, node), right))
+
+    def remove(self, span):
+        """ Remove span, identified by object identity. """
+        if not self.contains(span):
+            return
+        self.materialize(span)
+        left, rest = self._split(self._root, span.pos - 1)
+        middle, right = self._split(rest, span.pos)
+
+        # There are only few spans at the same position.
+        spans = []
+        self._collect(middle, spans)
+        del self._nodes[id(span)]
+        middle = None
+        for s in spans:
+            if s is not span:
+                node = SpanNode(s)
+                self._nodes[id(s)] = node
+                middle = self._merge(middle, node)
+
+        self._set_root(self._merge(self._merge(left, middle), right))
+
+    def update(self, spans):
+        """
+        Refresh bounds after lengths or text of spans were modified
+        in place. Span positions must not have changed.
+        """
+        for span in spans:
+            node = self._nodes.get(id(span))
+            if node:
+                self.materialize(span)
+                while node:
+                    self._update(node)
+                    node = node.parent
+
+    def shift(self, pos, delta):
+        """
+        Move all spans beginning after pos by delta, their text
+        positions included. Delta must keep the order of spans.
+        """
+        left, right = self._split(self._root, pos)
+        self._apply(right, delta)
+        self._set_root(self._merge(left, right))
+
+    def extract(self, begin, end):
+        """ Remove and return spans beginning after begin, up to end. """
+        left, rest = self._split(self._root, begin)
+        middle, right = self._split(rest, end)
+        spans = []
+        self._collect(middle, spans)
+        for span in spans:
+            del self._nodes[id(span)]
+        self._set_root(self._merge(left, right))
+        return spans
+
+    def find_first(self, predicate, pos):
+        """
+        First span containing or ending at pos that satisfies
+        predicate(span).
+        """
+        def find(node):
+            if node is None or node.max_end < pos:
+                return None
+            self._push(node)
+            span = find(node.left)
+            if span:
+                return span
+            if node.span.pos > pos:
+                return None
+            if predicate(node.span):
+                return node.span
+            return find(node.right)
+        return find(self._root)
+
+    def find_all(self, begin, end):
+        """ Spans that begin at or before end and end at or after begin. """
+        spans = []
+        def find(node):
+            if node is None or node.max_end < begin:
+                return
+            self._push(node)
+            find(node.left)
+            if node.span.pos <= end:
+                if node.span.end() >= begin:
+                    spans.append(node.span)
+                find(node.right)
+        find(self._root)
+        return spans
+
+    def find_text_changed(self, pos, begin, end):
+        """
+        Spans whose text is affected by a change of the range begin-end.
+        Those beginning at or before pos with text overlapping the range,
+        and those beginning after pos with text starting before end.
+        """
+        spans = []
+        def find(node, before):     # before: whole subtree <= pos?
+            if node is None or \
+               node.min_text_pos > end or \
+               before and node.max_text_end <= begin:
+                return
+            self._push(node)
+            span = node.span
+            if span.pos <= pos:
+                find(node.left, True)
+                if span.text_pos <= end and \
+                   span.text_pos + len(span.text) > begin:
+                    spans.append(span)
+                find(node.right, before)
+            else:
+                find(node.left, before)
+                if span.text_pos < end:
+                    spans.append(span)
+                find(node.right, False)
+        find(self._root, False)
+        return spans
+
+    def _collect(self, node, spans):
+        if node:
+            self._push(node)
+            self._collect(node.left, spans)
+            spans.append(node.span)
+            self._collect(node.right, spans)
+
+    def _set_root(self, node):
+        if node:
+            node.parent = None
+        self._root = node
+
+    @staticmethod
+    def _apply(node, delta):
+        if node and delta:
+            node.span.pos += delta
+            node.span.text_pos += delta
+            node.delta += delta
+            node.max_end += delta
+            node.min_text_pos += delta
+            node.max_text_end += delta
+
+    def _push(self, node):
+        if node.delta:
+            self._apply(node.left, node.delta)
+            self._apply(node.right, node.delta)
+            node.delta = 0
+
+    @staticmethod
+    def _update(node):
+        span = node.span
+        max_end = span.end()
+        min_text_pos = span.text_pos
+        max_text_end = span.text_pos + len(span.text)
+        for child in (node.left, node.right):
+            if child:
+                child.parent = node
+                if max_end < child.max_end:
+                    max_end = child.max_end
+                if min_text_pos > child.min_text_pos:
+                    min_text_pos = child.min_text_pos
+                if max_text_end < child.max_text_end:
+                    max_text_end = child.max_text_end
+        node.max_end = max_end
+        node.min_text_pos = min_text_pos
+        node.max_text_end = max_text_end
+
+    def _split(self, node, pos):
+        """ Split into spans beginning at or before pos and after pos. """
+        if node is None:
+            return None, None
+        self._push(node)
+        if node.span.pos <= pos:
+            left, right = self._split(node.right, pos)
+            node.right = left
+            self._update(node)
+            return node, right
+        else:
+            left, right = self._split(node.left, pos)
+            node.left = right
+            self._update(node)
+            return left, node
+
+    def _merge(self, left, right):
+        if left is None:
+            return right
+        if right is None:
+            return left
+        if left.priority > right.priority:
+            self._push(left)
+            left.right = self._merge(left.right, right)
+            self._update(left)
+            return left
+        else:
+            self._push(right)
+            right.left = self._merge(left, right.left)
+            self._update(right)
+            return right
+
+
 class TextChanges:
     __doc__ = """
     Collection of text spans yet to be learned.
@@ -300,15 +579,27 @@ class TextChanges:
     ...     if c.get_span_ranges() != test[2]:
     ...        "test: " + repr(test) + " result: " + repr(c.get_span_ranges())
 
+    # spans far from a change only move, their text stays valid
+    >>> c = TextChanges()
+    >>> span = c.insert(50, 3)[0]
+    >>> c.set_span_text(span, "abcdefghi", 47)
+    >>> c.insert(10, 2, None)
+    []
+    >>> c.get_spans()                  # doctest: +ELLIPSIS
+    [TextSpan(52, 3, 'def', 49, ...)]
+    >>> c.insert(50, 1, None)          # doctest: +ELLIPSIS
+    [TextSpan(53, 3, ...)]
     """.replace('IGNORE_RESULT', 'doctest: +ELLIPSIS\n    [...')
 
     def __init__(self, spans = None):
         self.clear()
         if spans:
-            self._spans = spans
+            for span in spans:
+                self._spans.insert(span)
 
     def clear(self):
-        self._spans = []
+        self._spans = SpanTree()
+        self._unconsolidated = []   # spans modified since consolidation
 
         # some counts for book-keeping, not used by this class itself.
         self.insert_count = 0
@@ -318,7 +609,7 @@ class TextChanges:
         return len(self._spans) == 0
 
     def get_spans(self):
-        return self._spans
+        return self._spans.get_spans()
 
     def remove_span(self, span):
         self._spans.remove(span)
@@ -326,6 +617,16 @@ class TextChanges:
     def get_change_count(self):
         return self.insert_count + self.delete_count
 
+    def set_span_text(self, span, text, text_pos):
+        """
+        Set the text around a span returned by insert() or delete().
+        Use this instead of assigning to the span, so the tracking of
+        which text needs updates stays intact.
+        """
+        span.text = text
+        span.text_pos = text_pos
+        self._spans.update([span])
+
     def insert(self, pos, length, include_length = -1):
         """
         Record insertion up to <include_length> characters,
@@ -342,23 +643,21 @@ class TextChanges:
         include_length = None: include nothing, don't record
                                zero length span either
         """
-        end = pos + length
-        spans_to_update = []
-
-        # shift all existing spans after position
-        for span in self._spans:
-            if span.pos > pos:
-                span.pos += length
-                spans_to_update.append(span)
+        # Shift all existing spans after position. Only those whose
+        # text includes the insertion point need new text.
+        spans_to_update = self._spans.find_text_changed(pos, pos, pos)
+        self._spans.shift(pos, length)
+        span = span2 = None
 
         if include_length == -1:
             # include all of the insertion
             span = self.find_span_at(pos)
             if span:
                 span.length += length
+                self._spans.update([span])
             else:
                 span = TextSpan(pos, length);
-                self._spans.append(span)
+                self._spans.insert(span)
             spans_to_update.append(span)
         else:
             # include the insertion up to include_length only
@@ -368,6 +667,7 @@ class TextChanges:
                  # cut existing span
                 old_length = span.length
                 span.length = pos - span.pos + max_include
+                self._spans.update([span])
                 spans_to_update.append(span)
 
                 # new span for the cut part
@@ -375,16 +675,19 @@ class TextChanges:
                 if l > 0 or \
                    l == 0 and include_length is None:
                     span2 = TextSpan(pos + length, l)
-                    self._spans.append(span2)
+                    self._spans.insert(span2)
                     spans_to_update.append(span2)
 
             elif not include_length is None:
                 span = TextSpan(pos, max_include)
-                self._spans.append(span)
+                self._spans.insert(span)
                 spans_to_update.append(span)
 
+        self._mark_unconsolidated([s for s in (span, span2) if s])
+
         t = time.time()
         for span in spans_to_update:
+            self._spans.materialize(span)
             span.last_modified = t
 
         if spans_to_update:
@@ -403,29 +706,33 @@ class TextChanges:
         """
         begin = pos
         end   = pos + length
-        spans_to_update = []
-
-        #from pudb import set_trace; set_trace()
-
-        # cut/remove existing spans
-        for span in list(self._spans):
-            if span.pos <= pos:          # span begins before deletion point?
-                k = min(span.end() - begin, length)   # intersecting length
-                if k >= 0:
-                    span.length -= k
-                    spans_to_update.append(span)
-            else:                        # span begins after deletion point
-                k = end - span.begin()   # intersecting length
-                if k >= 0:
-                    span.pos += k
-                    span.length -= k
-                span.pos -= length       # shift by deleted length
-
-                # remove spans fully contained in the deleted range
-                if span.length < 0:
-                    self._spans.remove(span)
-                else:
-                    spans_to_update.append(span)
+
+        # cut spans beginning before the deletion point
+        spans_to_update = self._spans.find_all(begin, pos)
+        for span in spans_to_update:
+            k = min(span.end() - begin, length)   # intersecting length
+            span.length -= k
+        self._spans.update(spans_to_update)
+        self._mark_unconsolidated(spans_to_update)
+
+        # cut spans beginning inside the deleted range,
+        # remove those fully contained in it
+        for span in self._spans.extract(pos, end):
+            k = end - span.begin()   # intersecting length
+            span.pos += k
+            span.length -= k
+            span.pos -= length       # shift by deleted length
+            if span.length >= 0:
+                self._spans.insert(span)
+                spans_to_update.append(span)
+                self._mark_unconsolidated([span])
+
+        # Shift spans after the deleted range. Only those whose
+        # text overlaps the deletion need new text.
+        for span in self._spans.find_text_changed(pos, begin, end):
+            if not any(span is s for s in spans_to_update):
+                spans_to_update.append(span)
+        self._spans.shift(end, -length)
 
         # Add new empty span
         if record_empty_spans:
@@ -434,16 +741,69 @@ class TextChanges:
                 # Create empty span when deleting too, because this
                 # is still a change that can result in a word to learn.
                 span = TextSpan(pos, 0);
-                self._spans.append(span)
+                self._spans.insert(span)
 
-            self._spans, span = self.consolidate_spans(self._spans, span)
+            span, merged_spans = self._consolidate_span(span)
             spans_to_update.append(span)
 
+            # Spans can only have come to touch others when they
+            # were modified, no need to look at the rest.
+            for s in self._unconsolidated:
+                if self._spans.contains(s):
+                    self._spans.materialize(s)
+                    merged_spans += self._consolidate_span(s)[1]
+            self._unconsolidated = []
+
+            # joined spans need new text
+            for s in merged_spans:
+                if self._spans.contains(s) and \
+                   not any(s is s2 for s2 in spans_to_update):
+                    spans_to_update.append(s)
+
+        for span in spans_to_update:
+            self._spans.materialize(span)
+
         if spans_to_update:
             self.delete_count += 1
 
         return spans_to_update
 
+    def _mark_unconsolidated(self, spans):
+        self._unconsolidated.extend(spans)
+
+        # Without consolidating deletions, e.g. in terminals,
+        # forget about spans that were removed in the meantime.
+        if len(self._unconsolidated) > 2 * len(self._spans) + 100:
+            spans = {id(s) : s for s in self._unconsolidated
+                     if self._spans.contains(s)}
+            self._unconsolidated = list(spans.values())
+
+    def _consolidate_span(self, tracked_span):
+        """
+        Join spans touching or intersecting tracked_span, the local
+        equivalent of consolidate_spans(). Returns the joined
+        tracked_span and all spans that absorbed others.
+        """
+        merged_spans = []
+        while True:
+            spans = self._spans.find_all(tracked_span.begin(),
+                                         tracked_span.end())
+            if len(spans) <= 1:
+                break
+
+            for span in spans:
+                self._spans.remove(span)
+            new_spans, tracked_span = \
+                self.consolidate_spans(spans, tracked_span)
+            for span in new_spans:
+                self._spans.insert(span)
+
+            if len(new_spans) == len(spans):
+                break
+            merged_spans += new_spans
+
+        return tracked_span, merged_spans
+
     @staticmethod
     def consolidate_spans(spans, tracked_span = None):
         """
@@ -501,10 +861,8 @@ class TextChanges:
         >>> c.find_span_at(0)   # doctest: +ELLIPSIS
         TextSpan(0, 0,...
         """
-        for span in self._spans:
-            if span.pos <= pos <= span.pos + span.length:
-                return span
-        return None
+        return self._spans.find_first(
+            lambda span: span.pos <= pos <= span.pos + span.length, pos)
 
     def find_span_excluding(self, pos):
         """
@@ -523,19 +881,18 @@ class TextChanges:
         >>> c.find_span_excluding(1)   # doctest: +ELLIPSIS
 
         """
-        for span in self._spans:
-            if span.pos == pos or \
-               span.pos <= pos < span.pos + span.length:
-                return span
-        return None
+        return self._spans.find_first(
+            lambda span: span.pos == pos or
+                         span.pos <= pos < span.pos + span.length, pos)
 
     def get_span_ranges(self):
-        return self.to_span_ranges(self._spans)
+        return self.to_span_ranges(self.get_spans())
 
     @staticmethod
     def to_span_ranges(spans):
         return sorted([[span.pos, span.length] for span in spans])
 
     def __repr__(self):
-        return "TextChanges(" + repr([str(span) for span in self._spans]) + ")"
+        return "TextChanges(" + \
+               repr([str(span) for span in self.get_spans()]) + ")"
 
@@ -35,6 +35,7 @@ except ImportError as e:
 from Onboard.AtspiStateTracker import AtspiStateTracker, AtspiStateType
 from Onboard.TextDomain        import TextDomains
 from Onboard.TextChanges       import TextChanges, TextSpan
+from Onboard.TextMirror        import TextMirror
 from Onboard.utils             import KeyCode, unicode_str
 from Onboard.Timer             import Timer
 from Onboard                   import KeyCommon
@@ -102,6 +103,7 @@ class AtspiTextContext(TextContext):
         self._text_domain = self._text_domains.get_nop_domain()
 
         self._changes = TextChanges()
+        self._text_mirror = TextMirror()
         self._entering_text = False
         self._text_changed = False
 
@@ -321,11 +323,15 @@ class AtspiTextContext(TextContext):
             st.connect("text-entry-activated", self._on_text_entry_activated)
             st.connect("text-changed", self._on_text_changed)
             st.connect("text-caret-moved", self._on_text_caret_moved)
+            st.connect("text-selection-changed",
+                       self._on_text_selection_changed)
             # st.connect("key-pressed", self._on_atspi_key_pressed)
         else:
             st.disconnect("text-entry-activated", self._on_text_entry_activated)
             st.disconnect("text-changed", self._on_text_changed)
             st.disconnect("text-caret-moved", self._on_text_caret_moved)
+            st.disconnect("text-selection-changed",
+                          self._on_text_selection_changed)
             # st.disconnect("key-pressed", self._on_atspi_key_pressed)
 
     def get_accessible_capabilities(self, accessible):
@@ -356,6 +362,7 @@ class AtspiTextContext(TextContext):
         self._accessible = accessible
         self._entering_text = False
         self._text_changed = False
+        self._text_mirror.reset()
 
         # make sure state is filled with essential entries
         if accessible:
@@ -364,11 +371,14 @@ class AtspiTextContext(TextContext):
             accessible.get_interfaces()
             accessible.is_urlbar()
             state = accessible.get_state()
+            accessible_id = accessible.get_dbus_address()
         else:
             state = {}
+            accessible_id = None
 
         # select text domain matching this accessible
-        self._text_domain = self._text_domains.find_match(**state)
+        self._text_domain = self._text_domains.find_match(accessible_id,
+                                                          **state)
         self._text_domain.init_domain()
 
         # determine capabilities of this accessible
@@ -408,18 +418,22 @@ class AtspiTextContext(TextContext):
         _logger.atspi("_on_text_changed: pos={}, length={}, insert={}"
                       .format(event.pos, event.length, event.insert))
 
+        if event.insert:
+            self._text_mirror.insert(event.pos, event.length, event.text)
+        else:
+            self._text_mirror.delete(event.pos, event.length, event.text)
+
         insertion_span = self._record_text_change(event.pos,
                                                   event.length,
                                                   event.insert)
         # synchronously notify of text insertion
         if insertion_span:
-            try:
-                caret_offset = self._accessible.get_caret_offset()
-            except Exception as ex:  # Private exception gi._glib.GError when
-                _logger.info("TextContext._on_text_changed(): " +
-                            unicode_str(ex))
-            else:
-                self._wp.on_text_inserted(insertion_span, caret_offset)
+            # No D-Bus round trip per keystroke: the mirror keeps the
+            # caret up to date, else assume typing at the caret.
+            caret_offset = self._text_mirror.get_caret()
+            if caret_offset is None:
+                caret_offset = event.pos + event.length
+            self._wp.on_text_inserted(insertion_span, caret_offset)
 
         self._last_text_change_time = time.time()
         self._update_context()
@@ -427,9 +441,14 @@ class AtspiTextContext(TextContext):
     def _on_text_caret_moved(self, event):
         self._last_caret_move_time = time.time()
         self._last_caret_move_position = event.caret
+        self._text_mirror.set_caret(event.caret)
         self._update_context()
         self._wp.on_text_caret_moved()
 
+    def _on_text_selection_changed(self, event):
+        self._text_mirror.set_selection_changed()
+        self._update_context()
+
     def _on_atspi_key_pressed(self, event):
         """ disabled, Francesco didn't receive any AT-SPI key-strokes. """
         # keycode = event.hw_code # uh oh, only keycodes...
@@ -465,8 +484,8 @@ class AtspiTextContext(TextContext):
         accessible = self._accessible
 
         insertion_span = None
-        char_count = None
-        if accessible:
+        char_count = self._text_mirror.get_character_count()
+        if accessible and char_count is None:
             try:
                 char_count = accessible.get_character_count()
             except:     # gi._glib.GError: The application no longer exists
@@ -514,7 +533,7 @@ class AtspiTextContext(TextContext):
                         begin = max(pos - 100, 0)
                         end = min(pos + length + 100, char_count)
                         try:
-                            text = accessible.get_text(begin, end)
+                            text = self._get_text(accessible, begin, end)
                         except Exception as ex:
                             _logger.info("_record_text_change() exception 1: "
                                          + unicode_str(ex))
@@ -534,12 +553,12 @@ class AtspiTextContext(TextContext):
                 begin = max(span.begin() - 100, 0)
                 end = min(span.end() + 100, char_count)
                 try:
-                    span.text = accessible.get_text(begin, end)
+                    text = self._get_text(accessible, begin, end)
                 except Exception as ex:
                     _logger.info("_record_text_change() exception 2: " +
                                  unicode_str(ex))
-                    span.text = ""
-                span.text_pos = begin
+                    text = ""
+                self._changes.set_span_text(span, text, begin)
 
         self._text_changed = True
 
@@ -552,6 +571,13 @@ class AtspiTextContext(TextContext):
 
         return insertion_span
 
+    def _get_text(self, accessible, begin, end):
+        """ Text of the accessible, from the text mirror if possible. """
+        text = self._text_mirror.get_text(begin, end)
+        if text is None:
+            text = accessible.get_text(begin, end)
+        return text
+
     def set_update_context_delay(self, delay):
         self._update_context_delay = delay
 
@@ -559,10 +585,34 @@ class AtspiTextContext(TextContext):
         self._update_context_delay = self._update_context_delay_normal
 
     def _update_context(self):
-        self._update_context_timer.start(self._update_context_delay,
-                                         self.on_text_context_changed)
+        """
+        Update the context right away when the text mirror can provide it,
+        else read it from the accessible after a short delay.
+        """
+        result = None
+        if self._text_domain and self._accessible:
+            result = self._text_domain.read_context_from_mirror(
+                self._accessible, self._text_mirror)
+
+        if result is not None:
+            self._update_context_timer.stop()
+            self._clear_stale_pending_separator()
+            self._apply_context(result)
+        else:
+            self._update_context_timer.start(self._update_context_delay,
+                                             self.on_text_context_changed)
 
     def on_text_context_changed(self):
+        self._clear_stale_pending_separator()
+
+        result = self._text_domain.read_context(self._wp, self._accessible,
+                                                self._text_mirror)
+        if result is not None:
+            self._apply_context(result)
+
+        return False
+
+    def _clear_stale_pending_separator(self):
         # Clear pending separator when the user clicked to move
         # the cursor away from the separator position.
         if self._pending_separator_span:
@@ -573,26 +623,24 @@ class AtspiTextContext(TextContext):
                    self._pending_separator_span.begin():
                     self.set_pending_separator(None)
 
-        result = self._text_domain.read_context(self._wp, self._accessible)
-        if result is not None:
-            (self._context,
-             self._line,
-             self._line_caret,
-             self._selection_span,
-             self._begin_of_text,
-             self._begin_of_text_offset) = result
-
-            # make sure to include bot-markers and pending separator
-            context = self.get_pending_bot_context()
-            change_detected = (self._last_context != context or
-                               self._last_line != self._line)
-            if change_detected:
-                self._last_context = context
-                self._last_line    = self._line
-
-            self._wp.on_text_context_changed(change_detected)
-
-        return False
+    def _apply_context(self, result):
+        """ Take over the results of read_context() and notify. """
+        (self._context,
+         self._line,
+         self._line_caret,
+         self._selection_span,
+         self._begin_of_text,
+         self._begin_of_text_offset) = result
+
+        # make sure to include bot-markers and pending separator
+        context = self.get_pending_bot_context()
+        change_detected = (self._last_context != context or
+                           self._last_line != self._line)
+        if change_detected:
+            self._last_context = context
+            self._last_line    = self._line
+
+        self._wp.on_text_context_changed(change_detected)
 
 
 class InputLine(TextContext):
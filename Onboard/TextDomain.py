@@ -22,6 +22,7 @@ from __future__ import division, print_function, unicode_literals
 import os
 import re
 import glob
+from collections import OrderedDict
 
 import logging
 
@@ -33,12 +34,48 @@ except ImportError as e:
     pass
 
 from Onboard.TextChanges  import TextSpan
+from Onboard.TextMirror   import find_line
 from Onboard.utils        import KeyCode, Modifiers, unicode_str
 
 _logger = logging.getLogger("TextDomain")
 
 class TextDomains:
-    """ Collection of all recognized text domains. """
+    """
+    Collection of all recognized text domains.
+
+    Domains are indexed by the accessible roles they are restricted to,
+    so that matching only has to try the candidates for the focused role.
+    Matches are remembered per accessible.
+
+    Doctests:
+    >>> domains = TextDomains()
+    >>> text = {"interfaces" : ["Text"]}
+    >>> domains.find_match(role=Atspi.Role.TERMINAL, **text).__class__
+    <class 'Onboard.TextDomain.DomainTerminal'>
+    >>> domains.find_match(role=Atspi.Role.PASSWORD_TEXT).__class__
+    <class 'Onboard.TextDomain.DomainPassword'>
+    >>> domains.find_match(role=Atspi.Role.ENTRY, is_urlbar=True).__class__
+    <class 'Onboard.TextDomain.DomainURL'>
+    >>> domains.find_match(role=Atspi.Role.ENTRY, **text).__class__
+    <class 'Onboard.TextDomain.DomainGenericText'>
+    >>> domains.find_match(role=Atspi.Role.ENTRY).__class__
+    <class 'Onboard.TextDomain.DomainNOP'>
+
+    # cached per accessible and everything matching depends on
+    >>> domains.find_match(("bus", "/path"), role=Atspi.Role.ENTRY).__class__
+    <class 'Onboard.TextDomain.DomainNOP'>
+    >>> domains.find_match(("bus", "/path"), role=Atspi.Role.ENTRY,
+    ...                    **text).__class__
+    <class 'Onboard.TextDomain.DomainGenericText'>
+    >>> domains.find_match(("bus", "/path"), role=Atspi.Role.ENTRY,
+    ...                    is_urlbar=True, **text).__class__
+    <class 'Onboard.TextDomain.DomainURL'>
+    >>> domains.find_match(("bus", "/path"), role=Atspi.Role.TERMINAL,
+    ...                    **text).__class__
+    <class 'Onboard.TextDomain.DomainTerminal'>
+    """
+
+    MAX_CACHE_SIZE = 256    # max number of remembered accessibles
 
     def __init__(self):
         # default domain has to be last
@@ -50,11 +87,53 @@ class TextDomains:
                          DomainNOP()
                         ]
 
-    def find_match(self, **kwargs):
-        for domain in self._domains:
-            if domain.matches(**kwargs):
+        # role -> candidate domains in order of priority
+        roles = set(role for domain in self._domains
+                    for role in domain.get_match_roles() or ())
+        self._candidates = {role : self._get_candidates(role)
+                            for role in roles}
+        self._any_role_candidates = self._get_candidates(None)
+
+        self._match_cache = OrderedDict()
+
+    def _get_candidates(self, role):
+        return tuple(domain for domain in self._domains
+                     if domain.get_match_roles() is None or
+                        role in domain.get_match_roles())
+
+    def find_match(self, accessible_id=None, **kwargs):
+        """
+        Return the first domain matching the accessible's state.
+        accessible_id identifies the accessible for caching, usually
+        its D-Bus address, None to skip the cache.
+        """
+        role = kwargs.get("role")
+
+        if accessible_id is not None:
+            key = (accessible_id, role,
+                   tuple(sorted(kwargs.get("interfaces") or ())),
+                   bool(kwargs.get("is_urlbar")))
+            domain = self._match_cache.get(key)
+            if domain is not None:
+                self._match_cache.move_to_end(key)
                 return domain
-        return None  # should never happen, default domain always matches
+
+        candidates = self._candidates.get(role, self._any_role_candidates)
+        for domain in candidates:
+            if domain.matches(**kwargs):
+                break
+        else:
+            domain = None  # should never happen, default domain always matches
+
+        if accessible_id is not None and domain is not None:
+            self._match_cache[key] = domain
+            while len(self._match_cache) > self.MAX_CACHE_SIZE:
+                self._match_cache.popitem(last=False)
+
+        return domain
+
+    def clear_cache(self):
+        self._match_cache.clear()
 
     def get_nop_domain(self):
         return self._domains[-1]
@@ -65,9 +144,15 @@ class TextDomain:
     Abstract base class as a catch-all for domain specific functionalty.
     """
 
+    _whitespace_pattern = re.compile(r"(\s+)", re.UNICODE)
+
     def __init__(self):
         self._url_parser = PartialURLParser()
 
+    def get_match_roles(self):
+        """ Roles this domain can match, None for any role. """
+        return None
+
     def matches(self, **kwargs):
         # Weed out unity text entries that report being editable but don't
         # actually provide methods of the Atspi.Text interface.
@@ -77,9 +162,16 @@ class TextDomain:
         """ Called on being selected as the currently active domain. """
         pass
 
-    def read_context(self, keyboard, accessible):
+    def read_context(self, keyboard, accessible, text_mirror=None):
         return NotImplementedError()
 
+    def read_context_from_mirror(self, accessible, text_mirror):
+        """
+        Context from mirrored text alone, None if the domain
+        has to read it from the accessible.
+        """
+        return None
+
     def get_text_begin_marker(self):
         return ""
 
@@ -136,12 +228,19 @@ class TextDomain:
         # no false positives for valid filenames before the current token
         >>> d.get_auto_separator(dir + "/onboard-defaults no-file")
         ' '
+
+        # terminal
+        >>> DomainTerminal().get_auto_separator(
+        ...     "ls " + join(dir, "onboard-defaults"))
+        '.'
+        >>> DomainTerminal().get_auto_separator("cd /etc")
+        '/'
         """
         separator = " "
 
         # Split at whitespace to catch whole URLs/file names and
         # keep separators.
-        strings = re.split(r'(\s+)', context)
+        strings = self._whitespace_pattern.split(context)
         if strings:
             string = strings[-1]
             if self._url_parser.is_maybe_url(string):
@@ -321,7 +420,7 @@ class DomainNOP(TextDomain):
     def matches(self, **kwargs):
         return True
 
-    def read_context(self, keyboard, accessible):
+    def read_context(self, keyboard, accessible, text_mirror=None):
         return "", "", 0, TextSpan(), False, 0
 
     def get_auto_separator(self, context):
@@ -332,6 +431,9 @@ class DomainNOP(TextDomain):
 class DomainPassword(DomainNOP):
     """ Do-nothing domain for password entries """
 
+    def get_match_roles(self):
+        return (Atspi.Role.PASSWORD_TEXT,)
+
     def matches(self, **kwargs):
         return kwargs.get("role") == Atspi.Role.PASSWORD_TEXT
 
@@ -342,11 +444,23 @@ class DomainPassword(DomainNOP):
 class DomainGenericText(TextDomain):
     """ Default domain for generic text entry """
 
+    CONTEXT_BEFORE_MIN = 64     # initial characters before the caret
+    CONTEXT_BEFORE_MAX = 1024   # max characters before the caret
+    CONTEXT_AFTER = 100         # characters after the caret
+    CONTEXT_MIN_WORDS = 8       # grow the window until it has more words
+
     def matches(self, **kwargs):
         return TextDomain.matches(self, **kwargs)
 
-    def read_context(self, keyboard, accessible):
-        """ Extract prediction context from the accessible """
+    def read_context(self, keyboard, accessible, text_mirror=None):
+        """
+        Extract prediction context from the accessible.
+        Serve it from text_mirror instead when possible.
+        """
+        if text_mirror:
+            result = self.read_context_from_mirror(accessible, text_mirror)
+            if result is not None:
+                return result
 
         # get caret position from selection
         selection = accessible.get_selection()
@@ -371,41 +485,74 @@ class DomainGenericText(TextDomain):
                     offset = count
 
                 selection = (offset, offset)
-
-            r = accessible.get_text_at_offset(
-                selection[0], Atspi.TextBoundaryType.LINE_START)
         except Exception as ex:     # Private exception gi._glib.GError when
                                     # gedit became unresponsive.
             _logger.info("DomainGenericText.read_context(), text: " +
                          unicode_str(ex))
             return None
 
-        line = unicode_str(r.content).replace("\n", "")
-        line_caret = max(selection[0] - r.start_offset, 0)
-
-        begin = max(selection[0] - 256, 0)
-        end   = min(selection[0] + 100, count)
-        try:
-            text = accessible.get_text(begin, end)
-        except Exception as ex:     # Private exception gi._glib.GError when
-                                    # gedit became unresponsive.
-            _logger.info("DomainGenericText.read_context(), text2: " +
-                         unicode_str(ex))
+        # Fetch a small window before the caret and grow it until it holds
+        # enough words for prediction or reaches the begin of text.
+        # Long lines are clipped to the window.
+        caret = selection[0]
+        before = self.CONTEXT_BEFORE_MIN
+        begin = max(caret - before, 0)
+        end = min(caret + self.CONTEXT_AFTER, count)
+        text = self._get_text(accessible, begin, end)
+        while text is not None and \
+              begin > 0 and \
+              before < self.CONTEXT_BEFORE_MAX and \
+              len(text[:caret - begin].split()) <= self.CONTEXT_MIN_WORDS:
+            before *= 2
+            new_begin = max(caret - before, 0)
+            head = self._get_text(accessible, new_begin, begin)
+            text = None if head is None else head + text
+            begin = new_begin
+        if text is None:
             return None
 
-        text = unicode_str(text)
+        context = text[:caret - begin]
+        line, line_caret = find_line(text, caret - begin)
 
         # Not all text may be available for large selections. We only need the
         # part before the begin of the selection/caret.
         selection_span = TextSpan(selection[0], selection[1] - selection[0],
                                   text, begin)
-        context = text[:selection[0] - begin]
         begin_of_text = begin == 0
         begin_of_text_offset = 0
 
+        if text_mirror:
+            text_mirror.update(begin, text, count, selection[0], selection)
+
         return (context, line, line_caret, selection_span,
                 begin_of_text, begin_of_text_offset)
 
+    @staticmethod
+    def _get_text(accessible, begin, end):
+        try:
+            return unicode_str(accessible.get_text(begin, end))
+        except Exception as ex:     # Private exception gi._glib.GError when
+                                    # gedit became unresponsive.
+            _logger.info("DomainGenericText.read_context(), text2: " +
+                         unicode_str(ex))
+        return None
+
+    def read_context_from_mirror(self, accessible, text_mirror):
+        """
+        Context from mirrored text, None if the accessible has to be read.
+        """
+        if text_mirror.needs_validation():
+            try:
+                count = accessible.get_character_count()
+            except Exception as ex:
+                _logger.info("DomainGenericText.read_context(), count: " +
+                             unicode_str(ex))
+                text_mirror.invalidate()
+                return None
+            text_mirror.validate(count)
+
+        return text_mirror.read_context()
+
     def can_spell_check(self, section_span):
         """
         Can we auto-correct this span?.
@@ -460,6 +607,9 @@ class DomainTerminal(TextDomain):
                                 )
                             )
 
+    def get_match_roles(self):
+        return (Atspi.Role.TERMINAL,)
+
     def matches(self, **kwargs):
         return TextDomain.matches(self, **kwargs) and \
                kwargs.get("role") == Atspi.Role.TERMINAL
@@ -467,7 +617,7 @@ class DomainTerminal(TextDomain):
     def init_domain(self):
         pass
 
-    def read_context(self, keyboard, accessible):
+    def read_context(self, keyboard, accessible, text_mirror=None):
         """
         Extract prediction context from the accessible
         """
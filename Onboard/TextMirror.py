@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2012-2017 marmuta <marmvta@gmail.com>
+#
+# This file is part of Onboard.
+#
+# Onboard is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Onboard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import division, print_function, unicode_literals
+
+import time
+
+from Onboard.TextChanges import TextSpan
+
+### Logging ###
+import logging
+_logger = logging.getLogger("TextMirror")
+###############
+
+
+def find_line(text, offset):
+    """
+    Return the line around offset and the offset within the line.
+    Lines without line break inside text are clipped to text.
+
+    Doctests:
+    >>> find_line("abc\\ndef ghi\\njkl", 6)
+    ('def ghi', 2)
+    >>> find_line("def ghi", 7)
+    ('def ghi', 7)
+    >>> find_line("abc\\n", 4)
+    ('', 0)
+    """
+    begin = text.rfind("\n", 0, offset) + 1
+    end = text.find("\n", offset)
+    if end < 0:
+        end = len(text)
+    return text[begin:end], offset - begin
+
+
+class TextMirror:
+    """
+    Local copy of a window of the focused accessible's text.
+
+    The mirror is filled from regular reads of the text context and kept
+    up to date with the text payloads of AT-SPI insert and delete events.
+    It serves context, line and span text without D-Bus round trips.
+    Whenever it can't be sure about the text, it becomes invalid and
+    callers fall back to reading from the accessible.
+
+    Doctests:
+    >>> m = TextMirror()
+    >>> m.update(0, "abc def\\nghi", 11, 7)
+    >>> m.read_context()
+    ('abc def', 'abc def', 7, TextSpan(7, 0, '', 0, None), True, 0)
+
+    # typing at the caret
+    >>> m.insert(7, 1, "s")
+    >>> m.get_text(0, 8), m.read_context()[:3]
+    ('abc defs', ('abc defs', 'abc defs', 8))
+    >>> m.get_character_count()
+    12
+
+    # backspace
+    >>> m.delete(7, 1, "s")
+    >>> m.read_context()[:3]
+    ('abc def', 'abc def', 7)
+
+    # insertion without text payload invalidates the mirror
+    >>> m.insert(0, 3, None)
+    >>> m.is_valid(), m.read_context()
+    (False, None)
+    """
+
+    MAX_LENGTH = 8192           # max number of mirrored characters
+    CONTEXT_BEFORE = 1024       # max characters before the caret in contexts
+    CONTEXT_AFTER = 100         # characters after the caret in spans
+    VALIDATION_INTERVAL = 1.0   # seconds between character count checks
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._begin = 0         # document offset of the mirrored text
+        self._text = None       # mirrored text, None when invalid
+        self._count = None      # character count of the whole document
+        self._caret = None      # caret offset
+        self._selection_known = False  # no selection but the caret?
+        self._last_validation_time = 0.0
+
+    def is_valid(self):
+        return self._text is not None
+
+    def invalidate(self):
+        if self._text is not None:
+            _logger.debug("text mirror invalidated")
+        self._text = None
+
+    def update(self, begin, text, count, caret, selection=None):
+        """
+        Merge text read from the accessible at document offset begin.
+        Text adjacent to or overlapping the mirrored text extends it,
+        anything else replaces it.
+
+        Doctests:
+        >>> m = TextMirror()
+        >>> m.update(10, "klmno", 100, 12)
+        >>> m.update(13, "nopqr", 100, 12)
+        >>> m.get_text(10, 18)
+        'klmnopqr'
+        >>> m.update(5, "fghij", 100, 7)
+        >>> m.get_text(5, 18)
+        'fghijklmnopqr'
+        >>> m.update(50, "xyz", 100, 51)
+        >>> m.get_text(5, 18) is None, m.get_text(50, 53)
+        (True, 'xyz')
+        """
+        if self._text is not None and \
+           count == self._count and \
+           begin <= self._begin + len(self._text) and \
+           self._begin <= begin + len(text):
+            end = begin + len(text)
+            if begin < self._begin:
+                text = text + self._text[end - self._begin:]
+            else:
+                text = self._text[:begin - self._begin] + text + \
+                       self._text[end - self._begin:]
+                begin = self._begin
+
+        self._begin = begin
+        self._text = text
+        self._count = count
+        self._caret = caret
+        self._selection_known = selection is None or \
+                                selection[0] == selection[1]
+        self._last_validation_time = time.time()
+        self._limit_length()
+
+    def insert(self, pos, length, text):
+        """ Apply the payload of an AT-SPI insert event. """
+        if self._text is None:
+            return
+        if text is None or len(text) != length:
+            self.invalidate()
+            return
+
+        mirror_end = self._begin + len(self._text)
+        if pos < self._begin:
+            self._begin += length
+        elif pos <= mirror_end:
+            offset = pos - self._begin
+            self._text = self._text[:offset] + text + self._text[offset:]
+        self._count += length
+
+        # Shift the caret until the caret-moved event arrives.
+        if self._caret is not None and pos <= self._caret:
+            self._caret += length
+        self._limit_length()
+
+    def delete(self, pos, length, text=None):
+        """ Apply the payload of an AT-SPI delete event. """
+        if self._text is None:
+            return
+        if text is not None and len(text) != length or \
+           pos + length > self._count:
+            self.invalidate()
+            return
+
+        begin = self._begin
+        end = begin + len(self._text)
+        del_end = pos + length
+
+        # Text before the mirrored range shifts it to the left.
+        self._begin -= min(del_end, begin) - min(pos, begin)
+        self._text = self._text[:max(0, min(pos, end) - begin)] + \
+                     self._text[max(0, min(del_end, end) - begin):]
+        self._count -= length
+
+        if self._caret is not None and pos < self._caret:
+            self._caret -= min(del_end, self._caret) - pos
+
+    def set_caret(self, caret):
+        self._caret = caret
+
+    def get_caret(self):
+        """
+        Caret offset, shifted along with mirrored insertions and
+        deletions, None if unknown.
+
+        Doctests:
+        >>> m = TextMirror()
+        >>> m.update(0, "abc", 3, 3)
+        >>> m.insert(3, 2, "de"); m.get_caret()
+        5
+        >>> m.invalidate(); m.get_caret() is None
+        True
+        """
+        return self._caret if self._text is not None else None
+
+    def set_selection_changed(self):
+        """ A selection may exist now, the caret alone isn't enough. """
+        self._selection_known = False
+
+    def get_character_count(self):
+        """ Character count of the document, None if unknown. """
+        return self._count if self._text is not None else None
+
+    def get_text(self, begin, end):
+        """
+        Text of the given document range, None if it isn't mirrored.
+        The range is clipped to the document.
+        """
+        if self._text is None:
+            return None
+        begin = max(begin, 0)
+        end = min(end, self._count)
+        if begin < self._begin or \
+           end > self._begin + len(self._text):
+            return None
+        return self._text[begin - self._begin:end - self._begin]
+
+    def needs_validation(self):
+        return self._text is not None and \
+               time.time() - self._last_validation_time >= \
+               self.VALIDATION_INTERVAL
+
+    def validate(self, count):
+        """
+        Compare with the character count reported by the accessible,
+        invalidate on mismatch.
+        """
+        self._last_validation_time = time.time()
+        if count != self._count:
+            _logger.debug("text mirror: character count mismatch {} != {}"
+                          .format(count, self._count))
+            self.invalidate()
+
+    def read_context(self):
+        """
+        Return the same results as DomainGenericText.read_context(),
+        or None if the mirrored text isn't sufficient.
+        """
+        if self._text is None or \
+           self._caret is None or \
+           not self._selection_known:
+            return None
+
+        # Context reaches back as far as mirrored, long lines are clipped.
+        caret = self._caret
+        begin = max(caret - self.CONTEXT_BEFORE, self._begin)
+        end   = min(caret + self.CONTEXT_AFTER, self._count)
+        text = self.get_text(begin, end) if begin <= caret else None
+        if text is None:
+            return None
+
+        line, line_caret = find_line(text, caret - begin)
+
+        selection_span = TextSpan(caret, 0, text, begin)
+        context = text[:caret - begin]
+        begin_of_text = begin == 0
+        begin_of_text_offset = 0
+
+        return (context, line, line_caret, selection_span,
+                begin_of_text, begin_of_text_offset)
+
+    def _limit_length(self):
+        """ Keep mirrored text around the caret within MAX_LENGTH. """
+        excess = len(self._text) - self.MAX_LENGTH
+        if excess > 0:
+            caret = self._caret if self._caret is not None else self._begin
+            offset = min(max(caret - self._begin - self.MAX_LENGTH // 2, 0),
+                         excess)
+            self._begin += offset
+            self._text = self._text[offset:offset + self.MAX_LENGTH]
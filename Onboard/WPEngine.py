@@ -209,12 +209,7 @@ class WPLocalEngine(object):
         """
         tokspans  = [(spans[i][0], spans[i][1], t)
                      for i, t in enumerate(tokens)]
-        counts = [[0 for lmid in lmids] for t in tokspans]
-        for i, lmid in enumerate(lmids):
-            model = self._model_cache.get_model(lmid)
-            if model:
-                for j, t in enumerate(tokspans):
-                    counts[j][i] = model.lookup_word(t[2])
+        counts = self.lookup_words([t[2] for t in tokspans], lmids)
 
         _logger.debug("lookup_tokens: tokens=%s counts=%s" %
                      (repr(tokens), repr(counts)))
@@ -223,20 +218,38 @@ class WPLocalEngine(object):
         # -n for partial matches
         return tokens, counts
 
+    def lookup_words(self, words, lmids):
+        """
+        Lookup all words in each of the given language models with a
+        single call per model.
+
+        Returns a two dimensional array of lookup results with one row
+        per word and one column per language model. Lookup results are
+        the same as in lookup_tokens().
+        """
+        counts = [[0] * len(lmids) for word in words]
+        if words:
+            for i, lmid in enumerate(lmids):
+                model = self._model_cache.get_model(lmid)
+                if model:
+                    for j, count in enumerate(model.lookup_words(words)):
+                        counts[j][i] = count
+        return counts
+
     def word_exists(self, word):
         """
         Does word exist in any of the non-scratch models?
         """
-        exists = False
-        lmids = self.persistent_models
-        for i, lmid in enumerate(lmids):
-            model = self._model_cache.get_model(lmid)
-            if model:
-                count = model.lookup_word(word)
-                if count > 0:
-                    exists = True
-                    break
-        return exists
+        return self.words_exist([word])[0]
+
+    def words_exist(self, words):
+        """
+        Which of words exist in any of the non-scratch models?
+        Returns one boolean per word.
+        """
+        counts = self.lookup_words(words, self.persistent_models)
+        return [any(count > 0 for count in model_counts)
+                for model_counts in counts]
 
     def tokenize_text(self, text):
         """
@@ -497,13 +497,17 @@ class WindowManipulator(object):
         if visible_rect is None:
             visible_rect = self.get_always_visible_rect()
 
+        limit_rects = self.get_limit_rects(limit_rects)
+        x, y = limit_window_position(x, y, visible_rect, limit_rects)
+        return x, y
+
+    def get_limit_rects(self, limit_rects = None):
+        """ Rects the window has to stay in, default all monitors. """
         if not limit_rects:
             if not self._monitor_rects:
                 self._monitor_rects = get_monitor_rects(self.get_screen())
             limit_rects = self._monitor_rects
-
-        x, y = limit_window_position(x, y, visible_rect, limit_rects)
-        return x, y
+        return limit_rects
 
     def hit_test_move_resize(self, point):
         canvas_rect = self.get_resize_frame_rect()
@@ -992,6 +996,124 @@ def limit_window_position(x, y, always_visible_rect, limit_rects = None):
 
     return x, y
 
+def find_free_position(x, y, size, visible_rect, limit_rects, obstacles,
+                       horizontal = True, vertical = True):
+    """
+    Find the window position closest to x, y where a window of the given
+    size doesn't intersect any of the obstacles, while visible_rect, in
+    canvas coordinates, stays fully inside one of the limit_rects.
+    Movement along disabled axes is only a last resort.
+    Returns (None, None) if there is no room anywhere.
+
+    Positions are searched for in the maximal empty rectangles left after
+    subtracting the obstacles from the limits.
+
+    Doctests:
+    >>> limits = [Rect(0, 0, 100, 100)]
+    >>> entry = Rect(0, 40, 100, 20)
+
+    # move up, the nearest free position
+    >>> find_free_position(10, 30, (30, 30), None, limits, [entry])
+    (10, 10)
+
+    # move down, nothing free above
+    >>> find_free_position(10, 10, (30, 30), None, limits,
+    ...                    [Rect(0, 20, 100, 20)])
+    (10, 40)
+
+    # move sideways, if only horizontal movement is allowed
+    >>> find_free_position(50, 30, (30, 30), None, limits,
+    ...                    [Rect(30, 40, 40, 10)], vertical = False)
+    (70, 30)
+
+    # next monitor
+    >>> limits = [Rect(0, 0, 100, 100), Rect(100, 0, 100, 100)]
+    >>> find_free_position(10, 20, (50, 50), None, limits,
+    ...                    [Rect(0, 0, 100, 100)])
+    (100, 20)
+
+    # no room
+    >>> find_free_position(10, 20, (50, 50), None, limits[:1],
+    ...                    [Rect(0, 0, 100, 100)])
+    (None, None)
+    """
+    w, h = size
+    if visible_rect is None:
+        visible_rect = Rect(0, 0, w, h)
+    vr = visible_rect.int()  # avoid rounding errors
+
+    # Obstacles in position space: open ranges of window positions
+    # that would make the window intersect them.
+    blocked = [(o.x - w, o.y - h, o.x + o.w, o.y + o.h)
+               for o in obstacles if not o.is_empty()]
+
+    best = None
+    for limits in limit_rects:
+        # closed ranges of positions keeping visible_rect inside limits
+        space = (limits.left() - vr.x,
+                 limits.top() - vr.y,
+                 limits.right() - vr.x - vr.w,
+                 limits.bottom() - vr.y - vr.h)
+        if space[0] > space[2] or space[1] > space[3]:
+            continue
+
+        for x0, y0, x1, y1 in _subtract_rects(space, blocked):
+            px = min(max(x, x0), x1)
+            py = min(max(y, y0), y1)
+            dx = px - x
+            dy = py - y
+            off_axis = (0 if horizontal else abs(dx)) + \
+                       (0 if vertical else abs(dy))
+            key = (off_axis, dx * dx + dy * dy)
+            if best is None or key < best[0]:
+                best = (key, px, py)
+
+    if best is None:
+        return None, None
+    return best[1], best[2]
+
+def _subtract_rects(space, blocked):
+    """
+    Maximal closed rectangles of space that don't overlap any of the
+    open blocked rectangles. Rectangles are (x0, y0, x1, y1) tuples.
+
+    Doctests:
+    >>> _subtract_rects((0, 0, 10, 10), [(2, 2, 4, 4)])
+    [(0, 0, 2, 10), (4, 0, 10, 10), (0, 0, 10, 2), (0, 4, 10, 10)]
+    >>> _subtract_rects((0, 0, 10, 10), [(-1, -1, 11, 5)])
+    [(0, 5, 10, 10)]
+    """
+    free = [space]
+    for bx0, by0, bx1, by1 in blocked:
+        pieces = []
+        for f in free:
+            fx0, fy0, fx1, fy1 = f
+            if bx0 >= fx1 or bx1 <= fx0 or \
+               by0 >= fy1 or by1 <= fy0:
+                pieces.append(f)
+                continue
+            if bx0 >= fx0:
+                pieces.append((fx0, fy0, bx0, fy1))
+            if bx1 <= fx1:
+                pieces.append((bx1, fy0, fx1, fy1))
+            if by0 >= fy0:
+                pieces.append((fx0, fy0, fx1, by0))
+            if by1 <= fy1:
+                pieces.append((fx0, by1, fx1, fy1))
+
+        # keep only maximal rectangles, first one of duplicates
+        free = []
+        for i, r in enumerate(pieces):
+            for j, o in enumerate(pieces):
+                if i != j and \
+                   o[0] <= r[0] and o[1] <= r[1] and \
+                   o[2] >= r[2] and o[3] >= r[3] and \
+                   (o != r or j < i):
+                    break
+            else:
+                free.append(r)
+    return free
+
 def get_monitor_rects(screen):
     """
     Screen limits, one rect per monitor. Monitors may have
@@ -42,7 +42,8 @@ from Onboard.LanguageSupport   import LanguageDB
 from Onboard.Layout            import LayoutPanel
 from Onboard.AtspiStateTracker import AtspiStateTracker
 from Onboard.WPEngine          import WPLocalEngine, ModelCache
-from Onboard.utils             import Rect, unicode_str, escape_markup
+from Onboard.utils             import Rect, unicode_str, escape_markup, \
+                                      LatencyStats
 from Onboard.Timer             import CallOnce, Timer, TimerOnce
 from Onboard.KeyGtk            import FullSizeKey, WordKey
 from Onboard.KeyboardPopups    import PendingSeparatorPopup
@@ -61,13 +62,18 @@ class WordSuggestions:
         self.text_context = self.atspi_text_context  # initialize for doctests
         self._learn_strategy = LearnStrategyLRU(self)
         self._languagedb = LanguageDB(self)
-        self._spell_checker = SpellChecker(self._languagedb)
+        self._spell_checker = SpellChecker(self._languagedb,
+                                           config.user_dir,
+                                           self.on_spell_checker_changed)
         self._punctuator = PunctuatorImmediateSeparators(self)
         self._pending_separator_popup = PendingSeparatorPopup()
         self._pending_separator_popup_timer = Timer()
         self._load_error_recovery = ModelErrorRecovery(self)
         self._load_errors_reported = False
         self._wpengine  = None
+        self._latency_stats = LatencyStats()
+        if config.log_stats:
+            self._latency_stats.enable()
 
         self._correction_choices = []
         self._correction_span = None
@@ -87,6 +93,8 @@ class WordSuggestions:
 
     def cleanup(self):
         self.reset()
+        self._spell_checker.save_query_cache()
+        self._latency_stats.log_report()
         if self.text_context:
             self.text_context.cleanup()
         if self._wpengine:
@@ -264,6 +272,7 @@ class WordSuggestions:
         self._punctuator.on_before_release(key)
 
     def on_after_key_release(self, key):
+        self._latency_stats.mark("key_release")
         self._punctuator.on_after_release(key)
 
         # DEL and BKSP don't always change text and generate
@@ -343,6 +352,12 @@ class WordSuggestions:
             dict_ids = [lang_id] if lang_id else []
             self._spell_checker.set_dict_ids(dict_ids)
 
+            # Load the dictionary of the previously used language
+            # in the background, users often toggle between two.
+            recent_ids = [id for id in config.typing_assistance.recent_languages
+                          if id != lang_id]
+            self._spell_checker.preload_dict_ids(recent_ids[:1])
+
         self.invalidate_context_ui()
 
     def invalidate_for_resize(self):
@@ -357,12 +372,14 @@ class WordSuggestions:
         return keys_to_redraw
 
     def update_wordlists(self):
+        t = self._latency_stats.start()
         keys_to_redraw = []
         items = self._get_wordlist_bars()
         for item in items:
             keys = item.create_keys(self._correction_choices,
                                     self._prediction_choices)
             keys_to_redraw.extend(keys)
+        self._latency_stats.lap("create_keys", t)
 
         # layout changed, but doesn't know it yet
         # -> invalidate all item caches
@@ -578,6 +595,7 @@ class WordSuggestions:
 
         if self._spell_checker and \
            config.are_spelling_suggestions_enabled():
+            t = self._latency_stats.start()
             caret_span = self.text_context.get_span_at_caret()
             if caret_span:
                 word_span = self._get_word_to_spell_check(caret_span,
@@ -587,6 +605,7 @@ class WordSuggestions:
                      self._correction_span,
                      auto_capitalization) = \
                         self._find_correction_choices(word_span, False)
+            self._latency_stats.lap("spell_check", t)
 
     def _find_correction_choices(self, word_span, auto_capitalize):
         """
@@ -657,10 +676,14 @@ class WordSuggestions:
 
             context = text_context.get_context()
             if context:  # don't load models on startup
+                stats = self._latency_stats
+                t = stats.start()
+
                 bot_marker = text_context.get_text_begin_marker()
                 bot_context = text_context.get_pending_bot_context()
 
                 tokens, spans = self._wpengine.tokenize_context(bot_context)
+                t = stats.lap("tokenize", t)
 
                 (case_insensitive_mode, ignore_non_caps,
                  capitalize, drop_capitalized) = \
@@ -675,27 +698,29 @@ class WordSuggestions:
                     case_insensitive_smart=case_insensitive_mode == 2,
                     accent_insensitive_smart=config.wp.accent_insensitive,
                     ignore_non_capitalized=ignore_non_caps)
-
-                choices = []
-                for choice in _choices:
-                    # Filter out begin of text markers that sneak in as
-                    # high frequency unigrams.
-                    if choice.startswith("<bot:"):
-                        continue
-
-                    # Drop upper caps spelling in favor of a lower caps one.
-                    # Auto-capitalization may elect to upper caps on insertion.
-                    if drop_capitalized:
-                        choice_lower = choice.lower()
-                        if choice != choice_lower and \
-                           self._wpengine.word_exists(choice_lower):
-                            continue
-
-                    choices.append(choice)
+                t = stats.lap("predict", t)
+
+                # Filter out begin of text markers that sneak in as
+                # high frequency unigrams.
+                choices = [choice for choice in _choices
+                           if not choice.startswith("<bot:")]
+
+                # Drop upper caps spelling in favor of a lower caps one.
+                # Auto-capitalization may elect to upper caps on insertion.
+                if drop_capitalized:
+                    capitalized = [choice for choice in choices
+                                   if choice != choice.lower()]
+                    lower_choices = [choice.lower() for choice in capitalized]
+                    exist = self._wpengine.words_exist(lower_choices)
+                    dropped = set(choice for choice, exists
+                                  in zip(capitalized, exist) if exists)
+                    choices = [choice for choice in choices
+                               if choice not in dropped]
 
                 # Make all words start upper case
                 if capitalize:
                     choices = self._capitalize_choices(choices)
+                stats.lap("filter_choices", t)
             else:
                 choices = []
 
@@ -802,11 +827,15 @@ class WordSuggestions:
                 wi.exact_match   = any(count == 1 for count in counts[i])
                 wi.partial_match = any(count  < 0 for count in counts[i])
                 wi.ignored       = word != token
-                if self._spell_checker:
-                    wi.spelling_errors = \
-                        self._spell_checker.find_incorrect_spans(word)
                 wis.append(wi)
 
+            # check all words at once
+            if self._spell_checker:
+                spans_list = self._spell_checker.find_incorrect_spans_of_words(
+                    [wi.word for wi in wis])
+                for wi, spans in zip(wis, spans_list):
+                    wi.spelling_errors = spans
+
         return wis
 
     @staticmethod
@@ -2536,8 +2565,6 @@ class WordListPanel(LayoutPanel):
         spacing = self._get_entry_spacing()
         x = 0.0
 
-        # context = Gdk.pango_context_get()
-        pango_layout = WordKey.get_pango_layout(None, font_size)
         button_infos = []
         filled_up = False
         margins = config.WORDLIST_LABEL_MARGIN[0] * 2
@@ -2547,7 +2574,7 @@ class WordListPanel(LayoutPanel):
             # text extent in Pango units, button size in logical units
             max_width = (rect.w - margins) * scale
             label, label_width = \
-                self._ellipsize(pango_layout, choice, max_width)
+                self._ellipsize(choice, font_size, max_width)
             w = label_width / scale + margins
 
             # Long words are allowed to expand their widths into the
@@ -2580,10 +2607,10 @@ class WordListPanel(LayoutPanel):
         return button_infos, filled_up, x
 
     @staticmethod
-    def _ellipsize(pango_layout, text, max_width):
+    def _ellipsize(text, font_size, max_width):
         """ Shorten very long words and add an ellipsis. """
         ellipsized_text = text
-        w = WordListPanel._get_text_size(pango_layout, text)
+        w = WordListPanel._get_text_size(text, font_size)
         if w > max_width:
             # Grow one char at a time. Inefficient, but it isn't done often
             # anyway. PangoLayout introspection is too broken to use its
@@ -2591,17 +2618,16 @@ class WordListPanel(LayoutPanel):
             w = 0
             for i, c in enumerate(text, start=0):
                 ellipsized_text = text[:i] + "..."
-                wt = WordListPanel._get_text_size(pango_layout,
-                                                  ellipsized_text)
+                wt = WordListPanel._get_text_size(ellipsized_text,
+                                                  font_size)
                 if wt > max_width:
                     break
                 w = wt
         return ellipsized_text, w
 
     @staticmethod
-    def _get_text_size(pango_layout, text):
-        pango_layout.set_text(text, -1)
-        label_width, _label_height = pango_layout.get_size()
+    def _get_text_size(text, font_size):
+        label_width, _label_height = WordKey.get_pango_size(text, font_size)
         return label_width
 
 
@@ -20,10 +20,12 @@
 #include "osk_module.h"
 
 #include <hunspell/hunspell.h>
+#include <pythread.h>
 
 typedef struct {
     PyObject_HEAD
     Hunhandle* hh;
+    PyThread_type_lock lock;  // serializes calls made without the GIL
 } OskHunspell;
 
 OSK_REGISTER_TYPE (OskHunspell, osk_hunspell, "Hunspell")
@@ -40,7 +42,17 @@ osk_hunspell_init (OskHunspell *oh, PyObject *args, PyObject *kwds)
     if (!aff_path)
         aff_path = "";
 
+    oh->lock = PyThread_allocate_lock();
+    if (!oh->lock)
+    {
+        PyErr_SetString(PyExc_MemoryError, "failed to allocate lock");
+        return -1;
+    }
+
+    // Loading large dictionaries takes a while, allow background threads.
+    Py_BEGIN_ALLOW_THREADS
     oh->hh = Hunspell_create(aff_path, dic_path);
+    Py_END_ALLOW_THREADS
     if (oh->hh == NULL)
     {
         PyErr_SetString(PyExc_ValueError, "failed to create hunspell handle");
@@ -54,6 +66,8 @@ osk_hunspell_dealloc (OskHunspell *oh)
 {
     if (oh->hh)
         Hunspell_destroy(oh->hh);
+    if (oh->lock)
+        PyThread_free_lock(oh->lock);
 
     OSK_FINISH_DEALLOC (oh);
 }
@@ -75,7 +89,11 @@ osk_hunspell_spell (PyObject *self, PyObject *args)
     if (!PyArg_ParseTuple (args, "es:spell", encoding, &word))
         return NULL;
 
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(oh->lock, WAIT_LOCK);
     res = Hunspell_spell(oh->hh, word);
+    PyThread_release_lock(oh->lock);
+    Py_END_ALLOW_THREADS
 
     return PyLong_FromLong(res);
 }
@@ -100,7 +118,11 @@ osk_hunspell_suggest (PyObject *self, PyObject *args)
     if (!PyArg_ParseTuple (args, "es:suggest", encoding, &word))
         return NULL;
 
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(oh->lock, WAIT_LOCK);
     n = Hunspell_suggest(oh->hh, &slst, word);
+    PyThread_release_lock(oh->lock);
+    Py_END_ALLOW_THREADS
 
     result = PyTuple_New(n);
     if (!result)
@@ -123,7 +145,237 @@ osk_hunspell_suggest (PyObject *self, PyObject *args)
         PyTuple_SetItem(result, i, suggestion);
     }
 
+    PyThread_acquire_lock(oh->lock, WAIT_LOCK);
     Hunspell_free_list(oh->hh, &slst, n);
+    PyThread_release_lock(oh->lock);
+
+    return result;
+}
+
+/*
+ * Encode a sequence of unicode words into the dictionary encoding.
+ * Words that can't be represented in the dictionary encoding are
+ * returned as None.
+ * Returns a new list of bytes objects, or NULL on error.
+ */
+static PyObject *
+encode_words (PyObject* words, const char* encoding)
+{
+    PyObject* seq;
+    PyObject* result;
+    Py_ssize_t i, n;
+
+    seq = PySequence_Fast(words, "expected a sequence of words");
+    if (!seq)
+        return NULL;
+
+    n = PySequence_Fast_GET_SIZE(seq);
+    result = PyList_New(n);
+    if (!result)
+    {
+        Py_DECREF(seq);
+        return NULL;
+    }
+
+    for (i = 0; i < n; i++)
+    {
+        PyObject* word = PySequence_Fast_GET_ITEM(seq, i);
+        PyObject* encoded;
+
+        if (!PyUnicode_Check(word))
+        {
+            PyErr_SetString(PyExc_TypeError, "words must be strings");
+            Py_DECREF(result);
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        encoded = PyUnicode_AsEncodedString(word, encoding, "strict");
+        if (!encoded)
+        {
+            if (!PyErr_ExceptionMatches(PyExc_UnicodeEncodeError))
+            {
+                Py_DECREF(result);
+                Py_DECREF(seq);
+                return NULL;
+            }
+            // not part of the dictionary's language
+            PyErr_Clear();
+            Py_INCREF(Py_None);
+            encoded = Py_None;
+        }
+        PyList_SET_ITEM(result, i, encoded);
+    }
+
+    Py_DECREF(seq);
+    return result;
+}
+
+/*
+ * Check a sequence of words in one call.
+ * Returns a tuple with one entry per word: 1 if the word is spelled
+ * correctly, 0 if it is misspelled and -1 if it can't be encoded in
+ * the dictionary's encoding.
+ */
+static PyObject *
+osk_hunspell_check_words (PyObject *self, PyObject *args)
+{
+    OskHunspell *oh = (OskHunspell*) self;
+    PyObject* words;
+    PyObject* encoded_words;
+    PyObject* result;
+    const char** cwords;
+    int* checks;
+    Py_ssize_t i, n;
+
+    char* encoding = Hunspell_get_dic_encoding(oh->hh);
+    if (!encoding)
+    {
+        PyErr_SetString(PyExc_MemoryError, "unknown dictionary encoding");
+        return NULL;
+    }
+
+    if (!PyArg_ParseTuple (args, "O:check_words", &words))
+        return NULL;
+
+    encoded_words = encode_words(words, encoding);
+    if (!encoded_words)
+        return NULL;
+
+    n = PyList_GET_SIZE(encoded_words);
+    cwords = PyMem_Malloc(sizeof(*cwords) * (n ? n : 1));
+    checks = PyMem_Malloc(sizeof(*checks) * (n ? n : 1));
+    if (!cwords || !checks)
+    {
+        PyMem_Free(cwords);
+        PyMem_Free(checks);
+        Py_DECREF(encoded_words);
+        return PyErr_NoMemory();
+    }
+
+    for (i = 0; i < n; i++)
+    {
+        PyObject* encoded = PyList_GET_ITEM(encoded_words, i);
+        cwords[i] = encoded == Py_None ? NULL : PyBytes_AS_STRING(encoded);
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(oh->lock, WAIT_LOCK);
+    for (i = 0; i < n; i++)
+        checks[i] = cwords[i] ? (Hunspell_spell(oh->hh, cwords[i]) != 0) : -1;
+    PyThread_release_lock(oh->lock);
+    Py_END_ALLOW_THREADS
+
+    result = PyTuple_New(n);
+    if (result)
+    {
+        for (i = 0; i < n; i++)
+            PyTuple_SET_ITEM(result, i, PyLong_FromLong(checks[i]));
+    }
+
+    PyMem_Free(cwords);
+    PyMem_Free(checks);
+    Py_DECREF(encoded_words);
+
+    return result;
+}
+
+/*
+ * Get suggestions for a sequence of words in one call.
+ * Returns a tuple with one tuple of suggestions per word. Words that
+ * can't be encoded in the dictionary's encoding get no suggestions.
+ */
+static PyObject *
+osk_hunspell_suggest_words (PyObject *self, PyObject *args)
+{
+    OskHunspell *oh = (OskHunspell*) self;
+    PyObject* words;
+    PyObject* encoded_words;
+    PyObject* result = NULL;
+    const char** cwords;
+    char*** slsts;
+    int* counts;
+    Py_ssize_t i, n;
+    int j;
+
+    char* encoding = Hunspell_get_dic_encoding(oh->hh);
+    if (!encoding)
+    {
+        PyErr_SetString(PyExc_MemoryError, "unknown dictionary encoding");
+        return NULL;
+    }
+
+    if (!PyArg_ParseTuple (args, "O:suggest_words", &words))
+        return NULL;
+
+    encoded_words = encode_words(words, encoding);
+    if (!encoded_words)
+        return NULL;
+
+    n = PyList_GET_SIZE(encoded_words);
+    cwords = PyMem_Malloc(sizeof(*cwords) * (n ? n : 1));
+    slsts  = PyMem_Calloc(n ? n : 1, sizeof(*slsts));
+    counts = PyMem_Calloc(n ? n : 1, sizeof(*counts));
+    if (!cwords || !slsts || !counts)
+    {
+        PyMem_Free(cwords);
+        PyMem_Free(slsts);
+        PyMem_Free(counts);
+        Py_DECREF(encoded_words);
+        return PyErr_NoMemory();
+    }
+
+    for (i = 0; i < n; i++)
+    {
+        PyObject* encoded = PyList_GET_ITEM(encoded_words, i);
+        cwords[i] = encoded == Py_None ? NULL : PyBytes_AS_STRING(encoded);
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(oh->lock, WAIT_LOCK);
+    for (i = 0; i < n; i++)
+        if (cwords[i])
+            counts[i] = Hunspell_suggest(oh->hh, &slsts[i], cwords[i]);
+    PyThread_release_lock(oh->lock);
+    Py_END_ALLOW_THREADS
+
+    result = PyTuple_New(n);
+    for (i = 0; result && i < n; i++)
+    {
+        PyObject* suggestions = PyTuple_New(counts[i]);
+        if (!suggestions)
+        {
+            Py_CLEAR(result);
+            break;
+        }
+
+        for (j = 0; j < counts[i]; j++)
+        {
+            PyObject* suggestion = PyUnicode_Decode(slsts[i][j],
+                                                    strlen(slsts[i][j]),
+                                                    encoding, NULL);
+            if (!suggestion)
+            {
+                Py_DECREF(suggestions);
+                Py_CLEAR(result);
+                break;
+            }
+            PyTuple_SET_ITEM(suggestions, j, suggestion);
+        }
+        if (result)
+            PyTuple_SET_ITEM(result, i, suggestions);
+    }
+
+    PyThread_acquire_lock(oh->lock, WAIT_LOCK);
+    for (i = 0; i < n; i++)
+        if (slsts[i])
+            Hunspell_free_list(oh->hh, &slsts[i], counts[i]);
+    PyThread_release_lock(oh->lock);
+
+    PyMem_Free(cwords);
+    PyMem_Free(slsts);
+    PyMem_Free(counts);
+    Py_DECREF(encoded_words);
 
     return result;
 }
@@ -145,6 +397,12 @@ static PyMethodDef osk_hunspell_methods[] = {
     { "suggest",
         osk_hunspell_suggest,
         METH_VARARGS, NULL },
+    { "check_words",
+        osk_hunspell_check_words,
+        METH_VARARGS, NULL },
+    { "suggest_words",
+        osk_hunspell_suggest_words,
+        METH_VARARGS, NULL },
     { "get_encoding",
         osk_hunspell_get_encoding,
         METH_VARARGS, NULL },
@@ -668,6 +668,83 @@ osk_util_set_input_rect (PyObject *self, PyObject *args)
     Py_RETURN_NONE;
 }
 
+// One box blur pass over n values, step bytes apart. Values outside
+// the line count as zero, so that blurred shapes fade out at the edges.
+static void
+box_blur_line (unsigned char* data, int n, int step, int radius,
+               unsigned char* line)
+{
+    int i;
+    unsigned int sum = 0;
+    unsigned int size = 2 * radius + 1;
+
+    for (i = 0; i < n; i++)
+        line[i] = data[i * step];
+
+    for (i = 0; i <= radius && i < n; i++)
+        sum += line[i];
+
+    for (i = 0; i < n; i++)
+    {
+        data[i * step] = (sum + size / 2) / size;
+        if (i + radius + 1 < n)
+            sum += line[i + radius + 1];
+        if (i - radius >= 0)
+            sum -= line[i - radius];
+    }
+}
+
+static PyObject *
+osk_util_blur_alpha (PyObject *self, PyObject *args)
+{
+    Py_buffer buffer;
+    int width, height, stride, radius;
+    int passes = 3;
+
+    if (!PyArg_ParseTuple (args, "w*iiii|i:blur_alpha", &buffer,
+                           &width, &height, &stride, &radius, &passes))
+        return NULL;
+
+    if (width < 0 || height < 0 || stride < width ||
+        buffer.len < (Py_ssize_t) stride * height)
+    {
+        PyBuffer_Release (&buffer);
+        PyErr_SetString (PyExc_ValueError,
+                         "buffer too small for width, height and stride");
+        return NULL;
+    }
+
+    if (radius > 0 && width > 0 && height > 0)
+    {
+        unsigned char* data = buffer.buf;
+        unsigned char* line = PyMem_Malloc (MAX (width, height));
+        int i, x, y;
+
+        if (!line)
+        {
+            PyBuffer_Release (&buffer);
+            return PyErr_NoMemory ();
+        }
+
+        // Repeated box blurs approximate a gaussian blur,
+        // three passes are usually close enough.
+        Py_BEGIN_ALLOW_THREADS
+        for (i = 0; i < passes; i++)
+        {
+            for (y = 0; y < height; y++)
+                box_blur_line (data + y * stride, width, 1, radius, line);
+            for (x = 0; x < width; x++)
+                box_blur_line (data + x, height, stride, radius, line);
+        }
+        Py_END_ALLOW_THREADS
+
+        PyMem_Free (line);
+    }
+
+    PyBuffer_Release (&buffer);
+    Py_RETURN_NONE;
+}
+
 typedef struct {
     PyObject *callback;
     PyObject *arglist;
@@ -732,6 +809,9 @@ static PyMethodDef osk_util_methods[] = {
     { "set_input_rect",
        osk_util_set_input_rect,
         METH_VARARGS, NULL },
+    { "blur_alpha",
+       osk_util_blur_alpha,
+        METH_VARARGS, NULL },
 
     { NULL, NULL, 0, NULL }
 };
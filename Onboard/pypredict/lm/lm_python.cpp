@@ -603,6 +603,35 @@ LanguageModel_lookup_word(PyLanguageModel* self, PyObject* value)
     return PyInt_FromLong(result);
 }
 
+// lookup_words looks up a sequence of words in one call,
+// returns a tuple with one lookup_word result per word
+static PyObject *
+LanguageModel_lookup_words(PyLanguageModel* self, PyObject* value)
+{
+    vector<wchar_t*> words;
+    if (!pyseqence_to_strings(value, words))
+        return NULL;
+
+    int n = words.size();
+    PyObject* result = PyTuple_New(n);
+    if (!result)
+    {
+        PyErr_SetString(PyExc_MemoryError, "failed to allocate result tuple");
+    }
+    else
+    {
+        for (int i=0; i<n; i++)
+        {
+            int count = (*self)->lookup_word(words[i]);
+            PyTuple_SetItem(result, i, PyInt_FromLong(count));
+        }
+    }
+
+    free_strings(words);
+
+    return result;
+}
+
 static PyObject *
 LanguageModel_load(PyLanguageModel *self, PyObject *args)
 {
@@ -653,6 +682,9 @@ static PyMethodDef LanguageModel_methods[] = {
     {"lookup_word", (PyCFunction)LanguageModel_lookup_word, METH_O,
      ""
     },
+    {"lookup_words", (PyCFunction)LanguageModel_lookup_words, METH_O,
+     ""
+    },
     {"load", (PyCFunction)LanguageModel_load, METH_VARARGS,
      ""
     },
@@ -777,6 +777,19 @@ class _TestModel(unittest.TestCase):
         choices = model.predict([''], options = model.IGNORE_NON_CAPITALIZED)
         self.assertEqual(choices, ['ABCDE'])
 
+    def test_lookup_words(self):
+        model = DynamicModel()
+        model.learn_tokens(['abc', 'abcd', 'xyz'], 1)
+
+        words = ['abc', 'ab', 'xyz', 'qqq']
+        results = model.lookup_words(words)
+        self.assertEqual(list(results),
+                         [model.lookup_word(w) for w in words])
+        self.assertEqual(results[0], 1)
+        self.assertEqual(results[3], 0)
+
+        self.assertEqual(list(model.lookup_words([])), [])
+
     def test_save_load_unigram_model(self):
         fn = os.path.join(self._dir, "unigram.lm")
 
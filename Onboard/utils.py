@@ -28,6 +28,8 @@ import time
 import re
 import colorsys
 import gettext
+import bisect
+import collections
 import subprocess
 from math import pi, sin, cos, sqrt, log, ceil
 from contextlib import contextmanager
@@ -794,6 +796,103 @@ class Rect:
         return rects, bounds
 
 
+class RectGrid:
+    """
+    Uniform grid over rectangles for finding those that contain a point
+    or overlap a rect without testing all of them. Results keep the
+    order of the entries, e.g. z-order or drawing order.
+
+    Doctests:
+    >>> g = RectGrid([(0, 0, 10, 10, "a"), (5, 5, 20, 20, "b"),
+    ...               (30, 30, 40, 40, "c")])
+    >>> g.get_items_at(7, 7), g.get_items_at(10, 10)
+    (['a', 'b'], ['b'])
+    >>> g.get_items_at(35, 35), g.get_items_at(25, 5), g.get_items_at(-1, 0)
+    (['c'], [], [])
+    >>> g.get_items_in_rect(Rect(8, 0, 30, 8))
+    ['a', 'b']
+    >>> g.get_items_in_rect(Rect(20, 0, 10, 30))
+    []
+    >>> RectGrid([]).get_items_in_rect(Rect(0, 0, 10, 10))
+    []
+    """
+
+    MAX_CELLS = 64  # per axis
+
+    def __init__(self, entries):
+        """ entries: (x0, y0, x1, y1, item) tuples, x1 and y1 exclusive """
+        self._entries = entries = list(entries)
+
+        if entries:
+            x0 = min(e[0] for e in entries)
+            y0 = min(e[1] for e in entries)
+            x1 = max(e[2] for e in entries)
+            y1 = max(e[3] for e in entries)
+        else:
+            x0 = y0 = 0.0
+            x1 = y1 = 1.0
+
+        n = max(1, min(self.MAX_CELLS, int(ceil(sqrt(len(entries))))))
+        self._n = n
+        self._x0 = x0
+        self._y0 = y0
+        self._cell_w = (x1 - x0) / n or 1.0
+        self._cell_h = (y1 - y0) / n or 1.0
+
+        self._cells = cells = [[] for i in range(n * n)]
+        for i, e in enumerate(entries):
+            c0, r0, c1, r1 = self._get_cell_range(*e[:4])
+            for row in range(r0, r1 + 1):
+                for col in range(c0, c1 + 1):
+                    cells[row * n + col].append(i)
+
+    def get_items_at(self, x, y):
+        """ Items whose rects contain the point (x, y). """
+        col = int((x - self._x0) // self._cell_w)
+        row = int((y - self._y0) // self._cell_h)
+        n = self._n
+        if not (0 <= col < n and 0 <= row < n):
+            return []
+
+        entries = self._entries
+        result = []
+        for i in self._cells[row * n + col]:
+            x0, y0, x1, y1, item = entries[i]
+            if x >= x0 and x < x1 and \
+               y >= y0 and y < y1:
+                result.append(item)
+        return result
+
+    def get_items_in_rect(self, rect):
+        """ Items whose rects overlap rect, see Rect.intersects. """
+        rx0, ry0, rx1, ry1 = rect.to_extents()
+        c0, r0, c1, r1 = self._get_cell_range(rx0, ry0, rx1, ry1)
+        n = self._n
+        cells = self._cells
+        indices = set()
+        for row in range(r0, r1 + 1):
+            for col in range(c0, c1 + 1):
+                indices.update(cells[row * n + col])
+
+        entries = self._entries
+        result = []
+        for i in sorted(indices):
+            x0, y0, x1, y1, item = entries[i]
+            if not (x0 >= rx1 or x1 <= rx0 or
+                    y0 >= ry1 or y1 <= ry0):
+                result.append(item)
+        return result
+
+    def _get_cell_range(self, x0, y0, x1, y1):
+        """ Cells touched by the given extents, clamped to the grid. """
+        n = self._n
+        c0 = min(max(int((x0 - self._x0) // self._cell_w), 0), n - 1)
+        r0 = min(max(int((y0 - self._y0) // self._cell_h), 0), n - 1)
+        c1 = min(max(int((x1 - self._x0) // self._cell_w), 0), n - 1)
+        r1 = min(max(int((y1 - self._y0) // self._cell_h), 0), n - 1)
+        return c0, r0, c1, r1
+
+
 def brighten(amount, r, g, b, a=0.0):
     """ Make the given color brighter by amount a [-1.0...1.0] """
     h, l, s = colorsys.rgb_to_hls(r, g, b)
@@ -1104,6 +1203,169 @@ def timeit(s, out=sys.stdout):
     else:
         yield None
 
+class LatencyStats(object):
+    """
+    Singleton collecting rolling latency histograms per processing stage.
+    Disabled by default, timing calls then cost little more than a
+    function call.
+
+    Doctests:
+    >>> s = object.__new__(LatencyStats); s.construct()
+    >>> s.start() is None
+    True
+    >>> s.enable()
+    >>> t = s.lap("stage1", s.start())
+    >>> s.add_sample("stage2", 0.003)
+    >>> s.add_sample("stage2", 0.020)
+    >>> h = s.get_histograms()
+    >>> sorted(h)
+    ['stage1', 'stage2']
+    >>> count, mean, max_, buckets = h["stage2"]
+    >>> count, round(mean, 3), round(max_, 3), buckets
+    (2, 11.5, 20.0, [0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0, 0])
+    """
+
+    # upper bucket limits in ms, the last bucket is open-ended
+    BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0)
+
+    MAX_SAMPLES = 1000  # size of the rolling window per stage
+    MAX_MARK_AGE = 1.0  # seconds until unfinished marks are dropped
+    MAX_MARKS = 64      # max number of unfinished marks
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton magic.
+        """
+        if not hasattr(cls, "self"):
+            cls.self = object.__new__(cls, *args, **kwargs)
+            cls.self.construct()
+        return cls.self
+
+    def __init__(self):
+        """
+        Called multiple times, do not use.
+        """
+        pass
+
+    def construct(self):
+        """
+        Singleton constructor, runs only once.
+        """
+        self.enabled = False
+        self._samples = {}  # stage -> deque of durations in ms
+        self._marks = {}    # mark name -> start time
+
+    def enable(self, enable=True):
+        self.enabled = enable
+        if not enable:
+            self.reset()
+
+    def reset(self):
+        self._samples = {}
+        self._marks = {}
+
+    def start(self):
+        """ Return the start time of a measurement, None if disabled. """
+        if self.enabled:
+            return time.perf_counter()
+        return None
+
+    def lap(self, stage, start_time):
+        """
+        Record the time since start_time for stage.
+        Returns the current time for chaining consecutive stages.
+        """
+        if start_time is None:
+            return None
+        t = time.perf_counter()
+        self.add_sample(stage, t - start_time)
+        return t
+
+    def mark(self, name):
+        """
+        Remember the start of a measurement that ends elsewhere,
+        e.g. in a later main loop iteration. Earlier marks are kept
+        until they expire, in case their end never arrives.
+
+        Doctests:
+        >>> s = object.__new__(LatencyStats); s.construct()
+        >>> s.enable()
+        >>> s.mark("a"); s._marks["a"] -= 10  # end event got lost
+        >>> s.mark("a"); s.lap_mark("a", "stage")
+        >>> s.get_histograms()["stage"][2] < 1000
+        True
+        >>> s.mark("b"); s._marks["b"] -= 10
+        >>> s.lap_mark("b", "stage_b"); "stage_b" in s.get_histograms()
+        False
+        """
+        if self.enabled:
+            t = time.perf_counter()
+            self._drop_expired_marks(t)
+            if name not in self._marks:
+                self._marks[name] = t
+
+    def lap_mark(self, name, stage):
+        """ Record the time since mark name for stage, if it was set. """
+        if self._marks:
+            start_time = self._marks.pop(name, None)
+            if start_time is not None and \
+               time.perf_counter() - start_time <= self.MAX_MARK_AGE:
+                self.lap(stage, start_time)
+
+    def _drop_expired_marks(self, t):
+        marks = self._marks
+        for name, start_time in list(marks.items()):
+            if t - start_time > self.MAX_MARK_AGE:
+                del marks[name]
+        while len(marks) >= self.MAX_MARKS:
+            del marks[min(marks, key=marks.get)]
+
+    def add_sample(self, stage, duration):
+        """ Add a duration in seconds. """
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = collections.deque(maxlen=self.MAX_SAMPLES)
+            self._samples[stage] = samples
+        samples.append(duration * 1000.0)
+
+    def get_histograms(self):
+        """
+        Return {stage : (count, mean ms, max ms, bucket counts)}
+        for the samples of the rolling window.
+        """
+        results = {}
+        for stage, samples in self._samples.items():
+            buckets = [0] * (len(self.BUCKETS) + 1)
+            for ms in samples:
+                buckets[bisect.bisect_left(self.BUCKETS, ms)] += 1
+            count = len(samples)
+            results[stage] = (count,
+                              sum(samples) / count if count else 0.0,
+                              max(samples) if count else 0.0,
+                              buckets)
+        return results
+
+    def format_report(self):
+        """ Return a human readable table of all stages. """
+        limits = ["<" + str(ms) for ms in self.BUCKETS] + \
+                 [">" + str(self.BUCKETS[-1])]
+        lines = ["{:16} {:>6} {:>8} {:>8}  {}" \
+                 .format("stage", "count", "mean ms", "max ms",
+                         " ".join("{:>6}".format(l) for l in limits))]
+        for stage, (count, mean, max_, buckets) in \
+            sorted(self.get_histograms().items()):
+            lines.append("{:16} {:>6} {:>8.3f} {:>8.3f}  {}" \
+                         .format(stage, count, mean, max_,
+                                 " ".join("{:>6}".format(n)
+                                          for n in buckets)))
+        return "\n".join(lines)
+
+    def log_report(self):
+        if self._samples:
+            logging.getLogger("LatencyStats").info(
+                "latency statistics:\n" + self.format_report())
+
+
 class Fade:
     """ Helper for opacity fading """
     @staticmethod